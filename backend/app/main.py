@@ -28,6 +28,21 @@ app.include_router(goals.router, prefix="/goals", tags=["goals"])
 app.include_router(notify.router, prefix="/notify", tags=["notify"])
 app.include_router(budgets.router, prefix="/budgets", tags=["budgets"])
 
+@app.middleware("http")
+async def firestore_read_headers(request, call_next):
+    # routes using the repo.doc_loader dependency report what they read from Firestore
+    response = await call_next(request)
+    loader = getattr(request.state, "doc_loader", None)
+    if loader is not None:
+        response.headers["X-Firestore-Reads"] = str(loader.reads)
+        response.headers["X-Firestore-Round-Trips"] = str(loader.round_trips)
+    return response
+
+@app.on_event("shutdown")
+async def close_calendar_client():
+    from .services.async_calendar import async_calendar
+    await async_calendar.aclose()
+
 @app.get("/")
 async def root():
     return {"message": "Raigen Backend is running! 🚀"}
@@ -1,7 +1,7 @@
 import os, urllib.parse, json, base64
 from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
-from ..services.repo import integrations_ref, set_doc
+from ..services.repo import a_set_doc
 
 router = APIRouter()
 
@@ -16,7 +16,8 @@ def google_oauth_url():
         "response_type": "code",
         "access_type": "offline",
         "prompt": "consent",
-        "scope": "https://www.googleapis.com/auth/calendar.events",
+        # freebusy lets plan generation read busy intervals without downloading events
+        "scope": "https://www.googleapis.com/auth/calendar.events https://www.googleapis.com/auth/calendar.freebusy",
     }
     return {"auth_url": "https://accounts.google.com/o/oauth2/v2/auth?" + urllib.parse.urlencode(params)}
 
@@ -47,11 +48,19 @@ async def google_callback(request: Request):
     if not refresh_token:
         raise HTTPException(status_code=400, detail="No refresh_token returned; ensure prompt=consent & access_type=offline")
 
-    integrations_ref().document(user_id).set({
+    await a_set_doc("integrations", user_id, {
         "google": {
             "refresh_token": refresh_token,
-            "scopes": ["calendar.events"]
+            "scopes": ["calendar.events", "calendar.freebusy"]
         }
-    }, merge=True)
+    })
+
+    # Push notifications for calendar changes (best effort; /calendar/watch retries)
+    from ..services.calendar_watch import WEBHOOK_URL, ensure_watch
+    if WEBHOOK_URL:
+        try:
+            await ensure_watch(user_id, {"refresh_token": refresh_token})
+        except Exception as e:
+            print("[auth] calendar watch failed:", e)
 
     return {"ok": True} 
\ No newline at end of file
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException
-from ..services.budgets import get_current
+from ..services.budgets import a_get_current
 
 router = APIRouter()
 
 @router.get("/current")
-def budgets_current(user_id: str):
-    return get_current(user_id) 
\ No newline at end of file
+async def budgets_current(user_id: str):
+    return await a_get_current(user_id) 
\ No newline at end of file
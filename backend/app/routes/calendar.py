@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Query, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-from ..services.repo import integrations_ref
-from ..services.google_calendar import list_events, upsert_event
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+from ..services.repo import a_get_doc, DocLoader, doc_loader
+from ..services.async_calendar import async_calendar
+from ..services.busy import provider_for
+from ..services.calendar_pool import calendar_pool
+from ..services.event_cache import event_cache
+from ..services.calendar_watch import ensure_watch, handle_notification, Debouncer, AUTO_REPLAN_S
+from ..services.free_windows import common_free_windows, MIN_GAP_MIN
 from datetime import datetime, timedelta, timezone
 
 router = APIRouter()
@@ -11,24 +17,67 @@ def iso(dt):
     return dt.replace(microsecond=0).astimezone(timezone.utc).isoformat()
 
 @router.get("/sync")
-async def sync_calendar(user_id: str, days: int = Query(14, ge=1, le=30)):
-    doc = integrations_ref().document(user_id).get()
+async def sync_calendar(user_id: str, days: int = Query(14, ge=1, le=30), force: bool = False):
+    doc = await a_get_doc("integrations", user_id)
     if not doc.exists:
         raise HTTPException(400, "No Google integration for user")
     refresh_token = doc.to_dict().get("google", {}).get("refresh_token")
     if not refresh_token:
         raise HTTPException(400, "Missing refresh_token")
 
+    # Incremental: only changes since the last sync are fetched, the listing comes from the cache
+    sync = await event_cache.a_sync(user_id, refresh_token, "primary", force)
     start = datetime.now(timezone.utc)
     end = start + timedelta(days=days)
-    items = list_events(refresh_token, iso(start), iso(end))
     events = [{
-        "id": e.get("id"),
-        "summary": e.get("summary"),
-        "start": e.get("start", {}).get("dateTime"),
-        "end": e.get("end", {}).get("dateTime")
-    } for e in items]
-    return {"events": events}
+        "id": e["id"],
+        "summary": e["summary"],
+        "start": None if e["all_day"] else e["start"],
+        "end": None if e["all_day"] else e["end"]
+    } for e in event_cache.events(user_id, "primary", iso(start), iso(end))]
+    return {"events": events, "sync": sync}
+
+@router.post("/watch")
+async def watch_calendar(user_id: str, force: bool = False):
+    """Open (or renew) push channels for the user's calendars so changes arrive at /calendar/webhook."""
+    doc = await a_get_doc("integrations", user_id)
+    google = doc.to_dict().get("google", {}) if doc.exists else {}
+    if not google.get("refresh_token"):
+        raise HTTPException(400, "Missing refresh_token")
+    try:
+        channels = await ensure_watch(user_id, google, force)
+    except RuntimeError as e:
+        raise HTTPException(503, str(e))  # webhook URL or secret not configured
+    return {"channels": {cal: {"expiration": ch["expiration"]} for cal, ch in channels.items()}}
+
+async def _auto_replan(user_id: str):
+    from .plan import replan, ReplanIn
+    try:
+        # called directly, not through FastAPI, so the request-scoped loader has to be passed in;
+        # replan falls back to the prefs stored with the plan
+        await replan(ReplanIn(user_id=user_id), loader=DocLoader())
+    except HTTPException:
+        pass  # no plan today
+
+replan_debouncer = Debouncer(AUTO_REPLAN_S, _auto_replan)
+
+@router.post("/webhook")
+async def calendar_webhook(request: Request):
+    """
+    Google push notifications. Marks the calendar's cached events (hence busy time and free windows)
+    dirty; with CALENDAR_AUTO_REPLAN_S set, today's plan is also repaired once pings settle.
+    """
+    note = await asyncio.to_thread(handle_notification, {k.lower(): v for k, v in request.headers.items()})
+    if note is None:
+        raise HTTPException(403, "Unknown channel")
+    if AUTO_REPLAN_S and note["state"] != "sync":
+        replan_debouncer.poke(note["user_id"])
+    return {"ok": True}
+
+@router.get("/pool_stats")
+async def pool_stats():
+    """Calendar client pool metrics (cached clients, hit rate, token refreshes, evictions), event cache syncs and async client requests."""
+    return {**calendar_pool.stats(), "event_cache": event_cache.stats(), "async_client": async_calendar.stats()}
 
 class BlockIn(BaseModel):
     user_id: str
@@ -39,12 +88,49 @@ class BlockIn(BaseModel):
 
 @router.post("/block")
 async def create_or_update_block(body: BlockIn):
-    doc = integrations_ref().document(body.user_id).get()
+    doc = await a_get_doc("integrations", body.user_id)
     if not doc.exists:
         raise HTTPException(400, "No Google integration for user")
     refresh_token = doc.to_dict().get("google", {}).get("refresh_token")
     if not refresh_token:
         raise HTTPException(400, "Missing refresh_token")
 
-    event = upsert_event(refresh_token, body.title, body.start_iso, body.end_iso, body.event_id)
-    return {"event_id": event.get("id"), "summary": event.get("summary")} 
\ No newline at end of file
+    event = await async_calendar.upsert_event(refresh_token, body.title, body.start_iso, body.end_iso, body.event_id)
+    return {"event_id": event.get("id"), "summary": event.get("summary")} 
+
+class CommonFreeIn(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=50)
+    start_iso: str
+    end_iso: str
+    min_gap_min: int = Field(MIN_GAP_MIN, ge=1, le=24 * 60)
+
+async def _busy_streams(user_id: str, start_iso: str, end_iso: str, loader: DocLoader) -> Optional[List[List[dict]]]:
+    """One start-ordered busy stream per calendar of the user (integration "calendar_ids", default primary)."""
+    doc = await loader.a_get("integrations", user_id)
+    provider = provider_for(doc.to_dict().get("google", {}) if doc.exists else {}, user_id)
+    if provider is None:
+        return None
+    return await provider.a_busy_streams(start_iso, end_iso)
+
+@router.post("/common_free")
+async def common_free(body: CommonFreeIn, loader: DocLoader = Depends(doc_loader)):
+    """
+    Windows free for every listed user (all their calendars) between start_iso and end_iso.
+    Users are queried concurrently and their sorted busy streams k-way merged, so the cost grows
+    with the total number of events, not with pairs of users.
+    """
+    start = datetime.fromisoformat(body.start_iso.replace("Z","+00:00"))
+    end = datetime.fromisoformat(body.end_iso.replace("Z","+00:00"))
+    if not start < end <= start + timedelta(days=31):
+        raise HTTPException(400, "end_iso must be after start_iso and within 31 days")
+    user_ids = list(dict.fromkeys(body.user_ids))
+    await loader.a_load(*(("integrations", uid) for uid in user_ids))  # every user's integration in one get_all
+    found = await asyncio.gather(*(_busy_streams(uid, iso(start), iso(end), loader) for uid in user_ids))
+    missing = [uid for uid, streams in zip(user_ids, found) if streams is None]
+    streams = [s for user_streams in found if user_streams for s in user_streams]
+    windows = common_free_windows(start, end, streams, body.min_gap_min)
+    return {
+        "windows": [{"start_iso": iso(s), "end_iso": iso(e)} for s, e in windows],
+        "users": len(user_ids) - len(missing),
+        "missing": missing,  # no Google integration; their time isn't accounted for
+    }
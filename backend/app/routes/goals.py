@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Optional
-from ..services.repo import set_doc, get_doc, goals_ref
+from ..services.repo import a_set_doc, a_stream_goals
 from datetime import datetime
 
 router = APIRouter()
@@ -35,14 +35,10 @@ async def create_goal(goal: GoalCreate):
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat()
     }
-    set_doc("goals", goal_id, goal_data)
+    await a_set_doc("goals", goal_id, goal_data)
     return {"id": goal_id, **goal_data}
 
 @router.get("/")
 async def list_goals(user_id: str, status: str = "active"):
     """List goals for a user, optionally filtered by status"""
-    goals = []
-    docs = goals_ref().where("user_id", "==", user_id).where("status", "==", status).stream()
-    for doc in docs:
-        goals.append({"id": doc.id, **doc.to_dict()})
-    return goals 
\ No newline at end of file
+    return [goal async for goal in a_stream_goals(user_id, status)] 
\ No newline at end of file
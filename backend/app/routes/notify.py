@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 import httpx
-from ..services.repo import set_doc, get_doc
+from ..services.repo import a_set_doc, a_get_doc
 
 router = APIRouter()
 
@@ -10,8 +10,8 @@ class PushTokenIn(BaseModel):
     expo_push_token: str
 
 @router.post("/register")
-def register_token(body: PushTokenIn):
-    set_doc("users", body.user_id, {"expo_push_token": body.expo_push_token})
+async def register_token(body: PushTokenIn):
+    await a_set_doc("users", body.user_id, {"expo_push_token": body.expo_push_token})
     return {"ok": True}
 
 class PushIn(BaseModel):
@@ -21,7 +21,7 @@ class PushIn(BaseModel):
 
 @router.post("/expo")
 async def send_expo(body: PushIn):
-    doc = get_doc("users", body.user_id)
+    doc = await a_get_doc("users", body.user_id)
     if not doc.exists:
         raise HTTPException(404, "user not found")
     token = doc.to_dict().get("expo_push_token")
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
-from datetime import datetime, timezone, timedelta
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from datetime import date, datetime, timezone, timedelta
 from ..services.memos import memory_store
-from ..services.repo import save_plan, get_plan, integrations_ref
-from ..services.budgets import get_current, atomic_inc, within_limit
+from ..services.repo import a_get_plan, plan_doc_id, plan_keys, DocLoader, doc_loader, UnitOfWork
+from ..services.budgets import a_within_limit, budget_key, stage_inc
+from ..services.rollups import stage_rollups
 from ..services.notifications import plan_generated
 from ..services.free_windows import build_free_windows
-from ..services.google_calendar import list_events, upsert_event
+from ..services.async_calendar import async_calendar
+from ..services.event_cache import event_cache
 from ..services.llm import plan_rationale
-from ..services.tasks import propose_tasks_from_goals
+from ..services.tasks import a_propose_tasks_from_goals
+from ..services.scheduler import pack_tasks_range
+from ..services.solver import solve_plan
+from ..services.plan_cache import plan_cache, plan_key, plan_fingerprint, busy_fingerprint
+from ..services.replan import repair_plan
+from ..services.busy import provider_for
 
 router = APIRouter()
 
@@ -17,46 +26,41 @@ class GenerateIn(BaseModel):
     tasks: list  # list of {"title","goal_id","effort_min","energy","urgency","impact"}
     free_windows: list  # list of {"start_iso","end_iso"} in UTC
     user_prefs: dict    # quiet_hours, hard_blocks, max_day_min
+    mode: Literal["greedy", "optimal", "fragment"] = "greedy"  # optimal: best total score, greedy fallback after budget_ms
+    budget_ms: float = Field(20, gt=0, le=1000)
+    min_chunk_min: int = Field(25, ge=5, le=240)  # fragment: smallest piece a task may be split into
 
 @router.get("/today")
-async def get_today_plan(user_id: str):
+async def get_today_plan(user_id: str, loader: DocLoader = Depends(doc_loader)):
     today = datetime.now(timezone.utc).date().isoformat()
-    doc = get_plan(user_id, today)
+    doc = await a_get_plan(user_id, today, loader)
     if not doc.exists:
         return {"date": today, "blocks": []}
     return doc.to_dict()
 
 @router.post("/generate")
-async def generate_plan(body: GenerateIn):
+async def generate_plan(body: GenerateIn, loader: DocLoader = Depends(doc_loader)):
     today = datetime.now(timezone.utc).date().isoformat()
     
-    # Check plan limits (1 full + 2 replans/day)
-    existing = get_plan(body.user_id, today)
-    is_replan = existing.exists and bool(existing.to_dict().get("blocks"))
-    if is_replan:
-        data = existing.to_dict()
-        replan_count = int(data.get("replan_count", 0))
-        if replan_count >= 2:
-            raise HTTPException(status_code=429, detail="Replan limit reached for today")
-    
-    # Get user's Google refresh token
-    doc = integrations_ref().document(body.user_id).get()
-    refresh_token = doc.to_dict().get("google", {}).get("refresh_token") if doc.exists else None
-    
-    # Auto-propose tasks from goals if none provided
+    # Get user's Google refresh token and today's plan and, if no tasks were sent, propose them from goals (concurrently)
     tasks = body.tasks
-    if not tasks:
-        tasks = propose_tasks_from_goals(body.user_id)
+    keys = (("integrations", body.user_id), ("plans", plan_doc_id(body.user_id, today)))
+    if tasks:
+        await loader.a_load(*keys)
+    else:
+        _, tasks = await asyncio.gather(loader.a_load(*keys), a_propose_tasks_from_goals(body.user_id))
+    doc = await loader.a_get("integrations", body.user_id)
+    google = doc.to_dict().get("google", {}) if doc.exists else {}
+    refresh_token = google.get("refresh_token")
     
     # Convert windows or auto-discover if empty
     windows = []
+    busy = []
     if not body.free_windows and refresh_token:
-        # Auto-discover free windows from Google Calendar
+        # Auto-discover free windows from Google Calendar (busy intervals only)
         today0 = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        items = list_events(refresh_token, today0.isoformat(), (today0 + timedelta(days=1)).isoformat())
-        busy = [{"start": i.get("start",{}).get("dateTime"), "end": i.get("end",{}).get("dateTime")} for i in items if i.get("start") and i.get("end")]
-        free = build_free_windows(today0, today0 + timedelta(days=1), busy)
-        windows = free
+        busy = await provider_for(google, body.user_id).a_busy(today0.isoformat(), (today0 + timedelta(days=1)).isoformat())
+        windows = build_free_windows(today0, today0 + timedelta(days=1), busy)
     else:
         # Use provided windows
         for w in body.free_windows:
@@ -64,19 +68,45 @@ async def generate_plan(body: GenerateIn):
             e = datetime.fromisoformat(w["end_iso"].replace("Z","+00:00"))
             windows.append((s, e))
     
+    # Identical inputs (retries, app resumes) get the stored plan back with no side effects, as long as
+    # that plan hasn't been replanned, completed or overwritten since
+    existing = await a_get_plan(body.user_id, today, loader)
+    old_blocks = existing.to_dict().get("blocks", []) if existing.exists else []
+    cache_key = lambda blocks: plan_key(body.user_id, today, tasks, [(s.isoformat(), e.isoformat()) for s, e in windows],
+                                        body.user_prefs, busy_fingerprint(busy),
+                                        {"mode": body.mode, "budget_ms": body.budget_ms, "min_chunk_min": body.min_chunk_min},
+                                        plan_fingerprint(blocks))
+    cached = plan_cache.get(cache_key(old_blocks))
+    if cached is not None:
+        return {**cached, "cached": True}
+    
+    # Everything else this request reads, in one round trip: the budget, the push token
+    await loader.a_load(budget_key(body.user_id), ("users", body.user_id))
+    
+    # Check plan limits (1 full + 2 replans/day)
+    is_replan = bool(old_blocks)
+    if is_replan:
+        data = existing.to_dict()
+        replan_count = int(data.get("replan_count", 0))
+        if replan_count >= 2:
+            raise HTTPException(status_code=429, detail="Replan limit reached for today")
+    
     # Existing blocks today (MVP: none; you can pass if needed)
     existing_blocks = []
-    blocks = pack_tasks(windows, tasks, body.user_prefs, existing_blocks)
+    blocks, solver = solve_plan(windows, tasks, body.user_prefs, existing_blocks, mode=body.mode, budget_ms=body.budget_ms,
+                               min_chunk_min=body.min_chunk_min)
     
     # Add goal_id to blocks when present
     for i, block in enumerate(blocks):
         if i < len(tasks) and tasks[i].get("goal_id"):
             block["goal_id"] = tasks[i]["goal_id"]
     
-    # Create Google events for each block if we have a refresh token
+    # Sync today's Google events with the blocks if we have a refresh token: events from an earlier
+    # generate are diffed by block id (unchanged ones aren't written), new ones inserted in one batch
+    publish = None
     if refresh_token:
-        for b in blocks:
-            upsert_event(refresh_token, b["title"], b["start"], b["end"])
+        day0 = datetime.fromisoformat(today).replace(tzinfo=timezone.utc)
+        publish = await async_calendar.publish_plan(refresh_token, blocks, day0.isoformat(), (day0 + timedelta(days=1)).isoformat())
     
     # Generate rationale
     rationale = plan_rationale(tasks, body.user_prefs, blocks)
@@ -84,40 +114,174 @@ async def generate_plan(body: GenerateIn):
     # Estimate LLM cost (stub): 5 cents for rationale; adjust when wired
     LLM_EST_CENTS = 5
     # Enforce monthly LLM cap softly (skip if not within limit)
-    if not within_limit(body.user_id, "llm_cents", LLM_EST_CENTS, "llm_limit_cents"):
+    if not await a_within_limit(body.user_id, "llm_cents", LLM_EST_CENTS, "llm_limit_cents", loader):
         # Still save plan but log; you could early return or degrade here
         print("[budgets] LLM soft cap exceeded for", body.user_id)
     
-    # Save plan with plan type and replan count
-    payload = {"user_id": body.user_id, "date": today, "blocks": blocks, "rationale": rationale}
+    # Save plan with plan type, replan count and fresh adherence
+    payload = {"user_id": body.user_id, "date": today, "blocks": blocks, "rationale": rationale,
+               "adherence": {"completed": 0, "planned": len(blocks)}, "user_prefs": body.user_prefs}
     if is_replan:
         payload["replan_count"] = replan_count + 1
         payload["plan_type"] = "replan"
     else:
         payload["replan_count"] = 0
         payload["plan_type"] = "full"
-    save_plan(body.user_id, today, blocks, rationale)
     
-    # Increment budgets
-    atomic_inc(body.user_id, {"llm_cents": LLM_EST_CENTS})
+    # Plan, adherence rollups and budget increment go out in one batch commit
+    uow = UnitOfWork(loader=loader)
+    uow.set("plans", plan_doc_id(body.user_id, today), payload)
+    stage_rollups(uow, body.user_id, [(today, old_blocks, blocks)])
+    stage_inc(uow, body.user_id, {"llm_cents": LLM_EST_CENTS})
+    await uow.a_commit()
     
     # Store memory
     memory_store(kind="plan", text=rationale, meta={"date": today, "blocks": len(blocks)})
     
     # Notify user
-    await plan_generated(body.user_id, len(blocks))
+    await plan_generated(body.user_id, len(blocks), loader)
     
-    return {"date": today, "blocks": blocks, "rationale": rationale, "plan_type": payload["plan_type"], "replan_count": payload["replan_count"]}
+    result = {"date": today, "blocks": blocks, "rationale": rationale, "plan_type": payload["plan_type"], "replan_count": payload["replan_count"], "solver": solver}
+    plan_cache.set(cache_key(blocks), result)
+    return {**result, "cached": False, "publish": publish}
+
+class GenerateRangeIn(BaseModel):
+    user_id: str
+    tasks: list  # list of {"title","goal_id","effort_min","energy","urgency","impact"}
+    user_prefs: dict  # quiet_hours, hard_blocks, max_day_min (per day)
+    start_date: Optional[str] = None  # YYYY-MM-DD (UTC), defaults to today
+    days: int = Field(7, ge=1, le=31)
+
+@router.post("/generate_range")
+async def generate_plan_range(body: GenerateRangeIn, loader: DocLoader = Depends(doc_loader)):
+    today = datetime.now(timezone.utc).date()
+    try:
+        start = date.fromisoformat(body.start_date) if body.start_date else today
+    except ValueError:
+        raise HTTPException(400, "start_date must be YYYY-MM-DD")
+    day0 = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    day_end = day0 + timedelta(days=body.days)
+
+    # existing plans are replaced, so the rollups need their blocks too
+    keys = (("integrations", body.user_id), budget_key(body.user_id), ("users", body.user_id),
+            *plan_keys(body.user_id, start, start + timedelta(days=body.days)))
+    tasks = body.tasks
+    if tasks:
+        await loader.a_load(*keys)
+    else:
+        _, tasks = await asyncio.gather(loader.a_load(*keys), a_propose_tasks_from_goals(body.user_id))
+
+    # Rewriting today's plan counts against the same 1 full + 2 replans/day limit as /generate
+    today_plan = None
+    if start <= today < start + timedelta(days=body.days):
+        existing = await a_get_plan(body.user_id, today.isoformat(), loader)
+        if existing.exists and existing.to_dict().get("blocks"):
+            replan_count = int(existing.to_dict().get("replan_count", 0))
+            if replan_count >= 2:
+                raise HTTPException(status_code=429, detail="Replan limit reached for today")
+            today_plan = {"plan_type": "replan", "replan_count": replan_count + 1}
+        else:
+            today_plan = {"plan_type": "full", "replan_count": 0}
+
+    doc = await loader.a_get("integrations", body.user_id)
+    google = doc.to_dict().get("google", {}) if doc.exists else {}
+    refresh_token = google.get("refresh_token")
+
+    # One calendar listing for the whole horizon
+    busy = []
+    if refresh_token:
+        busy = await provider_for(google, body.user_id).a_busy(day0.isoformat(), day_end.isoformat())
+
+    plans = pack_tasks_range(day0, body.days, busy, tasks, body.user_prefs)
+    blocks = [b for day_blocks in plans.values() for b in day_blocks]
+
+    publish = await async_calendar.publish_plan(refresh_token, blocks, day0.isoformat(), day_end.isoformat()) if refresh_token else None
+
+    rationale = plan_rationale(tasks, body.user_prefs, blocks)
+
+    LLM_EST_CENTS = 5
+    if not await a_within_limit(body.user_id, "llm_cents", LLM_EST_CENTS, "llm_limit_cents", loader):
+        print("[budgets] LLM soft cap exceeded for", body.user_id)
+
+    # All days, their rollups and the budget increment in one batch commit
+    uow = UnitOfWork(loader=loader)
+    changes = []
+    for date_iso, day_blocks in plans.items():
+        old = await a_get_plan(body.user_id, date_iso, loader)
+        changes.append((date_iso, old.to_dict().get("blocks", []) if old.exists else [], day_blocks))
+        payload = {"user_id": body.user_id, "date": date_iso, "blocks": day_blocks, "rationale": rationale,
+                   "adherence": {"completed": 0, "planned": len(day_blocks)}, "user_prefs": body.user_prefs}
+        if date_iso == today.isoformat():
+            payload.update(today_plan)
+        uow.set("plans", plan_doc_id(body.user_id, date_iso), payload)
+    stage_rollups(uow, body.user_id, changes)
+    stage_inc(uow, body.user_id, {"llm_cents": LLM_EST_CENTS})
+    await uow.a_commit()
+
+    memory_store(kind="plan", text=rationale, meta={"from": start.isoformat(), "days": body.days, "blocks": len(blocks)})
+    await plan_generated(body.user_id, len(blocks), loader)
+
+    return {"start_date": start.isoformat(), "days": body.days, "plans": plans, "rationale": rationale, "publish": publish}
 
 class ReplanIn(BaseModel):
     user_id: str
     delta_minutes: int = 30
+    user_prefs: Optional[dict] = None  # quiet_hours, hard_blocks; default: the prefs the plan was generated with
 
 @router.post("/replan")
-async def replan(body: ReplanIn):
-    today = datetime.now(timezone.utc).date().isoformat()
-    memory_store(kind="plan", text="Delta replan requested", meta={"date": today, "delta": body.delta_minutes})
-    return {"ok": True}
+async def replan(body: ReplanIn, loader: DocLoader = Depends(doc_loader)):
+    """
+    Incremental replan of today's saved plan: nothing starts before now + delta_minutes.
+    Only blocks that are now in the past or collide with the calendar are moved, and only
+    their Google events are patched (or deleted when they no longer fit today); an unchanged
+    plan makes no Google writes.
+    """
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    await loader.a_load(("plans", plan_doc_id(body.user_id, today)), ("integrations", body.user_id))
+    doc = await a_get_plan(body.user_id, today, loader)
+    if not doc.exists:
+        raise HTTPException(404, "No plan for today")
+    data = doc.to_dict()
+    blocks = data.get("blocks", [])
+
+    # Replan under the prefs the plan was made with, else the stored profile's (plans saved before prefs were kept)
+    prefs = body.user_prefs if body.user_prefs is not None else data.get("user_prefs")
+    if prefs is None:
+        user = await loader.a_get("users", body.user_id)
+        prefs = (user.to_dict() or {}).get("prefs") if user.exists else None
+
+    integ = await loader.a_get("integrations", body.user_id)
+    refresh_token = integ.to_dict().get("google", {}).get("refresh_token") if integ.exists else None
+
+    # Rest of today's calendar, minus this plan's own events
+    calls = 0
+    busy = []
+    if refresh_token and any(not b.get("completed") and not b.get("locked") for b in blocks):
+        day_end = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        own = {b.get("event_id") for b in blocks if b.get("event_id")}
+        calls += (await event_cache.a_sync(body.user_id, refresh_token))["requests"]
+        busy = [e for e in event_cache.busy(body.user_id, "primary", now.isoformat(), day_end.isoformat()) if e["id"] not in own]
+
+    new_blocks, moved, dropped = repair_plan(blocks, now, body.delta_minutes, prefs or {}, busy)
+
+    if refresh_token and (moved or dropped):
+        # the diff patches moved blocks' events and deletes dropped ones in the same batch request(s)
+        day0 = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        publish = await async_calendar.publish_plan(refresh_token, new_blocks, day0.isoformat(), (day0 + timedelta(days=1)).isoformat())
+        calls += publish["reads"] + publish["batches"]
+
+    if moved or dropped:
+        uow = UnitOfWork(loader=loader)
+        adherence = {"completed": sum(1 for b in new_blocks if b.get("completed")), "planned": len(new_blocks)}
+        uow.set("plans", plan_doc_id(body.user_id, today),
+                {"user_id": body.user_id, "date": today, "blocks": new_blocks, "rationale": data.get("rationale"),
+                 "adherence": adherence})
+        stage_rollups(uow, body.user_id, [(today, blocks, new_blocks)])
+        await uow.a_commit()
+    memory_store(kind="plan", text="Delta replan", meta={"date": today, "delta": body.delta_minutes,
+                                                         "moved": len(moved), "dropped": len(dropped)})
+    return {"date": today, "blocks": new_blocks, "moved": moved, "dropped": dropped, "calendar_calls": calls}
 
 class CompleteIn(BaseModel):
     user_id: str
@@ -125,25 +289,29 @@ class CompleteIn(BaseModel):
     completed: bool = True
 
 @router.post("/complete")
-async def mark_complete(body: CompleteIn):
+async def mark_complete(body: CompleteIn, loader: DocLoader = Depends(doc_loader)):
+    """
+    Mark a block of today's plan (not) completed. The plan and its week/month rollups are written in
+    one batch, the rollups by Increment; marking a block as it already is writes nothing.
+    """
     today = datetime.now(timezone.utc).date().isoformat()
-    doc = get_plan(body.user_id, today)
+    doc = await a_get_plan(body.user_id, today, loader)
     if not doc.exists:
         raise HTTPException(404, "No plan for today")
     data = doc.to_dict()
-    blocks = data.get("blocks", [])
-    found = False
-    for b in blocks:
-        if b.get("id") == body.block_id or b.get("title") == body.block_id:
-            b["completed"] = body.completed
-            found = True
-            break
-    if not found:
+    old_blocks = data.get("blocks", [])
+    blocks = [dict(b) for b in old_blocks]
+    block = next((b for b in blocks if b.get("id") == body.block_id or b.get("title") == body.block_id), None)
+    if block is None:
         raise HTTPException(404, "Block not found")
+    changed = bool(block.get("completed")) != body.completed
+    block["completed"] = body.completed
     # simple adherence count
     completed = sum(1 for b in blocks if b.get("completed"))
-    data["adherence"] = {"completed": completed, "planned": len(blocks)}
-    # save back
-    from ..services.repo import set_doc
-    set_doc("plans", f"{body.user_id}@{today}", data)
-    return {"ok": True, "adherence": data["adherence"]} 
\ No newline at end of file
+    adherence = {"completed": completed, "planned": len(blocks)}
+    if changed:
+        uow = UnitOfWork(loader=loader)
+        uow.set("plans", plan_doc_id(body.user_id, today), {"blocks": blocks, "adherence": adherence})
+        stage_rollups(uow, body.user_id, [(today, old_blocks, blocks)])
+        await uow.a_commit()
+    return {"ok": True, "adherence": adherence}
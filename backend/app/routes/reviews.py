@@ -1,42 +1,30 @@
-from fastapi import APIRouter
-from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
 from ..services.memos import memory_store
-from ..services.repo import get_plan
+from ..services.repo import get_plans_range, plan_keys, DocLoader, doc_loader, UnitOfWork
+from ..services.rollups import PERIODS, days_in, rebuild_span, rollup_key, rollup_keys, stage_rebuild, summarize
 
 router = APIRouter()
 
-@router.post("/weekly/generate")
-async def weekly_generate(user_id: str):
-    today = datetime.now(timezone.utc).date()
-    start = today - timedelta(days=7)
-    
-    # Calculate real adherence from plans
+MAX_RANGE_DAYS = 90
+
+def adherence_over(user_id: str, start: date, end: date, loader: DocLoader, period: str = "month"):
+    """Block adherence for start <= day < end from the covering (preloaded) rollups: (total, completed, by_day)."""
     total_blocks = 0
     completed_blocks = 0
     adherence_by_day = {}
-    
-    for i in range(7):
-        check_date = start + timedelta(days=i)
-        date_str = check_date.isoformat()
-        doc = get_plan(user_id, date_str)
-        
-        if doc.exists:
-            data = doc.to_dict()
-            blocks = data.get("blocks", [])
-            day_blocks = len(blocks)
-            day_completed = sum(1 for b in blocks if b.get("completed", False))
-            
-            total_blocks += day_blocks
-            completed_blocks += day_completed
-            adherence_by_day[date_str] = {
-                "total": day_blocks,
-                "completed": day_completed,
-                "rate": (day_completed / day_blocks * 100) if day_blocks > 0 else 0
-            }
-    
-    overall_adherence = (completed_blocks / total_blocks * 100) if total_blocks > 0 else 0
-    
-    # Generate insights
+    for date_str, counts in days_in(loader, user_id, start, end, period).items():
+        total_blocks += counts["planned"]
+        completed_blocks += counts["completed"]
+        adherence_by_day[date_str] = {
+            "total": counts["planned"],
+            "completed": counts["completed"],
+            "rate": counts["completed"] / counts["planned"] * 100
+        }
+    return total_blocks, completed_blocks, adherence_by_day
+
+def insights_for(overall_adherence: float, adherence_by_day: dict):
     insights = []
     if overall_adherence < 50:
         insights.append("Low adherence - consider reducing daily load or improving time estimates")
@@ -51,6 +39,20 @@ async def weekly_generate(user_id: str):
         worst_day = min(adherence_by_day.items(), key=lambda x: x[1]["rate"])
         insights.append(f"Best day: {best_day[0]} ({best_day[1]['rate']:.1f}%)")
         insights.append(f"Challenge day: {worst_day[0]} ({worst_day[1]['rate']:.1f}%)")
+    return insights
+
+@router.post("/weekly/generate")
+async def weekly_generate(user_id: str, loader: DocLoader = Depends(doc_loader)):
+    today = datetime.now(timezone.utc).date()
+    start = today - timedelta(days=7)
+    
+    # Calculate real adherence from the (at most two) week rollups
+    await loader.a_load(*rollup_keys(user_id, start, today, "week"))
+    total_blocks, completed_blocks, adherence_by_day = adherence_over(user_id, start, today, loader, "week")
+    overall_adherence = (completed_blocks / total_blocks * 100) if total_blocks > 0 else 0
+    
+    # Generate insights
+    insights = insights_for(overall_adherence, adherence_by_day)
     
     summary = f"Weekly review {start.isoformat()} → {today.isoformat()}: {overall_adherence:.1f}% adherence ({completed_blocks}/{total_blocks} blocks completed). {' '.join(insights)}"
     
@@ -76,4 +78,57 @@ async def weekly_generate(user_id: str):
         "completed_blocks": completed_blocks,
         "by_day": adherence_by_day,
         "insights": insights
-    } 
\ No newline at end of file
+    }
+
+@router.get("/range")
+async def range_review(user_id: str, start: date, end: Optional[date] = None, loader: DocLoader = Depends(doc_loader)):
+    """Adherence for start <= day <= end (default today), at most MAX_RANGE_DAYS days, from the month rollups in one round trip."""
+    end = end or datetime.now(timezone.utc).date()
+    days = (end - start).days + 1
+    if days < 1:
+        raise HTTPException(400, "end is before start")
+    if days > MAX_RANGE_DAYS:
+        raise HTTPException(400, f"Range is limited to {MAX_RANGE_DAYS} days")
+    await loader.a_load(*rollup_keys(user_id, start, end + timedelta(days=1), "month"))
+    total_blocks, completed_blocks, adherence_by_day = adherence_over(user_id, start, end + timedelta(days=1), loader)
+    overall_adherence = (completed_blocks / total_blocks * 100) if total_blocks > 0 else 0
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "days": days,
+        "adherence": overall_adherence,
+        "total_blocks": total_blocks,
+        "completed_blocks": completed_blocks,
+        "by_day": adherence_by_day,
+        "insights": insights_for(overall_adherence, adherence_by_day)
+    }
+
+@router.get("/rollup")
+async def rollup(user_id: str, period: str = "week", on: Optional[date] = None, loader: DocLoader = Depends(doc_loader)):
+    """Adherence of the week or month containing `on` (default today), by day, goal and energy: one document read."""
+    if period not in PERIODS:
+        raise HTTPException(400, f"period must be one of {', '.join(PERIODS)}")
+    on = on or datetime.now(timezone.utc).date()
+    snap = await loader.a_get(*rollup_key(user_id, period, on))
+    return summarize(user_id, period, on, snap)
+
+MAX_REBUILD_DAYS = 366
+
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(user_id: str, start: date, end: Optional[date] = None, loader: DocLoader = Depends(doc_loader)):
+    """
+    Recompute the week and month rollups touched by start <= day <= end (default today) from the plans:
+    backfills history from before rollups existed, or repairs them after plans were edited outside the API.
+    """
+    end = (end or datetime.now(timezone.utc).date()) + timedelta(days=1)
+    if end <= start:
+        raise HTTPException(400, "end is before start")
+    if (end - start).days > MAX_REBUILD_DAYS:
+        raise HTTPException(400, f"Rebuilds are limited to {MAX_REBUILD_DAYS} days")
+    first, last = rebuild_span(start, end)
+    await loader.a_load(*plan_keys(user_id, first, last))
+    plans = {date_str: data.get("blocks", []) for date_str, data in get_plans_range(user_id, first, last, loader)}
+    uow = UnitOfWork(loader=loader)
+    docs = stage_rebuild(uow, user_id, plans, start, end)
+    await uow.a_commit()
+    return {"ok": True, "rollups": docs, "plans": len(plans), "from": first.isoformat(), "to": (last - timedelta(days=1)).isoformat()}
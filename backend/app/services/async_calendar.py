@@ -0,0 +1,349 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import httpx
+
+from .google_calendar import BATCH_MAX, PAGE_SIZE, PLAN_TAG, SyncTokenExpired, block_event_body, block_key, diff_blocks
+
+API_ROOT = "https://www.googleapis.com"
+API = API_ROOT + "/calendar/v3"
+BATCH_URL = API_ROOT + "/batch/calendar/v3"
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+class CalendarAPIError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"Calendar API {status}: {body[:200]}")
+        self.status = status
+        self.body = body
+
+def _events_path(calendar_id: str, event_id: Optional[str] = None) -> str:
+    path = f"/calendars/{quote(calendar_id, safe='')}/events"
+    return path + f"/{quote(event_id, safe='')}" if event_id else path
+
+def _event_body(summary: str, start_iso: str, end_iso: str) -> Dict:
+    return {"summary": summary, "start": {"dateTime": start_iso}, "end": {"dateTime": end_iso}}
+
+class AsyncCalendarClient:
+    """
+    Google Calendar over one shared httpx.AsyncClient, for async routes: a round trip awaits
+    instead of blocking the event loop like googleapiclient's .execute() does.
+    Access tokens are refreshed (also async) per refresh token and reused until refresh_margin_s
+    before they expire; concurrent callers for one user share a single refresh. The max_tokens most
+    recently used users keep their token and refresh lock.
+    """
+
+    def __init__(self, refresh_margin_s: float = 300, max_connections: int = 100, timeout_s: float = 30,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, max_tokens: int = 4096):
+        self.refresh_margin_s = refresh_margin_s
+        self.max_tokens = max_tokens
+        self.max_connections = max_connections
+        self.timeout_s = timeout_s
+        self.transport = transport  # tests pass an httpx.MockTransport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._tokens: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # refresh token -> (access token, expires at, monotonic)
+        self._locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+        self.requests = 0
+        self.refreshes = 0
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # connections belong to one event loop; uvicorn has one per worker, test clients may start several
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout_s,
+                limits=httpx.Limits(max_connections=self.max_connections),
+                transport=self.transport,
+            )
+            self._loop = loop
+            self._locks = OrderedDict()
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _remember(self, cache: OrderedDict, key: str, value):
+        # LRU: evicting a lock that is still held only lets a second refresh for that user through
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.max_tokens:
+            cache.popitem(last=False)
+
+    async def _access_token(self, refresh_token: str) -> str:
+        tok = self._tokens.get(refresh_token)
+        if tok and tok[1] - time.monotonic() > self.refresh_margin_s:
+            self._tokens.move_to_end(refresh_token)
+            return tok[0]
+        http = self.http
+        lock = self._locks.get(refresh_token)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._remember(self._locks, refresh_token, lock)
+        async with lock:
+            tok = self._tokens.get(refresh_token)
+            if tok and tok[1] - time.monotonic() > self.refresh_margin_s:
+                return tok[0]  # refreshed by a concurrent caller
+            # request() like the other calls: reaches the transport even where AsyncClient.post is patched
+            r = await http.request("POST", TOKEN_URL, data={
+                "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+                "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            })
+            if r.status_code != 200:
+                raise CalendarAPIError(r.status_code, r.text)
+            data = r.json()
+            self._remember(self._tokens, refresh_token, (data["access_token"], time.monotonic() + float(data.get("expires_in", 3600))))
+            self.refreshes += 1
+            return data["access_token"]
+
+    async def _send(self, refresh_token: str, method: str, url: str, **kwargs) -> httpx.Response:
+        for attempt in range(2):
+            token = await self._access_token(refresh_token)
+            headers = {**kwargs.pop("headers", {}), "Authorization": f"Bearer {token}"}
+            r = await self.http.request(method, url, headers=headers, **kwargs)
+            self.requests += 1
+            if r.status_code == 401 and attempt == 0:
+                # revoked or expired early; refresh once and retry
+                self._tokens.pop(refresh_token, None)
+                kwargs["headers"] = {k: v for k, v in headers.items() if k != "Authorization"}
+                continue
+            return r
+
+    async def _call(self, refresh_token: str, method: str, path: str, params: Optional[Dict] = None,
+                    body: Optional[Dict] = None) -> Dict:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        r = await self._send(refresh_token, method, API + path, params=params, json=body)
+        if r.status_code >= 400:
+            raise CalendarAPIError(r.status_code, r.text)
+        return r.json() if r.content else {}
+
+    async def list_events(self, refresh_token: str, start_iso: str, end_iso: str, calendar_id: str = "primary") -> List[Dict]:
+        items, page_token = [], None
+        while True:
+            page = await self._call(refresh_token, "GET", _events_path(calendar_id), {
+                "timeMin": start_iso, "timeMax": end_iso, "singleEvents": "true", "orderBy": "startTime",
+                "maxResults": PAGE_SIZE, "pageToken": page_token,
+            })
+            items.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items
+
+    async def list_event_changes(self, refresh_token: str, calendar_id: str = "primary", sync_token: Optional[str] = None,
+                                 time_min: Optional[str] = None) -> Tuple[List[Dict], str, int]:
+        """Same contract as google_calendar.list_event_changes."""
+        items, page_token, pages = [], None, 0
+        while True:
+            params = {"singleEvents": "true", "maxResults": PAGE_SIZE, "pageToken": page_token}
+            if sync_token:
+                params["syncToken"] = sync_token
+            else:
+                params["timeMin"] = time_min
+            try:
+                page = await self._call(refresh_token, "GET", _events_path(calendar_id), params)
+            except CalendarAPIError as e:
+                if e.status == 410:
+                    raise SyncTokenExpired(calendar_id) from e
+                raise
+            pages += 1
+            items.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items, page.get("nextSyncToken"), pages
+
+    async def freebusy_query(self, refresh_token: str, start_iso: str, end_iso: str, calendar_ids: Sequence[str]) -> Dict:
+        return await self._call(refresh_token, "POST", "/freeBusy", body={
+            "timeMin": start_iso, "timeMax": end_iso, "items": [{"id": cal} for cal in calendar_ids],
+        })
+
+    async def insert_event(self, refresh_token: str, body: Dict, calendar_id: str = "primary") -> Dict:
+        return await self._call(refresh_token, "POST", _events_path(calendar_id), body=body)
+
+    async def patch_event(self, refresh_token: str, event_id: str, body: Dict, calendar_id: str = "primary") -> Dict:
+        return await self._call(refresh_token, "PATCH", _events_path(calendar_id, event_id), body=body)
+
+    async def delete_event(self, refresh_token: str, event_id: str, calendar_id: str = "primary"):
+        return await self._call(refresh_token, "DELETE", _events_path(calendar_id, event_id))
+
+    async def upsert_event(self, refresh_token: str, summary: str, start_iso: str, end_iso: str,
+                           event_id: Optional[str] = None) -> Dict:
+        body = _event_body(summary, start_iso, end_iso)
+        if event_id:
+            return await self.patch_event(refresh_token, event_id, body)
+        return await self.insert_event(refresh_token, body)
+
+    async def watch_events(self, refresh_token: str, calendar_id: str, channel_id: str, address: str, token: str,
+                           ttl_s: int) -> Dict:
+        """Open a push channel on the calendar's events; returns {"id", "resourceId", "expiration" (epoch ms)}."""
+        return await self._call(refresh_token, "POST", _events_path(calendar_id) + "/watch", body={
+            "id": channel_id, "type": "web_hook", "address": address, "token": token, "params": {"ttl": str(int(ttl_s))},
+        })
+
+    async def stop_channel(self, refresh_token: str, channel_id: str, resource_id: str):
+        return await self._call(refresh_token, "POST", "/channels/stop", body={"id": channel_id, "resourceId": resource_id})
+
+    async def batch(self, refresh_token: str, ops: List[Tuple[str, str, Optional[Dict]]]) -> List[Tuple[int, Dict]]:
+        """
+        Run (method, path, body) operations through the batch endpoint, BATCH_MAX per HTTP request.
+        returns one (status, response body) per operation, in order
+        """
+        out: List[Tuple[int, Dict]] = []
+        for lo in range(0, len(ops), BATCH_MAX):
+            chunk = ops[lo:lo + BATCH_MAX]
+            boundary = "batch_" + uuid.uuid4().hex
+            r = await self._send(refresh_token, "POST", BATCH_URL, content=_encode_batch(chunk, boundary),
+                                 headers={"Content-Type": f"multipart/mixed; boundary={boundary}"})
+            if r.status_code >= 400:
+                raise CalendarAPIError(r.status_code, r.text)
+            parts = _decode_batch(r.text, r.headers.get("content-type", ""))
+            out.extend(parts.get(i, (500, {"error": "missing from batch response"})) for i in range(len(chunk)))
+        return out
+
+    async def publish_blocks(self, refresh_token: str, blocks: List[Dict], delete_event_ids: Sequence[str] = ()) -> Dict:
+        """
+        Insert (or patch, when the block has an "event_id") every block's event, and delete `delete_event_ids`,
+        through the batch endpoint: one HTTP round trip per BATCH_MAX operations. New event ids are written
+        back onto the blocks.
+        returns {"published": n, "deleted": n, "failures": {block id or event id: error}, "batches": n, "ms": wall time}
+        """
+        started = time.perf_counter()
+        ops, targets = [], []
+        for b in blocks:
+            body = block_event_body(b)
+            if b.get("event_id"):
+                ops.append(("PATCH", _events_path("primary", b["event_id"]), body))
+            else:
+                ops.append(("POST", _events_path("primary"), body))
+            targets.append(("put", b))
+        for eid in delete_event_ids:
+            ops.append(("DELETE", _events_path("primary", eid), None))
+            targets.append(("delete", eid))
+        results = await self.batch(refresh_token, ops) if ops else []
+        failures: Dict[str, str] = {}
+        done = {"put": 0, "delete": 0}
+        for (kind, target), (status, resp) in zip(targets, results):
+            key = target if kind == "delete" else block_key(target)
+            if kind == "delete" and status in (404, 410):
+                status = 204  # already gone
+            if status >= 400:
+                failures[key] = f"{status}: {json.dumps(resp)[:200]}"
+                continue
+            if kind == "put":
+                target["event_id"] = resp.get("id")
+            done[kind] += 1
+        ms = round((time.perf_counter() - started) * 1000, 1)
+        if failures:
+            print(f"[calendar] publish: {len(failures)} of {len(ops)} operations failed")
+        batches = -(-len(ops) // BATCH_MAX)
+        return {"published": done["put"], "deleted": done["delete"], "failures": failures, "batches": batches, "ms": ms}
+
+    async def list_block_events(self, refresh_token: str, start_iso: str, end_iso: str,
+                                calendar_id: str = "primary") -> Tuple[List[Dict], int]:
+        """Events we published (tagged with PLAN_TAG) in [start_iso, end_iso). returns (events, pages read)"""
+        items, page_token, pages = [], None, 0
+        while True:
+            page = await self._call(refresh_token, "GET", _events_path(calendar_id), {
+                "timeMin": start_iso, "timeMax": end_iso, "singleEvents": "true", "privateExtendedProperty": PLAN_TAG,
+                "maxResults": PAGE_SIZE, "pageToken": page_token,
+            })
+            pages += 1
+            items.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items, pages
+
+    async def publish_plan(self, refresh_token: str, blocks: List[Dict], start_iso: str, end_iso: str) -> Dict:
+        """
+        Make the calendar match the plan for [start_iso, end_iso): diff the blocks against our tagged events
+        there, then insert new blocks, patch moved ones and delete removed ones (and duplicates) in one batch.
+        Publishing the same blocks again reads once and writes nothing. Event ids are written onto the blocks.
+        returns {"inserted", "patched", "deleted", "unchanged", "failures", "reads", "batches", "ms"}
+        """
+        started = time.perf_counter()
+        events, reads = await self.list_block_events(refresh_token, start_iso, end_iso)
+        inserts, patches, deletes, unchanged = diff_blocks(blocks, events)
+        # blocks published before events were tagged still know their event id; patching tags them
+        patches += [(b, b["event_id"]) for b in inserts if b.get("event_id")]
+        inserts = [b for b in inserts if not b.get("event_id")]
+        for b, event_id in unchanged + patches:
+            b["event_id"] = event_id
+        writes = inserts + [b for b, _ in patches]
+        result = await self.publish_blocks(refresh_token, writes, deletes) if writes or deletes else \
+            {"deleted": 0, "failures": {}, "batches": 0}
+        failed = result["failures"]
+        gone = [b for b, _ in patches if failed.get(block_key(b), "").startswith(("404", "410"))]
+        if gone:
+            # the event was deleted in Google meanwhile: insert it again
+            for b in gone:
+                b.pop("event_id", None)
+                failed.pop(block_key(b))
+            patches = [(b, eid) for b, eid in patches if all(b is not g for g in gone)]
+            inserts += gone
+            retry = await self.publish_blocks(refresh_token, gone)
+            failed.update(retry["failures"])
+            result["batches"] += retry["batches"]
+        return {
+            "inserted": sum(1 for b in inserts if block_key(b) not in failed),
+            "patched": sum(1 for b, _ in patches if block_key(b) not in failed),
+            "deleted": result["deleted"],
+            "unchanged": len(unchanged),
+            "failures": failed,
+            "reads": reads,
+            "batches": result["batches"],
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def stats(self) -> Dict:
+        return {"requests": self.requests, "token_refreshes": self.refreshes, "tokens": len(self._tokens)}
+
+def _encode_batch(ops: List[Tuple[str, str, Optional[Dict]]], boundary: str) -> bytes:
+    parts = []
+    for i, (method, path, body) in enumerate(ops):
+        lines = [f"--{boundary}", "Content-Type: application/http", f"Content-ID: <item{i}>", "",
+                 f"{method} /calendar/v3{path} HTTP/1.1"]
+        if body is not None:
+            lines += ["Content-Type: application/json", "", json.dumps(body)]
+        else:
+            lines += [""]
+        parts.append("\r\n".join(lines))
+    return ("\r\n".join(parts) + f"\r\n--{boundary}--\r\n").encode()
+
+def _decode_batch(text: str, content_type: str) -> Dict[int, Tuple[int, Dict]]:
+    """
+    {operation index: (status, body)} from a multipart/mixed batch response. Parts without a Content-ID,
+    status line or readable body are left out, so batch() reports those operations as failed.
+    """
+    boundary = content_type.split("boundary=", 1)[-1].strip().strip('"')
+    out = {}
+    for part in text.replace("\r\n", "\n").split(f"--{boundary}"):
+        part = part.strip("\n")
+        if not part or part == "--":
+            continue
+        outer, _, inner = part.partition("\n\n")
+        cid = next((line.split(":", 1)[1].strip() for line in outer.split("\n") if line.lower().startswith("content-id:")), "")
+        # "<response-item3>"
+        digits = "".join(ch for ch in cid.rsplit("item", 1)[-1] if ch.isdigit())
+        head, _, body = inner.partition("\n\n")
+        status_line = head.split("\n", 1)[0].split()
+        body = body.strip()
+        try:
+            out[int(digits)] = (int(status_line[1]), json.loads(body) if body else {})
+        except (IndexError, ValueError):
+            print("[calendar] unreadable batch response part:", part[:200])
+    return out
+
+async_calendar = AsyncCalendarClient(
+    refresh_margin_s=float(os.getenv("CALENDAR_TOKEN_MARGIN_S", "300")),
+    max_connections=int(os.getenv("CALENDAR_HTTP_MAX_CONNECTIONS", "100")),
+    max_tokens=int(os.getenv("CALENDAR_MAX_TOKENS", "4096")),
+)
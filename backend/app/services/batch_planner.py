@@ -0,0 +1,231 @@
+"""
+Nightly batch planner: plans every active user for a day ahead of the morning rush.
+
+    python -m app.services.batch_planner --date 2025-08-12
+    python -m app.services.batch_planner --memory 2000   # offline benchmark, no Firebase/Google
+
+Users are streamed in doc-id order and handled in chunks: goals and calendar busy time
+are prefetched with bounded async concurrency (the next chunk loads while the current
+one packs), pack_tasks runs on a process pool, and each chunk is written with batched
+Firestore writes before its last user id is checkpointed. Users whose load failed are
+kept in the checkpoint and retried first when the run is resumed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from .free_windows import build_free_windows
+from .scheduler import pack_tasks
+from .llm import plan_rationale
+
+DEFAULT_PREFS = {"quiet_hours": {"start": "22:00", "end": "07:00"}, "max_day_min": 300}
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    day0 = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return day0, day0 + timedelta(days=1)
+
+def _plan_user(args: Tuple[str, str, List[Dict], List[Dict], Dict]) -> Tuple[str, List[Dict]]:
+    # runs in a worker process; everything in and out must pickle
+    user_id, day_iso, busy, tasks, prefs = args
+    day0, day1 = _day_bounds(date.fromisoformat(day_iso))
+    windows = build_free_windows(day0, day1, busy)
+    return user_id, pack_tasks(windows, tasks, prefs, [])
+
+class FirestoreSource:
+    """Users, goals and calendars from Firestore / Google; plans written back to Firestore."""
+
+    def iter_user_ids(self, start_after: Optional[str] = None) -> Iterator[str]:
+        from .repo import users_ref
+        q = users_ref().order_by("__name__")
+        if start_after:
+            q = q.start_after(users_ref().document(start_after).get())
+        for doc in q.stream():
+            if (doc.to_dict() or {}).get("active", True):
+                yield doc.id
+
+    def load_user(self, user_id: str, day: date) -> Tuple[List[Dict], List[Dict], Dict]:
+        """(busy, tasks, prefs) for one user; blocking, called from a thread."""
+        from .repo import get_doc, integrations_ref
+        from .tasks import propose_tasks_from_goals
+        from .busy import provider_for
+        user = get_doc("users", user_id)
+        prefs = (user.to_dict() or {}).get("prefs") if user.exists else None
+        tasks = propose_tasks_from_goals(user_id)
+        integ = integrations_ref().document(user_id).get()
+        provider = provider_for(integ.to_dict().get("google", {}) if integ.exists else {}, user_id)
+        busy = []
+        if provider:
+            day0, day1 = _day_bounds(day)
+            busy = provider.busy(day0.isoformat(), day1.isoformat())
+        return busy, tasks, prefs or DEFAULT_PREFS
+
+    def write_plans(self, entries: List[Tuple[str, str, list, Optional[str]]]) -> int:
+        from .repo import write_plans
+        return write_plans(entries)
+
+class InMemorySource:
+    """Seeded synthetic users for offline runs and benchmarks; writes are kept in `plans`."""
+
+    def __init__(self, n_users: int = 1000, seed: int = 7, latency_ms: float = 0.0):
+        self.n_users = n_users
+        self.seed = seed
+        self.latency_ms = latency_ms  # simulated round trip per load_user
+        self.plans: Dict[str, Dict] = {}
+        self.commits = 0
+
+    def iter_user_ids(self, start_after: Optional[str] = None) -> Iterator[str]:
+        for i in range(self.n_users):
+            uid = f"user{i:07d}"
+            if start_after is None or uid > start_after:
+                yield uid
+
+    def load_user(self, user_id: str, day: date) -> Tuple[List[Dict], List[Dict], Dict]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        rng = random.Random(f"{self.seed}:{user_id}")
+        day0, _ = _day_bounds(day)
+        busy = []
+        for _ in range(rng.randrange(0, 10)):
+            s = day0 + timedelta(minutes=rng.randrange(7 * 60, 20 * 60, 15))
+            e = s + timedelta(minutes=rng.choice([30, 45, 60, 90]))
+            busy.append({"start": s.isoformat(), "end": e.isoformat()})
+        tasks = [{
+            "title": f"Task {k}",
+            "goal_id": f"{user_id}_g{k % 3}",
+            "effort_min": rng.choice([30, 45, 60, 90, 120]),
+            "energy": rng.choice(["low", "medium", "high"]),
+            "urgency": rng.randrange(1, 4),
+            "impact": rng.randrange(1, 4),
+        } for k in range(rng.randrange(2, 12))]
+        return busy, tasks, DEFAULT_PREFS
+
+    def write_plans(self, entries: List[Tuple[str, str, list, Optional[str]]]) -> int:
+        for user_id, date_iso, blocks, rationale in entries:
+            self.plans[f"{user_id}@{date_iso}"] = {"user_id": user_id, "date": date_iso, "blocks": blocks, "rationale": rationale}
+        self.commits += 1
+        return 1
+
+def _read_checkpoint(path: Optional[str], day_iso: str) -> Tuple[Optional[str], int, List[str]]:
+    """(last user id handled, users planned, user ids whose load failed) of an earlier run of day_iso"""
+    if not path or not os.path.exists(path):
+        return None, 0, []
+    with open(path) as f:
+        cp = json.load(f)
+    if cp.get("date") != day_iso:
+        return None, 0, []
+    return cp.get("last_user_id"), int(cp.get("done", 0)), list(cp.get("failed", []))
+
+def _write_checkpoint(path: Optional[str], day_iso: str, last_user_id: Optional[str], done: int, failed: List[str]):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"date": day_iso, "last_user_id": last_user_id, "done": done, "failed": failed}, f)
+    os.replace(tmp, path)
+
+def _chunks(it: Iterator[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for x in it:
+        chunk.append(x)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _work(retry: List[str], user_ids: Iterator[str], size: int) -> Iterator[Tuple[List[str], bool]]:
+    """(chunk, whether it moves the checkpoint on): earlier failures first, then the users after the checkpoint."""
+    for chunk in _chunks(iter(retry), size):
+        yield chunk, False
+    for chunk in _chunks(user_ids, size):
+        yield chunk, True
+
+async def _prefetch(source, user_ids: List[str], day: date, sem: asyncio.Semaphore) -> Tuple[List[Tuple], List[str]]:
+    """(loaded (uid, busy, tasks, prefs) tuples, ids whose load failed)"""
+    async def one(uid):
+        async with sem:
+            try:
+                return (uid,) + tuple(await asyncio.to_thread(source.load_user, uid, day))
+            except Exception as e:
+                print(f"[batch] load failed for {uid}: {e}")
+                return None
+    loaded = await asyncio.gather(*(one(uid) for uid in user_ids))
+    return [x for x in loaded if x is not None], [uid for uid, x in zip(user_ids, loaded) if x is None]
+
+async def run(source, day: date, concurrency: int = 16, workers: Optional[int] = None, chunk_size: int = 200,
+              checkpoint: Optional[str] = None, verbose: bool = True) -> Dict:
+    """Plan every user from `source` for `day`; returns throughput stats."""
+    day_iso = day.isoformat()
+    last_done, done, retry = _read_checkpoint(checkpoint, day_iso)
+    if (last_done or retry) and verbose:
+        print(f"[batch] resuming after {last_done} ({done} users already planned, {len(retry)} to retry)")
+    sem = asyncio.Semaphore(concurrency)
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    planned = blocks_total = retried = 0
+    failed: List[str] = []
+    chunks = _work(retry, source.iter_user_ids(last_done), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        nxt = next(chunks, None)
+        pending = asyncio.ensure_future(_prefetch(source, nxt[0], day, sem)) if nxt else None
+        while pending is not None:
+            chunk_ids, advances = nxt
+            loaded, load_failed = await pending
+            nxt = next(chunks, None)
+            pending = asyncio.ensure_future(_prefetch(source, nxt[0], day, sem)) if nxt else None
+
+            jobs = [(uid, day_iso, busy, tasks, prefs) for uid, busy, tasks, prefs in loaded]
+            per_worker = max(1, len(jobs) // (4 * workers))
+            results = await asyncio.to_thread(lambda: list(pool.map(_plan_user, jobs, chunksize=per_worker)))
+            entries = [(uid, day_iso, blocks, plan_rationale(j[3], j[4], blocks))
+                       for (uid, blocks), j in zip(results, jobs)]
+            await asyncio.to_thread(source.write_plans, entries)
+
+            planned += len(entries)
+            done += len(entries)
+            blocks_total += sum(len(e[2]) for e in entries)
+            failed += load_failed
+            if advances:
+                last_done = chunk_ids[-1]
+            else:
+                retried += len(chunk_ids)
+            # failed ids stay in the checkpoint until a later run plans them
+            _write_checkpoint(checkpoint, day_iso, last_done, done, retry[retried:] + failed)
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"[batch] {done} users planned ({planned / elapsed:.1f} users/sec)")
+    elapsed = time.perf_counter() - started
+    return {
+        "date": day_iso,
+        "users": planned,
+        "failed": len(failed),
+        "blocks": blocks_total,
+        "seconds": round(elapsed, 3),
+        "users_per_sec": round(planned / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Plan all active users for one day")
+    ap.add_argument("--date", help="YYYY-MM-DD (UTC), defaults to tomorrow")
+    ap.add_argument("--concurrency", type=int, default=16, help="max in-flight user loads")
+    ap.add_argument("--workers", type=int, default=None, help="packing processes (default: CPU count)")
+    ap.add_argument("--chunk", type=int, default=200, help="users per write batch / checkpoint")
+    ap.add_argument("--checkpoint", default=None, help="JSON file to resume an interrupted run")
+    ap.add_argument("--memory", type=int, default=0, help="plan N synthetic in-memory users instead of Firestore")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated load latency for --memory")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    day = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date() + timedelta(days=1)
+    source = InMemorySource(args.memory, args.seed, args.latency_ms) if args.memory else FirestoreSource()
+    stats = asyncio.run(run(source, day, args.concurrency, args.workers, args.chunk, args.checkpoint))
+    print(json.dumps(stats))
+    return stats
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Dict, Any, Optional
-from .repo import get_db
+from .repo import get_db, get_async_db, DocLoader, UnitOfWork
+from firebase_admin import firestore
 
 # budgets/{uid@YYYY-MM}
 # {
@@ -16,18 +17,24 @@ def _month_key(dt: Optional[datetime] = None):
 def _doc_id(uid: str, dt: Optional[datetime] = None):
     return f"{uid}@{_month_key(dt)}"
 
+def budget_key(uid: str):
+    """(collection, doc_id) of this month's budget, for DocLoader.load."""
+    return "budgets", _doc_id(uid)
+
 DEFAULTS = {
     "sms_used": 0, "sms_limit": 2,
     "llm_cents": 0, "llm_limit_cents": 1500,
     "voice_min": 0, "voice_limit_min": 30
 }
 
-def get_current(uid: str) -> Dict[str, Any]:
+def get_current(uid: str, loader: Optional[DocLoader] = None) -> Dict[str, Any]:
     db = get_db()
     ref = db.collection("budgets").document(_doc_id(uid))
-    snap = ref.get()
+    snap = loader.get("budgets", _doc_id(uid)) if loader is not None else ref.get()
     if not snap.exists:
         ref.set(DEFAULTS, merge=True)
+        if loader is not None:
+            loader.forget("budgets", _doc_id(uid))
         return DEFAULTS.copy()
     data = snap.to_dict()
     # ensure all keys exist
@@ -35,26 +42,54 @@ def get_current(uid: str) -> Dict[str, Any]:
         data.setdefault(k, v)
     return data
 
+async def a_get_current(uid: str, loader: Optional[DocLoader] = None) -> Dict[str, Any]:
+    ref = get_async_db().collection("budgets").document(_doc_id(uid))
+    snap = await loader.a_get(*budget_key(uid)) if loader is not None else await ref.get()
+    if not snap.exists:
+        await ref.set(DEFAULTS, merge=True)
+        if loader is not None:
+            loader.forget(*budget_key(uid))
+        return DEFAULTS.copy()
+    data = snap.to_dict()
+    for k, v in DEFAULTS.items():
+        data.setdefault(k, v)
+    return data
+
 def inc(uid: str, field: str, amount: int):
     db = get_db()
     ref = db.collection("budgets").document(_doc_id(uid))
     return ref.set({field: get_db().transaction(lambda t: None) or {}})  # placeholder to keep API stable
 
-def atomic_inc(uid: str, updates: Dict[str, int]):
+def atomic_inc(uid: str, updates: Dict[str, int], loader: Optional[DocLoader] = None):
     db = get_db()
     ref = db.collection("budgets").document(_doc_id(uid))
     db.run_transaction(lambda tr: _tx_inc(tr, ref, updates))
+    if loader is not None:
+        # the transaction has to read the live doc itself; the cached snapshot is stale now
+        loader.tally()
+        loader.forget(*budget_key(uid))
+
+async def a_atomic_inc(uid: str, updates: Dict[str, int]):
+    """Server-side Increment on the async client: atomic without a transaction read."""
+    ref = get_async_db().collection("budgets").document(_doc_id(uid))
+    await ref.set({k: firestore.Increment(int(v)) for k, v in updates.items()}, merge=True)
+
+def stage_inc(uow: UnitOfWork, uid: str, updates: Dict[str, int]):
+    """Add the increments to a unit of work (server-side Increment: no transaction read, committed with the rest)."""
+    uow.increment(*budget_key(uid), updates)
 
 def _tx_inc(tr, ref, updates: Dict[str, int]):
     snap = tr.get(ref)
-    if not snap.exists:
-        tr.set(ref, DEFAULTS)
-        snap = tr.get(ref)
-    data = snap.to_dict()
+    # transactions can't read their own writes: start from DEFAULTS instead of set-then-get
+    data = snap.to_dict() if snap.exists else dict(DEFAULTS)
     for k, v in updates.items():
         data[k] = int(data.get(k, 0)) + int(v)
     tr.set(ref, data, merge=True)
 
-def within_limit(uid: str, used_field: str, inc_val: int, limit_field: str) -> bool:
-    cur = get_current(uid)
-    return int(cur.get(used_field, 0)) + int(inc_val) <= int(cur.get(limit_field, 0)) 
\ No newline at end of file
+def within_limit(uid: str, used_field: str, inc_val: int, limit_field: str, loader: Optional[DocLoader] = None) -> bool:
+    cur = get_current(uid, loader)
+    return int(cur.get(used_field, 0)) + int(inc_val) <= int(cur.get(limit_field, 0))
+
+async def a_within_limit(uid: str, used_field: str, inc_val: int, limit_field: str, loader: Optional[DocLoader] = None) -> bool:
+    cur = await a_get_current(uid, loader)
+    return int(cur.get(used_field, 0)) + int(inc_val) <= int(cur.get(limit_field, 0))
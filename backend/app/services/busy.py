@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+from abc import ABC, abstractmethod
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+def _parse(iso: str) -> datetime:
+    return datetime.fromisoformat(iso.replace("Z", "+00:00"))
+
+class BusyProvider(ABC):
+    """
+    Source of busy time for one user.
+    busy_streams() returns one start-ordered [{"start": iso, "end": iso}] list per calendar;
+    busy() merges them into one start-ordered list.
+    """
+
+    calendar_ids: Sequence[str] = ("primary",)
+
+    @abstractmethod
+    def busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        ...
+
+    def busy(self, start_iso: str, end_iso: str) -> List[Dict]:
+        return list(heapq.merge(*self.busy_streams(start_iso, end_iso), key=lambda e: _parse(e["start"])))
+
+    async def a_busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        """busy_streams() for async routes; providers that call Google override this to await it."""
+        return await asyncio.to_thread(self.busy_streams, start_iso, end_iso)
+
+    async def a_busy(self, start_iso: str, end_iso: str) -> List[Dict]:
+        return list(heapq.merge(*await self.a_busy_streams(start_iso, end_iso), key=lambda e: _parse(e["start"])))
+
+def _subtract(spans: List[Dict], holes: List[Dict]) -> List[Dict]:
+    """Start-ordered spans with the time covered by holes cut out (a span may split in two)."""
+    cuts = [(_parse(h["start"]), _parse(h["end"]), h) for h in holes]
+    out = []
+    for span in spans:
+        pieces = [(span["start"], span["end"])]
+        for hs, he, h in cuts:
+            kept = []
+            for s, e in pieces:
+                if _parse(e) <= hs or _parse(s) >= he:
+                    kept.append((s, e))
+                    continue
+                if _parse(s) < hs:
+                    kept.append((s, h["start"]))
+                if _parse(e) > he:
+                    kept.append((h["end"], e))
+            pieces = kept
+        out.extend({"start": s, "end": e} for s, e in pieces)
+    return out
+
+class GoogleFreeBusyProvider(BusyProvider):
+    """
+    Google freebusy.query: only busy intervals, all calendars in one request.
+    Freebusy can't tell our published plan blocks from meetings, so the primary calendar's tagged
+    events are listed too and cut out; otherwise a regenerate would plan around its previous blocks.
+    (Time a meeting shares with one of our blocks is cut out with it.)
+    """
+
+    def __init__(self, refresh_token: str, calendar_ids: Sequence[str] = ("primary",)):
+        self.refresh_token = refresh_token
+        self.calendar_ids = list(calendar_ids)
+
+    def busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        from .google_calendar import PLAN_TAG, freebusy_query, list_events
+        own = list_events(self.refresh_token, start_iso, end_iso, "primary", PLAN_TAG) if "primary" in self.calendar_ids else []
+        return self._streams(freebusy_query(self.refresh_token, start_iso, end_iso, self.calendar_ids), own)
+
+    async def a_busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        from .async_calendar import async_calendar
+
+        async def own_events():
+            if "primary" not in self.calendar_ids:
+                return []
+            return (await async_calendar.list_block_events(self.refresh_token, start_iso, end_iso))[0]
+
+        result, own = await asyncio.gather(
+            async_calendar.freebusy_query(self.refresh_token, start_iso, end_iso, self.calendar_ids), own_events())
+        return self._streams(result, own)
+
+    def _streams(self, result: Dict, own_events: List[Dict]) -> List[List[Dict]]:
+        calendars = result.get("calendars", {})
+        own = [{"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+               for e in own_events if e.get("start", {}).get("dateTime") and e.get("end", {}).get("dateTime")]
+        out = []
+        for cal in self.calendar_ids:
+            entry = calendars.get(cal, {})
+            if entry.get("errors"):
+                print("[busy] freebusy error for", cal, entry["errors"])
+            busy = [{"start": b["start"], "end": b["end"]} for b in entry.get("busy", [])]
+            out.append(_subtract(busy, own) if cal == "primary" and own else busy)
+        return out
+
+class GoogleEventsBusyProvider(BusyProvider):
+    """Full event listing; for integrations granted before the freebusy scope was requested."""
+
+    def __init__(self, refresh_token: str, calendar_ids: Sequence[str] = ("primary",)):
+        self.refresh_token = refresh_token
+        self.calendar_ids = list(calendar_ids)
+
+    def busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        from .google_calendar import list_events, busy_from_items
+        return [[{"start": e["start"], "end": e["end"]} for e in busy_from_items(list_events(self.refresh_token, start_iso, end_iso, cal))]
+                for cal in self.calendar_ids]
+
+    async def a_busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        from .google_calendar import busy_from_items
+        from .async_calendar import async_calendar
+        listings = await asyncio.gather(*(async_calendar.list_events(self.refresh_token, start_iso, end_iso, cal)
+                                          for cal in self.calendar_ids))
+        return [[{"start": e["start"], "end": e["end"]} for e in busy_from_items(items)] for items in listings]
+
+class CachedEventsBusyProvider(BusyProvider):
+    """Busy time from the synced local event cache: a small delta request per calendar instead of a listing."""
+
+    def __init__(self, user_id: str, refresh_token: str, calendar_ids: Sequence[str] = ("primary",), cache=None):
+        from .event_cache import event_cache
+        self.user_id = user_id
+        self.refresh_token = refresh_token
+        self.calendar_ids = list(calendar_ids)
+        self.cache = cache or event_cache
+
+    def busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        out = []
+        for cal in self.calendar_ids:
+            self.cache.sync(self.user_id, self.refresh_token, cal)
+            out.append(self._stream(cal, start_iso, end_iso))
+        return out
+
+    async def a_busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        await asyncio.gather(*(self.cache.a_sync(self.user_id, self.refresh_token, cal) for cal in self.calendar_ids))
+        return [self._stream(cal, start_iso, end_iso) for cal in self.calendar_ids]
+
+    def _stream(self, calendar_id: str, start_iso: str, end_iso: str) -> List[Dict]:
+        return [{"start": e["start"], "end": e["end"]} for e in self.cache.busy(self.user_id, calendar_id, start_iso, end_iso)]
+
+class FakeBusyProvider(BusyProvider):
+    """Local busy calendars for tests and benchmarks; counts calls like a remote provider would."""
+
+    def __init__(self, calendars: Dict[str, List[Dict]]):
+        self.calendars = {cal: sorted(events, key=lambda e: _parse(e["start"])) for cal, events in calendars.items()}
+        self.calendar_ids = list(self.calendars)
+        self.calls = 0
+
+    @classmethod
+    def synthetic(cls, day0: datetime, n_calendars: int = 1, events_per_calendar: int = 8, seed: int = 7) -> "FakeBusyProvider":
+        rng = random.Random(seed)
+        calendars = {}
+        for c in range(n_calendars):
+            events = []
+            for _ in range(events_per_calendar):
+                s = day0 + timedelta(minutes=rng.randrange(7 * 60, 21 * 60, 15))
+                e = s + timedelta(minutes=rng.choice([15, 30, 45, 60, 90]))
+                events.append({"start": s.isoformat(), "end": e.isoformat()})
+            calendars[f"cal{c}"] = events
+        return cls(calendars)
+
+    async def a_busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        return self.busy_streams(start_iso, end_iso)
+
+    def busy_streams(self, start_iso: str, end_iso: str) -> List[List[Dict]]:
+        self.calls += 1
+        lo, hi = _parse(start_iso), _parse(end_iso)
+        return [[e for e in self.calendars[cal] if _parse(e["start"]) < hi and _parse(e["end"]) > lo]
+                for cal in self.calendar_ids]
+
+USE_EVENT_CACHE = os.getenv("CALENDAR_EVENT_CACHE", "1") != "0"
+
+def provider_for(google: Dict, user_id: Optional[str] = None) -> Optional[BusyProvider]:
+    """
+    Busy provider for an integration's "google" entry (None without a refresh token).
+    With the user's id the synced event cache is used; otherwise Google is asked directly.
+    """
+    refresh_token = google.get("refresh_token")
+    if not refresh_token:
+        return None
+    calendar_ids = google.get("calendar_ids") or ["primary"]
+    if user_id and USE_EVENT_CACHE:
+        return CachedEventsBusyProvider(user_id, refresh_token, calendar_ids)
+    if "calendar.freebusy" in google.get("scopes", []):
+        return GoogleFreeBusyProvider(refresh_token, calendar_ids)
+    return GoogleEventsBusyProvider(refresh_token, calendar_ids)
@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+class _Client:
+    def __init__(self, creds, service, http):
+        self.creds = creds
+        self.service = service
+        self.http = http  # underlying httplib2.Http; kept so token refreshes reuse the connection pool
+        self.lock = threading.Lock()  # httplib2 connections aren't thread-safe; one request at a time per client
+
+class CalendarClientPool:
+    """
+    Bounded LRU of Calendar API clients, one per (refresh token, scopes).
+    A client keeps its Credentials (so the access token is reused until shortly before it
+    expires) and its HTTP connection; requests through the same client are serialized.
+    """
+
+    def __init__(self, max_clients: int = 256, refresh_margin_s: float = 300):
+        self.max_clients = max_clients
+        self.refresh_margin = timedelta(seconds=refresh_margin_s)
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[Tuple[str, Tuple[str, ...]], _Client]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+
+    @contextmanager
+    def client(self, refresh_token: str, scopes: List[str]) -> Iterator[Any]:
+        """Yields a ready Calendar service (valid access token) for the duration of one call."""
+        key = (refresh_token, tuple(sorted(scopes)))
+        with self._lock:
+            c = self._clients.get(key)
+            if c is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if c is None:
+            c = _Client(*self._open(refresh_token, list(scopes)))
+            with self._lock:
+                # another thread may have opened the same client meanwhile; keep the first
+                c = self._clients.setdefault(key, c)
+                self._clients.move_to_end(key)
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+                    self.evictions += 1
+        with c.lock:
+            if self._needs_refresh(c.creds):
+                self._refresh(c)
+                with self._lock:
+                    self.refreshes += 1
+            yield c.service
+
+    def _needs_refresh(self, creds) -> bool:
+        if not creds.token or creds.expiry is None:
+            return True
+        # google-auth keeps expiry as naive UTC
+        return creds.expiry - datetime.utcnow() <= self.refresh_margin
+
+    def _open(self, refresh_token: str, scopes: List[str]):
+        import httplib2
+        import google_auth_httplib2
+        from googleapiclient.discovery import build
+        from .google_calendar import build_creds
+        creds = build_creds(refresh_token, os.getenv("GOOGLE_CLIENT_ID"), os.getenv("GOOGLE_CLIENT_SECRET"), scopes)
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=30))
+        return creds, build("calendar", "v3", http=http, cache_discovery=False), http.http
+
+    def _refresh(self, c: _Client):
+        import google_auth_httplib2
+        c.creds.refresh(google_auth_httplib2.Request(c.http))
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "clients": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "evictions": self.evictions,
+            }
+
+calendar_pool = CalendarClientPool(
+    max_clients=int(os.getenv("CALENDAR_POOL_MAX_CLIENTS", "256")),
+    refresh_margin_s=float(os.getenv("CALENDAR_TOKEN_MARGIN_S", "300")),
+)
@@ -0,0 +1,172 @@
+"""
+Google Calendar push channels ("watch"): Google pings /calendar/webhook when a watched calendar
+changes, and the ping only marks the cached copy dirty so the next read syncs the delta.
+Channels expire (CHANNEL_TTL_S at most); `renew` re-opens the ones close to expiry:
+    python -m app.services.calendar_watch renew
+    python -m app.services.calendar_watch simulate --user u1 --calendar primary   # fake ping to a local server
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+WEBHOOK_URL = os.getenv("CALENDAR_WEBHOOK_URL")  # public https address of /calendar/webhook
+WEBHOOK_SECRET = os.getenv("CALENDAR_WEBHOOK_SECRET", "")  # signs channel tokens; without it no channel is opened or ping accepted
+CHANNEL_TTL_S = int(os.getenv("CALENDAR_CHANNEL_TTL_S", str(7 * 24 * 3600)))
+RENEW_BEFORE_S = 24 * 3600
+AUTO_REPLAN_S = float(os.getenv("CALENDAR_AUTO_REPLAN_S", "0"))  # debounce for replans after a change; 0 = off
+
+def channel_token(user_id: str, calendar_id: str) -> str:
+    """Channel token Google echoes on every ping: who and which calendar, signed so it can't be forged."""
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("CALENDAR_WEBHOOK_SECRET missing")
+    payload = f"{user_id}|{calendar_id}"
+    sig = hmac.new(WEBHOOK_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{payload}|{sig}"
+
+def parse_channel_token(token: str) -> Optional[Tuple[str, str]]:
+    parts = (token or "").rsplit("|", 2)
+    if not WEBHOOK_SECRET or len(parts) != 3 or not hmac.compare_digest(channel_token(parts[0], parts[1]), token):
+        return None
+    return parts[0], parts[1]
+
+def needs_renewal(channel: Optional[Dict], now: Optional[float] = None) -> bool:
+    if not channel:
+        return True
+    now = time.time() if now is None else now
+    return channel.get("expiration", 0) / 1000 - now < RENEW_BEFORE_S
+
+async def ensure_watch(user_id: str, google: Dict, force: bool = False) -> Dict[str, Dict]:
+    """
+    Open (or renew, when close to expiry) a channel per calendar of the integration and record them
+    under google.channels in `integrations`. returns the channels by calendar id
+    """
+    from .async_calendar import async_calendar, CalendarAPIError
+    from .event_cache import event_cache
+    from .repo import a_set_doc
+    if not WEBHOOK_URL:
+        raise RuntimeError("CALENDAR_WEBHOOK_URL missing")
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("CALENDAR_WEBHOOK_SECRET missing")  # an empty key would let anyone forge channel tokens
+    refresh_token = google["refresh_token"]
+    channels = dict(google.get("channels", {}))
+    changed = False
+    for cal in google.get("calendar_ids") or ["primary"]:
+        old = channels.get(cal)
+        if not force and not needs_renewal(old):
+            continue
+        resp = await async_calendar.watch_events(refresh_token, cal, uuid.uuid4().hex, WEBHOOK_URL,
+                                                 channel_token(user_id, cal), CHANNEL_TTL_S)
+        channels[cal] = {"id": resp["id"], "resource_id": resp["resourceId"],
+                         "expiration": int(resp["expiration"]), "renewed_at": int(time.time())}
+        changed = True
+        event_cache.set_watch(user_id, cal, int(resp["expiration"]) / 1000)
+        if old:
+            # the old channel would keep pinging until it expires
+            try:
+                await async_calendar.stop_channel(refresh_token, old["id"], old["resource_id"])
+            except CalendarAPIError as e:
+                print("[calendar_watch] stop failed:", e)
+    if changed:
+        await a_set_doc("integrations", user_id, {"google": {"channels": channels}})
+    return channels
+
+async def renew_all() -> Dict:
+    """Renew every channel within RENEW_BEFORE_S of expiry (run daily from cron)."""
+    from .repo import integrations_ref
+    docs = await asyncio.to_thread(lambda: list(integrations_ref().stream()))
+    stats = {"checked": 0, "renewed": 0, "failed": 0}
+    for doc in docs:
+        google = (doc.to_dict() or {}).get("google", {})
+        if not google.get("refresh_token") or not google.get("channels"):
+            continue
+        stats["checked"] += 1
+        if not any(needs_renewal(google["channels"].get(cal)) for cal in google.get("calendar_ids") or ["primary"]):
+            continue
+        try:
+            await ensure_watch(doc.id, google)
+            stats["renewed"] += 1
+        except Exception as e:
+            print("[calendar_watch] renew failed for", doc.id, e)
+            stats["failed"] += 1
+    return stats
+
+def handle_notification(headers: Dict[str, str]) -> Optional[Dict]:
+    """
+    Apply one Google push notification (X-Goog-* headers). None if the channel token is invalid.
+    "sync" is the handshake sent when a channel opens; "exists"/"not_exists" mean something changed.
+    """
+    from .event_cache import event_cache
+    who = parse_channel_token(headers.get("x-goog-channel-token", ""))
+    if who is None:
+        return None
+    user_id, calendar_id = who
+    state = headers.get("x-goog-resource-state", "")
+    if state != "sync":
+        event_cache.mark_dirty(user_id, calendar_id)
+    return {"user_id": user_id, "calendar_id": calendar_id, "state": state}
+
+class Debouncer:
+    """Runs fn(key) once, delay_s after the last poke(key); a burst of pings costs one call."""
+
+    def __init__(self, delay_s: float, fn: Callable[[str], Awaitable]):
+        self.delay_s = delay_s
+        self.fn = fn
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.runs = 0
+
+    def poke(self, key: str):
+        task = self._tasks.get(key)
+        if task and not task.done():
+            task.cancel()
+        self._tasks[key] = asyncio.ensure_future(self._later(key))
+
+    def pending(self) -> List[str]:
+        return [k for k, t in self._tasks.items() if not t.done()]
+
+    async def _later(self, key: str):
+        await asyncio.sleep(self.delay_s)
+        self._tasks.pop(key, None)
+        self.runs += 1
+        try:
+            await self.fn(key)
+        except Exception as e:
+            print("[calendar_watch] debounced call failed for", key, e)
+
+def simulated_headers(user_id: str, calendar_id: str = "primary", state: str = "exists", message_number: int = 1) -> Dict[str, str]:
+    """Headers of a push notification as Google would send them, for local testing."""
+    return {
+        "X-Goog-Channel-ID": "sim-" + uuid.uuid4().hex[:8],
+        "X-Goog-Channel-Token": channel_token(user_id, calendar_id),
+        "X-Goog-Resource-ID": "sim-resource",
+        "X-Goog-Resource-State": state,
+        "X-Goog-Message-Number": str(message_number),
+    }
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Google Calendar push channels")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("renew", help="renew channels close to expiry")
+    sim = sub.add_parser("simulate", help="post fake change notifications to a running server")
+    sim.add_argument("--user", required=True)
+    sim.add_argument("--calendar", default="primary")
+    sim.add_argument("--state", default="exists", choices=["sync", "exists", "not_exists"])
+    sim.add_argument("--count", type=int, default=1)
+    sim.add_argument("--url", default="http://localhost:8080/calendar/webhook")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "renew":
+        print(json.dumps(asyncio.run(renew_all())))
+        return
+    import httpx
+    for n in range(1, args.count + 1):
+        r = httpx.post(args.url, headers=simulated_headers(args.user, args.calendar, args.state, n))
+        print(r.status_code, r.text)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
 from datetime import datetime, time, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
+import numpy as np
+
+DAY_MIN = 24 * 60
+
+def _in_window(t, start, end):
+    # scalar times or arrays of minutes; windows with start > end cross midnight
+    if start <= end:
+        return (t >= start) & (t < end)
+    return (t >= start) | (t < end)
+
+def _overlaps(s_t, e_t, start, end):
+    # same-day comparison only (MVP): a slot ending exactly at `start` doesn't hit it
+    return (e_t > start) & (s_t < end)
 
 def within_quiet_hours(dt_start: datetime, dt_end: datetime, quiet_start: time, quiet_end: time) -> bool:
     # Handles windows that cross midnight
-    def in_q(dt):
-        t = dt.time()
-        if quiet_start <= quiet_end:
-            return quiet_start <= t < quiet_end
-        # crosses midnight
-        return t >= quiet_start or t < quiet_end
-    return in_q(dt_start) or in_q(dt_end - timedelta(seconds=1))
+    return bool(_in_window(dt_start.time(), quiet_start, quiet_end)
+                or _in_window((dt_end - timedelta(seconds=1)).time(), quiet_start, quiet_end))
 
 def hard_block_conflict(dt_start: datetime, dt_end: datetime, hard_blocks: List[Dict]) -> bool:
     # hard_blocks: [{"label":"work","start":"09:00","end":"17:00","days":[1,2,3,4,5]}]
@@ -17,13 +25,74 @@ def hard_block_conflict(dt_start: datetime, dt_end: datetime, hard_blocks: List[
     for hb in hard_blocks:
         if wd not in hb.get("days", []): 
             continue
-        s = time.fromisoformat(hb["start"])
-        e = time.fromisoformat(hb["end"])
-        # same-day comparison only (MVP)
-        if not (dt_end.time() <= s or dt_start.time() >= e):
+        if _overlaps(dt_start.time(), dt_end.time(), time.fromisoformat(hb["start"]), time.fromisoformat(hb["end"])):
             return True
     return False
 
+def _minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+def quiet_hours_mask(starts, ends, profile) -> np.ndarray:
+    """
+    Batch within_quiet_hours for minute-aligned slots, from a compiled profile's quiet_ranges.
+    starts/ends: minutes from a midnight (NumPy array, array('i') or list); returns a bool mask
+    """
+    starts = np.asarray(starts, dtype=np.int64) % DAY_MIN
+    last = (np.asarray(ends, dtype=np.int64) - 1) % DAY_MIN  # the slot's last minute
+    hit = np.zeros(starts.shape, dtype=bool)
+    for lo, hi in profile.quiet_ranges:
+        hit |= _in_window(starts, lo, hi) | _in_window(last, lo, hi)
+    return hit
+
+def hard_block_mask(starts, ends, profile, day0: datetime) -> np.ndarray:
+    """
+    Batch hard_block_conflict for minute-aligned slots, from a compiled profile's per-weekday hard_ranges.
+    starts/ends: minutes from midnight of `day0` (gives each slot's weekday); returns a bool mask
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    weekday = (day0.isoweekday() - 1 + starts // DAY_MIN) % 7 + 1
+    s_t, e_t = starts % DAY_MIN, ends % DAY_MIN
+    hit = np.zeros(starts.shape, dtype=bool)
+    for wd in range(1, 8):
+        if profile.hard_ranges[wd]:
+            on_day = weekday == wd
+            for s, e in profile.hard_ranges[wd]:
+                hit |= on_day & _overlaps(s_t, e_t, s, e)
+    return hit
+
+def daily_load_mask(starts, ends, used_per_day: Sequence[int], max_minutes_per_day: int = 300) -> np.ndarray:
+    """
+    Batch daily-load check: True where a slot would push its start day past max_minutes_per_day.
+    used_per_day[d]: minutes already planned on day d (days before day0 or past the end count as empty)
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    per_day = np.asarray(used_per_day, dtype=np.int64)
+    day = starts // DAY_MIN
+    known = (day >= 0) & (day < len(per_day))
+    used = np.zeros(starts.shape, dtype=np.int64)
+    used[known] = per_day[day[known]]
+    return used + (ends - starts) > max_minutes_per_day
+
+def check_slots(starts, ends, day0: datetime, user_prefs: Dict,
+                used_per_day: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Quiet-hour, hard-block and daily-load (max_day_min) violations for many candidate slots in one call,
+    checked against the same cached compiled profile the planner uses.
+    starts/ends: minutes from midnight of `day0`
+    returns {"quiet", "hard", "load", "any"} bool masks
+    """
+    from .constraints import compile_profile  # constraints imports this module
+    profile = compile_profile(user_prefs)
+    out = {
+        "quiet": quiet_hours_mask(starts, ends, profile),
+        "hard": hard_block_mask(starts, ends, profile, day0),
+        "load": daily_load_mask(starts, ends, used_per_day if used_per_day is not None else [], profile.max_day_min),
+    }
+    out["any"] = out["quiet"] | out["hard"] | out["load"]
+    return out
+
 def exceeds_daily_load(existing_blocks: List[Dict], candidate_min: int, max_minutes_per_day: int = 300) -> bool:
     # existing_blocks items: {"start": iso, "end": iso}
     total = 0
@@ -36,4 +105,45 @@ def _duration_min(start_iso: str, end_iso: str) -> int:
     from datetime import datetime, timezone
     s = datetime.fromisoformat(start_iso.replace("Z","+00:00"))
     e = datetime.fromisoformat(end_iso.replace("Z","+00:00"))
-    return int((e - s).total_seconds() // 60) 
\ No newline at end of file
+    return int((e - s).total_seconds() // 60) 
+
+
+def _day_key(iso: str) -> str:
+    # calendar date of an ISO timestamp as written (UTC "Z" for plan blocks)
+    return iso[:10]
+
+class DailyLoad:
+    """
+    Running per-day minute totals for placed blocks.
+    Each block is parsed once when added, so checking a candidate is O(1)
+    no matter how many blocks are already on the plan.
+    """
+
+    def __init__(self, max_minutes_per_day: int = 300, blocks: Optional[List[Dict]] = None):
+        self.max_minutes_per_day = max_minutes_per_day
+        self.totals: Dict[str, int] = {}
+        for b in blocks or []:
+            self.add_block(b)
+
+    def add(self, day: str, minutes: int):
+        self.totals[day] = self.totals.get(day, 0) + minutes
+
+    def add_block(self, block: Dict):
+        # block: {"start": iso, "end": iso}
+        self.add(_day_key(block["start"]), _duration_min(block["start"], block["end"]))
+
+    def remove_block(self, block: Dict):
+        self.add(_day_key(block["start"]), -_duration_min(block["start"], block["end"]))
+
+    def used(self, day: str) -> int:
+        return self.totals.get(day, 0)
+
+    def remaining(self, day: str) -> int:
+        return self.max_minutes_per_day - self.used(day)
+
+    def exceeds(self, day: str, candidate_min: int) -> bool:
+        return (self.used(day) + candidate_min) > self.max_minutes_per_day
+
+    def full_days(self, candidate_min: int) -> List[str]:
+        """Days that already hold blocks and can't take another `candidate_min` minutes."""
+        return [d for d in self.totals if self.exceeds(d, candidate_min)]
@@ -0,0 +1,80 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime, time
+from functools import lru_cache
+from typing import Dict, FrozenSet, Tuple
+from .conflict_engine import within_quiet_hours
+
+PROFILE_CACHE_SIZE = 4096
+DEFAULT_QUIET = {"start": "22:00", "end": "07:00"}
+
+def _tod(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+def _on_minute(t: time) -> bool:
+    return t.second == 0 and t.microsecond == 0
+
+@dataclass(frozen=True)
+class ConstraintProfile:
+    """
+    A user's quiet hours, hard blocks and daily cap, parsed once.
+    Times are wall-clock as the planner sees them (UTC for now, see pack_tasks).
+    quiet_ranges: [start, end) minute-of-day ranges; hard_ranges[isoweekday]: same, per weekday.
+    """
+    quiet_start: time
+    quiet_end: time
+    hard: Tuple[Tuple[time, time, FrozenSet[int]], ...]
+    max_day_min: int
+    quiet_ranges: Tuple[Tuple[int, int], ...]
+    hard_ranges: Tuple[Tuple[Tuple[int, int], ...], ...]
+    exact: bool  # every boundary is on a whole minute
+
+    def quiet(self, dt_start: datetime, dt_end: datetime) -> bool:
+        return within_quiet_hours(dt_start, dt_end, self.quiet_start, self.quiet_end)
+
+    def hard_conflict(self, dt_start: datetime, dt_end: datetime) -> bool:
+        # same rules as conflict_engine.hard_block_conflict, without re-parsing the blocks
+        wd = dt_start.isoweekday()
+        s_t, e_t = dt_start.time(), dt_end.time()
+        for s, e, days in self.hard:
+            if wd in days and not (e_t <= s or s_t >= e):
+                return True
+        return False
+
+    def conflicts(self, dt_start: datetime, dt_end: datetime) -> bool:
+        return self.quiet(dt_start, dt_end) or self.hard_conflict(dt_start, dt_end)
+
+def compile_profile(user_prefs: Dict) -> ConstraintProfile:
+    """Compiled profile for `user_prefs`; identical prefs share one cached (LRU) instance."""
+    key = json.dumps({
+        "quiet_hours": user_prefs.get("quiet_hours", DEFAULT_QUIET),
+        "hard_blocks": user_prefs.get("hard_blocks", []),
+        "max_day_min": user_prefs.get("max_day_min", 300),
+    }, sort_keys=True)
+    return _compile(key)
+
+@lru_cache(maxsize=PROFILE_CACHE_SIZE)
+def _compile(key: str) -> ConstraintProfile:
+    prefs = json.loads(key)
+    q = prefs["quiet_hours"]
+    qs, qe = time.fromisoformat(q["start"]), time.fromisoformat(q["end"])
+    hard = tuple((time.fromisoformat(hb["start"]), time.fromisoformat(hb["end"]), frozenset(hb.get("days", [])))
+                 for hb in prefs["hard_blocks"])
+    if _tod(qs) <= _tod(qe):
+        quiet_ranges = ((_tod(qs), _tod(qe)),)
+    else:
+        # crosses midnight
+        quiet_ranges = ((_tod(qs), 24 * 60), (0, _tod(qe)))
+    hard_ranges = tuple(tuple((_tod(s), _tod(e)) for s, e, days in hard if wd in days) for wd in range(8))
+    return ConstraintProfile(
+        quiet_start=qs,
+        quiet_end=qe,
+        hard=hard,
+        max_day_min=int(prefs["max_day_min"]),
+        quiet_ranges=quiet_ranges,
+        hard_ranges=hard_ranges,
+        exact=_on_minute(qs) and _on_minute(qe) and all(_on_minute(s) and _on_minute(e) for s, e, _ in hard),
+    )
+
+def profile_cache_info():
+    return _compile.cache_info()
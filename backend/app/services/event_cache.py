@@ -0,0 +1,277 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+SYNC_LOOKBACK_DAYS = 1  # a full sync starts this far back; older events are pruned
+
+def _parse(iso: str) -> datetime:
+    dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    # all-day events carry a bare date; treat it as UTC midnight
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+def compact_event(item: Dict) -> Dict:
+    """The fields the planner and /calendar/sync use; keeps cache documents small."""
+    from .google_calendar import plan_block_id
+    start, end = item.get("start", {}), item.get("end", {})
+    return {
+        "id": item.get("id"),
+        "summary": item.get("summary"),
+        "start": start.get("dateTime") or start.get("date"),
+        "end": end.get("dateTime") or end.get("date"),
+        "all_day": "dateTime" not in start,
+        "transparent": item.get("transparency") == "transparent",
+        "plan_block": plan_block_id(item),  # set on the events we published from a plan
+    }
+
+class FirestoreEventStore:
+    """One "calendar_cache" document per (user, calendar): sync token + compact events by id."""
+
+    def _ref(self, user_id: str, calendar_id: str):
+        from .storage import get_db
+        return get_db().collection("calendar_cache").document(f"{user_id}@{calendar_id}")
+
+    def load(self, user_id: str, calendar_id: str) -> Optional[Dict]:
+        doc = self._ref(user_id, calendar_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def update(self, user_id: str, calendar_id: str, fields: Dict):
+        self._ref(user_id, calendar_id).set(fields, merge=True)
+
+    def save(self, user_id: str, calendar_id: str, state: Dict):
+        # MVP: events live inline, so a calendar is capped by Firestore's 1 MiB document limit
+        # (roughly 5k compact events within the lookback); move to a subcollection if that bites.
+        self._ref(user_id, calendar_id).set(state)
+
+class MemoryEventStore:
+    """Store for tests and offline runs."""
+
+    def __init__(self):
+        self.docs: Dict[Tuple[str, str], Dict] = {}
+        self.writes = 0
+
+    def load(self, user_id: str, calendar_id: str) -> Optional[Dict]:
+        return self.docs.get((user_id, calendar_id))
+
+    def update(self, user_id: str, calendar_id: str, fields: Dict):
+        self.writes += 1
+        self.docs[(user_id, calendar_id)] = {**self.docs.get((user_id, calendar_id), {}), **fields}
+
+    def save(self, user_id: str, calendar_id: str, state: Dict):
+        self.writes += 1
+        self.docs[(user_id, calendar_id)] = state
+
+def _google_fetch(refresh_token, calendar_id, sync_token=None, time_min=None):
+    from .google_calendar import list_event_changes
+    return list_event_changes(refresh_token, calendar_id, sync_token, time_min)
+
+async def _google_a_fetch(refresh_token, calendar_id, sync_token=None, time_min=None):
+    from .async_calendar import async_calendar
+    return await async_calendar.list_event_changes(refresh_token, calendar_id, sync_token, time_min)
+
+class EventCache:
+    """
+    Local copy of users' Google calendars kept current with incremental sync.
+    The first sync lists everything from SYNC_LOOKBACK_DAYS ago on; later ones send the stored
+    syncToken and apply only the changes. A 410 Gone drops the copy and does a full sync again.
+    State is persisted in `store` (Firestore by default) with an in-process LRU tier in front;
+    syncs closer together than min_interval_s reuse the local copy without calling Google.
+    Calendars with a push channel (see calendar_watch) are only synced after a change notification
+    marked them dirty, or watch_trust_s after the last sync (other workers don't see this one's flag).
+    """
+
+    def __init__(self, store=None, fetch: Optional[Callable] = None, max_entries: int = 1024,
+                 min_interval_s: float = 30, a_fetch: Optional[Callable] = None, watch_trust_s: float = 600):
+        self.store = store if store is not None else FirestoreEventStore()
+        self.fetch = fetch or _google_fetch
+        self.a_fetch = a_fetch or _google_a_fetch
+        self.max_entries = max_entries
+        self.min_interval_s = min_interval_s
+        self.watch_trust_s = watch_trust_s
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._async_key_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._pings: Dict[Tuple[str, str], int] = {}
+        self.full_syncs = 0
+        self.delta_syncs = 0
+        self.resyncs = 0
+        self.skipped = 0
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _async_key_lock(self, key) -> asyncio.Lock:
+        # a threading lock held across an await would block the event loop
+        return self._async_key_locks.setdefault(key, asyncio.Lock())
+
+    def _state(self, key) -> Optional[Dict]:
+        with self._lock:
+            state = self._mem.get(key)
+            if state is not None:
+                self._mem.move_to_end(key)
+                return state
+        state = self.store.load(*key)
+        if state is not None:
+            self._remember(key, state)
+        return state
+
+    def _remember(self, key, state: Dict):
+        with self._lock:
+            self._mem[key] = state
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def _fresh(self, state: Optional[Dict], force: bool, now: float) -> bool:
+        if not state or force or state.get("dirty"):
+            return False
+        age = now - state.get("synced_at", 0)
+        watched = state.get("watch_expires", 0) > now
+        if age < self.min_interval_s or (watched and age < self.watch_trust_s):
+            with self._lock:
+                self.skipped += 1
+            return True
+        return False
+
+    def _expired(self, user_id: str, calendar_id: str):
+        print("[event_cache] sync token expired, full resync for", user_id, calendar_id)
+        with self._lock:
+            self.resyncs += 1
+
+    def _apply(self, state: Optional[Dict], items: List[Dict], token: str, full: bool, now: float) -> Tuple[Dict, bool]:
+        """(new state, whether it needs saving) after applying a full listing or a delta."""
+        events = {} if full else dict(state["events"])
+        for item in items:
+            if item.get("status") == "cancelled":
+                events.pop(item.get("id"), None)
+            else:
+                events[item["id"]] = compact_event(item)
+        new_state = {"sync_token": token, "events": events, "synced_at": now}
+        if state and state.get("watch_expires"):
+            new_state["watch_expires"] = state["watch_expires"]
+        if not (full or items or (state or {}).get("dirty")):
+            return new_state, False  # an unchanged delta keeps the stored token valid; skip the write
+        cutoff = datetime.now(timezone.utc) - timedelta(days=SYNC_LOOKBACK_DAYS)
+        new_state["events"] = {i: e for i, e in events.items() if e["end"] and _parse(e["end"]) > cutoff}
+        return new_state, True
+
+    def _done(self, key, new_state: Dict, full: bool, changes: int, requests: int, pings: int) -> Dict:
+        with self._lock:
+            if self._pings.get(key, 0) != pings:
+                new_state["dirty"] = True  # notified while this sync was in flight; the change may be missing
+        self._remember(key, new_state)
+        with self._lock:
+            if full:
+                self.full_syncs += 1
+            else:
+                self.delta_syncs += 1
+        return {"full": full, "changes": changes, "requests": requests, "events": len(new_state["events"])}
+
+    @staticmethod
+    def _time_min() -> str:
+        return (datetime.now(timezone.utc) - timedelta(days=SYNC_LOOKBACK_DAYS)).isoformat()
+
+    def sync(self, user_id: str, refresh_token: str, calendar_id: str = "primary", force: bool = False) -> Dict:
+        """
+        Bring the cached calendar up to date.
+        returns {"full": bool, "changes": n, "requests": n pages fetched, "events": n cached}
+        """
+        from .google_calendar import SyncTokenExpired
+        key = (user_id, calendar_id)
+        with self._key_lock(key):
+            state = self._state(key)
+            pings = self._pings.get(key, 0)
+            now = time.time()
+            if self._fresh(state, force, now):
+                return {"full": False, "changes": 0, "requests": 0, "events": len(state["events"])}
+            full = not state or not state.get("sync_token")
+            if not full:
+                try:
+                    items, token, requests = self.fetch(refresh_token, calendar_id, sync_token=state["sync_token"])
+                except SyncTokenExpired:
+                    self._expired(user_id, calendar_id)
+                    full = True
+            if full:
+                items, token, requests = self.fetch(refresh_token, calendar_id, time_min=self._time_min())
+            new_state, changed = self._apply(state, items, token, full, now)
+            if changed:
+                self.store.save(user_id, calendar_id, new_state)
+            return self._done(key, new_state, full, len(items), requests, pings)
+
+    async def a_sync(self, user_id: str, refresh_token: str, calendar_id: str = "primary", force: bool = False) -> Dict:
+        """sync() for async routes: Google is called through the async client, the store from a thread."""
+        from .google_calendar import SyncTokenExpired
+        key = (user_id, calendar_id)
+        async with self._async_key_lock(key):
+            state = await asyncio.to_thread(self._state, key)
+            pings = self._pings.get(key, 0)
+            now = time.time()
+            if self._fresh(state, force, now):
+                return {"full": False, "changes": 0, "requests": 0, "events": len(state["events"])}
+            full = not state or not state.get("sync_token")
+            if not full:
+                try:
+                    items, token, requests = await self.a_fetch(refresh_token, calendar_id, sync_token=state["sync_token"])
+                except SyncTokenExpired:
+                    self._expired(user_id, calendar_id)
+                    full = True
+            if full:
+                items, token, requests = await self.a_fetch(refresh_token, calendar_id, time_min=self._time_min())
+            new_state, changed = self._apply(state, items, token, full, now)
+            if changed:
+                await asyncio.to_thread(self.store.save, user_id, calendar_id, new_state)
+            return self._done(key, new_state, full, len(items), requests, pings)
+
+    def mark_dirty(self, user_id: str, calendar_id: str):
+        """The calendar changed (push notification): the next sync goes to Google whatever its age."""
+        self._flag(user_id, calendar_id, {"dirty": True})
+
+    def set_watch(self, user_id: str, calendar_id: str, expires_at: float):
+        """A push channel covers the calendar until expires_at (epoch seconds)."""
+        self._flag(user_id, calendar_id, {"watch_expires": expires_at})
+
+    def _flag(self, user_id: str, calendar_id: str, fields: Dict):
+        key = (user_id, calendar_id)
+        with self._lock:
+            if fields.get("dirty"):
+                self._pings[key] = self._pings.get(key, 0) + 1
+            state = self._mem.get(key)
+            if state is not None:
+                self._mem[key] = {**state, **fields}
+        self.store.update(user_id, calendar_id, fields)
+
+    def events(self, user_id: str, calendar_id: str, start_iso: str, end_iso: str) -> List[Dict]:
+        """Cached events overlapping [start_iso, end_iso), by start; no network. Call sync() first."""
+        state = self._state((user_id, calendar_id))
+        if not state:
+            return []
+        lo, hi = _parse(start_iso), _parse(end_iso)
+        out = [e for e in state.get("events", {}).values()
+               if e["start"] and e["end"] and _parse(e["start"]) < hi and _parse(e["end"]) > lo]
+        return sorted(out, key=lambda e: _parse(e["start"]))
+
+    def busy(self, user_id: str, calendar_id: str, start_iso: str, end_iso: str) -> List[Dict]:
+        """Timed, opaque cached events in range as start-ordered busy spans, minus our own plan's (like busy_from_items)."""
+        return [{"id": e["id"], "start": e["start"], "end": e["end"], "summary": e["summary"]}
+                for e in self.events(user_id, calendar_id, start_iso, end_iso)
+                if not e["all_day"] and not e["transparent"] and not e.get("plan_block")]
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._mem), "full_syncs": self.full_syncs, "delta_syncs": self.delta_syncs,
+                    "resyncs": self.resyncs, "skipped": self.skipped}
+
+event_cache = EventCache(
+    max_entries=int(os.getenv("EVENT_CACHE_MAX_ENTRIES", "1024")),
+    min_interval_s=float(os.getenv("EVENT_SYNC_MIN_INTERVAL_S", "30")),
+    watch_trust_s=float(os.getenv("EVENT_WATCH_TRUST_S", "600")),
+)
@@ -1,10 +1,9 @@
 import base64, json, firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 from functools import lru_cache
 import os
 
-@lru_cache()
-def get_db():
+def _init_app():
     b64 = os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON_BASE64")
     if not b64:
         raise RuntimeError("FIREBASE_SERVICE_ACCOUNT_JSON_BASE64 missing")
@@ -12,4 +11,13 @@ def get_db():
     cred = credentials.Certificate(info)
     if not firebase_admin._apps:
         firebase_admin.initialize_app(cred, {'projectId': os.getenv("FIREBASE_PROJECT_ID")})
-    return firestore.client() 
\ No newline at end of file
+
+@lru_cache()
+def get_db():
+    _init_app()
+    return firestore.client()
+
+@lru_cache()
+def get_async_db():
+    _init_app()
+    return firestore_async.client()
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from .conflict_engine import DailyLoad
+from .occupancy import OccupancyGrid, DAY_MIN
+from .constraints import compile_profile
+from .scheduler import pack_tasks, score, _make_block, _iso
+
+class _SegmentIndex:
+    """
+    Max segment tree over free-segment lengths, so "first segment (in time order) with at
+    least n free minutes" is O(log segments). Segments only ever shrink from the front.
+    """
+
+    def __init__(self, lengths: List[int]):
+        self.size = 1
+        while self.size < max(len(lengths), 1):
+            self.size *= 2
+        self.tree = [0] * (2 * self.size)
+        self.tree[self.size:self.size + len(lengths)] = lengths
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def get(self, i: int) -> int:
+        return self.tree[self.size + i]
+
+    def set(self, i: int, length: int):
+        i += self.size
+        self.tree[i] = length
+        i //= 2
+        while i:
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+            i //= 2
+
+    def first_at_least(self, n: int, lo: int = 0) -> Optional[int]:
+        return self._find(1, 0, self.size, n, lo)
+
+    def _find(self, node: int, l: int, r: int, n: int, lo: int) -> Optional[int]:
+        if r <= lo or self.tree[node] < n:
+            return None
+        if node >= self.size:
+            return l
+        mid = (l + r) // 2
+        found = self._find(2 * node, l, mid, n, lo)
+        return found if found is not None else self._find(2 * node + 1, mid, r, n, lo)
+
+def pack_tasks_fragmented(free_windows: List[Tuple[datetime, datetime]],
+                          tasks: List[Dict],
+                          user_prefs: Dict,
+                          existing_blocks_today: List[Dict],
+                          min_chunk_min: int = 25) -> List[Dict]:
+    """
+    Packing that may split a task across several free segments.
+    Free segments are the windows minus quiet hours and hard blocks, split at midnight.
+    Each task (score order) goes whole into the first segment that holds it; otherwise it is
+    split into chunks of at least min_chunk_min minutes over the earliest segments, and placed
+    only if all of effort_min fits. Blocks never overlap; max_day_min applies per day.
+    Split blocks carry "part"/"of" (1-based) and their own id.
+    """
+    profile = compile_profile(user_prefs)
+    grid = OccupancyGrid(free_windows, profile)
+    offsets = {ws.utcoffset() for pair in free_windows for ws in pair}
+    if not grid.exact or len(offsets) > 1:
+        # inputs the bitmaps can't model exactly
+        return pack_tasks(free_windows, tasks, user_prefs, existing_blocks_today)
+    load = DailyLoad(profile.max_day_min, existing_blocks_today)
+
+    # merge overlapping windows, then split at midnight so every segment has one day
+    starts: List[int] = []
+    ends: List[int] = []
+    anchors: List[datetime] = []
+    merged: List[List] = []
+    for s, e, dt in sorted(grid.segments(), key=lambda x: x[0]):
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e, dt])
+    for s, e, dt in merged:
+        while s < e:
+            cut = min(e, (s // DAY_MIN + 1) * DAY_MIN)
+            starts.append(s); ends.append(cut); anchors.append(dt)
+            dt = dt + timedelta(minutes=cut - s)
+            s = cut
+    days = [_iso(dt)[:10] for dt in anchors]
+    by_day: Dict[str, List[int]] = {}
+    for i, d in enumerate(days):
+        by_day.setdefault(d, []).append(i)
+    index = _SegmentIndex([e - s for s, e in zip(starts, ends)])
+
+    def take(i: int, minutes: int) -> datetime:
+        at = anchors[i]
+        anchors[i] = at + timedelta(minutes=minutes)
+        starts[i] += minutes
+        index.set(i, ends[i] - starts[i])
+        load.add(days[i], minutes)
+        if load.remaining(days[i]) <= 0:
+            for k in by_day[days[i]]:
+                index.set(k, 0)
+        return at
+
+    out: List[Dict] = []
+    for t in sorted(tasks, key=score, reverse=True):
+        need = int(t.get("effort_min", 30))
+        if need < 1:
+            continue
+        # whole block in the first segment (and day) that holds it
+        i = index.first_at_least(need)
+        while i is not None and load.exceeds(days[i], need):
+            i = index.first_at_least(need, i + 1)
+        if i is not None:
+            start = take(i, need)
+            out.append(_make_block(t, start, start + timedelta(minutes=need)))
+            continue
+        if need < 2 * min_chunk_min:
+            continue
+        # split over the earliest segments; commit only if the whole task fits
+        chunks: List[Tuple[int, int]] = []
+        pending: Dict[str, int] = {}
+        rem = need
+        i = index.first_at_least(min_chunk_min)
+        while i is not None and rem:
+            avail = min(index.get(i), load.remaining(days[i]) - pending.get(days[i], 0))
+            n = min(avail, rem)
+            if 0 < rem - n < min_chunk_min:
+                n = rem - min_chunk_min
+            if n >= min_chunk_min:
+                chunks.append((i, n))
+                pending[days[i]] = pending.get(days[i], 0) + n
+                rem -= n
+            i = index.first_at_least(min_chunk_min, i + 1)
+        if rem:
+            continue
+        for part, (i, n) in enumerate(chunks, 1):
+            start = take(i, n)
+            blk = _make_block(t, start, start + timedelta(minutes=n))
+            blk["part"] = part
+            blk["of"] = len(chunks)
+            out.append(blk)
+    return out
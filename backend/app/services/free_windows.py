@@ -1,25 +1,53 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Tuple, Dict
+from typing import Iterable, Iterator, List, Tuple, Dict
+import heapq
 
-def build_free_windows(day_start: datetime, day_end: datetime, busy_events: List[Dict]) -> List[Tuple[datetime, datetime]]:
-    # busy_events: [{"start":"...","end":"..."}] ISO 8601
-    busy = []
-    for e in busy_events:
-        s = datetime.fromisoformat(e["start"].replace("Z","+00:00"))
-        e_ = datetime.fromisoformat(e["end"].replace("Z","+00:00"))
-        # clamp within the day
-        s = max(s, day_start); e_ = min(e_, day_end)
-        if e_ > s: busy.append((s, e_))
-    busy.sort(key=lambda x: x[0])
+MIN_GAP_MIN = 15
+
+def _parse(iso: str) -> datetime:
+    return datetime.fromisoformat(iso.replace("Z","+00:00"))
+
+def _spans(events: Iterable[Dict]) -> Iterator[Tuple[datetime, datetime]]:
+    # lazily parse one busy stream; [{"start":"...","end":"..."}] ISO 8601
+    for e in events:
+        yield _parse(e["start"]), _parse(e["end"])
+
+def merge_busy(streams: Iterable[Iterable[Dict]]) -> Iterator[Tuple[datetime, datetime]]:
+    """
+    k-way merge of busy streams that are each sorted by start (as Google lists them with
+    orderBy=startTime) into one start-ordered stream, using a heap of one event per stream.
+    """
+    return heapq.merge(*(_spans(s) for s in streams), key=lambda x: x[0])
 
+def free_between(day_start: datetime, day_end: datetime, busy: Iterable[Tuple[datetime, datetime]],
+                 min_gap_min: int = MIN_GAP_MIN) -> List[Tuple[datetime, datetime]]:
+    """Free windows in [day_start, day_end) around start-ordered busy spans; gaps < min_gap_min are dropped."""
+    min_gap = timedelta(minutes=min_gap_min)
     free = []
     cur = day_start
-    for (bs, be) in busy:
-        if bs > cur:
+    for bs, be in busy:
+        # clamp within the day
+        bs = max(bs, day_start); be = min(be, day_end)
+        if be <= bs:
+            continue
+        if bs > cur and bs - cur >= min_gap:
             free.append((cur, bs))
         cur = max(cur, be)
-    if cur < day_end:
+    if cur < day_end and day_end - cur >= min_gap:
         free.append((cur, day_end))
-    # remove tiny gaps < 15min
-    free = [(s,e) for (s,e) in free if (e - s) >= timedelta(minutes=15)]
-    return free 
\ No newline at end of file
+    return free
+
+def common_free_windows(day_start: datetime, day_end: datetime, busy_streams: Iterable[Iterable[Dict]],
+                        min_gap_min: int = MIN_GAP_MIN) -> List[Tuple[datetime, datetime]]:
+    """
+    Time free in every stream (several calendars of one user, or several users).
+    O(E log k) for E events in k sorted streams; no concatenated event list is built.
+    """
+    return free_between(day_start, day_end, merge_busy(busy_streams), min_gap_min)
+
+def build_free_windows(day_start: datetime, day_end: datetime, busy_events,
+                       min_gap_min: int = MIN_GAP_MIN) -> List[Tuple[datetime, datetime]]:
+    # busy_events: [{"start":"...","end":"..."}] ISO 8601, any order, or a busy.BusyProvider
+    if hasattr(busy_events, "busy_streams"):
+        return common_free_windows(day_start, day_end, busy_events.busy_streams(day_start.isoformat(), day_end.isoformat()), min_gap_min)
+    return free_between(day_start, day_end, sorted(_spans(busy_events), key=lambda x: x[0]), min_gap_min)
@@ -1,52 +1,166 @@
-import os, datetime
+import datetime
 from typing import Tuple, List, Dict, Optional
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from .calendar_pool import calendar_pool
 
 GOOGLE_SCOPES = ["https://www.googleapis.com/auth/calendar.events"]
+FREEBUSY_SCOPE = "https://www.googleapis.com/auth/calendar.freebusy"
 
-def build_creds(refresh_token: str, client_id: str, client_secret: str) -> Credentials:
+def build_creds(refresh_token: str, client_id: str, client_secret: str, scopes: Optional[List[str]] = None) -> Credentials:
     return Credentials(
         None,
         refresh_token=refresh_token,
         token_uri="https://oauth2.googleapis.com/token",
         client_id=client_id,
         client_secret=client_secret,
-        scopes=GOOGLE_SCOPES,
+        scopes=scopes or GOOGLE_SCOPES,
     )
 
-def list_events(refresh_token: str, start_iso: str, end_iso: str) -> List[Dict]:
-    creds = build_creds(refresh_token, os.getenv("GOOGLE_CLIENT_ID"), os.getenv("GOOGLE_CLIENT_SECRET"))
-    service = build("calendar", "v3", credentials=creds, cache_discovery=False)
-    events_result = service.events().list(
-        calendarId="primary",
-        timeMin=start_iso,
-        timeMax=end_iso,
-        singleEvents=True,
-        orderBy="startTime",
-    ).execute()
-    return events_result.get("items", [])
-
-def upsert_event(refresh_token: str, summary: str, start_iso: str, end_iso: str, event_id: Optional[str] = None) -> Dict:
-    creds = build_creds(refresh_token, os.getenv("GOOGLE_CLIENT_ID"), os.getenv("GOOGLE_CLIENT_SECRET"))
-    service = build("calendar", "v3", credentials=creds, cache_discovery=False)
-    body = {
-        "summary": summary,
-        "start": {"dateTime": start_iso},
-        "end": {"dateTime": end_iso},
+PAGE_SIZE = 2500  # Calendar API max for events.list
+
+def list_events(refresh_token: str, start_iso: str, end_iso: str, calendar_id: str = "primary",
+                private_property: Optional[str] = None) -> List[Dict]:
+    """Events in [start_iso, end_iso); with private_property ("name=value") only the events carrying it."""
+    items, page_token = [], None
+    filters = {"privateExtendedProperty": private_property} if private_property else {}
+    with calendar_pool.client(refresh_token, GOOGLE_SCOPES) as service:
+        while True:
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=start_iso,
+                timeMax=end_iso,
+                singleEvents=True,
+                orderBy="startTime",
+                maxResults=PAGE_SIZE,
+                pageToken=page_token,
+                **filters,
+            ).execute()
+            items.extend(events_result.get("items", []))
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                return items
+
+class SyncTokenExpired(Exception):
+    """Google answered 410 Gone: the sync token is no longer valid and a full sync is needed."""
+
+def list_event_changes(refresh_token: str, calendar_id: str = "primary", sync_token: Optional[str] = None,
+                       time_min: Optional[str] = None) -> Tuple[List[Dict], str, int]:
+    """
+    Without sync_token: every event from time_min on (full sync). With it: only events changed since
+    that token, deleted ones as status "cancelled". All pages are read.
+    returns (items, next sync token, pages fetched)
+    """
+    from googleapiclient.errors import HttpError
+    items, page_token, pages = [], None, 0
+    with calendar_pool.client(refresh_token, GOOGLE_SCOPES) as service:
+        while True:
+            # timeMin/orderBy can't be combined with syncToken
+            params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": PAGE_SIZE, "pageToken": page_token}
+            if sync_token:
+                params["syncToken"] = sync_token
+            else:
+                params["timeMin"] = time_min
+            try:
+                result = service.events().list(**params).execute()
+            except HttpError as e:
+                if getattr(e.resp, "status", None) == 410:
+                    raise SyncTokenExpired(calendar_id) from e
+                raise
+            pages += 1
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken"), pages
+
+def freebusy_query(refresh_token: str, start_iso: str, end_iso: str, calendar_ids: List[str]) -> Dict:
+    """Busy intervals only (no event bodies) for several calendars in one request."""
+    with calendar_pool.client(refresh_token, GOOGLE_SCOPES + [FREEBUSY_SCOPE]) as service:
+        return service.freebusy().query(body={
+            "timeMin": start_iso,
+            "timeMax": end_iso,
+            "items": [{"id": cal} for cal in calendar_ids],
+        }).execute()
+
+BATCH_MAX = 50  # Calendar API limit per batch request
+
+# Events we publish carry the plan block's id in private extended properties, so a later publish
+# can find them again (events.list privateExtendedProperty=PLAN_TAG) and diff instead of re-inserting.
+PLAN_TAG = "raigen=block"
+BLOCK_ID_PROP = "raigenBlockId"
+
+def block_key(block: Dict) -> str:
+    return block.get("id") or block["title"]
+
+def block_event_body(block: Dict) -> Dict:
+    name, value = PLAN_TAG.split("=")
+    return {
+        "summary": block["title"],
+        "start": {"dateTime": block["start"]},
+        "end": {"dateTime": block["end"]},
+        "extendedProperties": {"private": {name: value, BLOCK_ID_PROP: block_key(block)}},
     }
-    if event_id:
-        return service.events().patch(calendarId="primary", eventId=event_id, body=body).execute()
-    return service.events().insert(calendarId="primary", body=body).execute()
-
-def list_busy_for_day(refresh_token: str, day_utc: datetime) -> list[dict]:
-    start_iso = day_utc.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-    end_iso = (day_utc.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).isoformat()
-    items = list_events(refresh_token, start_iso, end_iso)
+
+def plan_block_id(event: Dict) -> Optional[str]:
+    """The block id of an event we published from a plan, None for anything else."""
+    private = event.get("extendedProperties", {}).get("private", {})
+    name, value = PLAN_TAG.split("=")
+    return private.get(BLOCK_ID_PROP) if private.get(name) == value else None
+
+def _same_time(a: Optional[str], b: Optional[str]) -> bool:
+    if not a or not b:
+        return False
+    parse = lambda iso: datetime.datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    return parse(a) == parse(b)
+
+def diff_blocks(blocks: List[Dict], events: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]], List[str], List[Tuple[Dict, str]]]:
+    """
+    Match plan blocks to already published (tagged) events.
+    A block matches the event tagged with its id, else an unclaimed event with the same title (it moved
+    and got a new id). Matches with the same title and times need no write.
+    returns (blocks to insert, (block, event id) to patch, event ids to delete, (block, event id) unchanged)
+    """
+    by_tag: Dict[str, List[Dict]] = {}
+    for e in events:
+        tag = e.get("extendedProperties", {}).get("private", {}).get(BLOCK_ID_PROP)
+        by_tag.setdefault(tag, []).append(e)
+    claimed = set()
+
+    def claim(candidates: List[Dict]) -> Optional[Dict]:
+        for e in candidates:
+            if e["id"] not in claimed:
+                claimed.add(e["id"])
+                return e
+        return None
+
+    inserts, patches, unchanged = [], [], []
+    unmatched = []
+    for b in blocks:
+        e = claim(by_tag.get(block_key(b), []))
+        if e is None:
+            unmatched.append(b)
+        elif e.get("summary") == b["title"] and _same_time(e.get("start", {}).get("dateTime"), b["start"]) \
+                and _same_time(e.get("end", {}).get("dateTime"), b["end"]):
+            unchanged.append((b, e["id"]))
+        else:
+            patches.append((b, e["id"]))
+    for b in unmatched:
+        e = claim([e for e in events if e.get("summary") == b["title"]])
+        if e is None:
+            inserts.append(b)
+        else:
+            patches.append((b, e["id"]))
+    deletes = [e["id"] for e in events if e["id"] not in claimed]  # removed blocks and duplicates
+    return inserts, patches, deletes, unchanged
+
+def busy_from_items(items: List[Dict]) -> List[Dict]:
+    """
+    Timed, opaque events as busy spans, in the order listed (all-day and "free" events don't block time, nor do
+    the blocks we published: the plan being built replaces them).
+    """
     out = []
     for e in items:
         start = e.get("start",{}).get("dateTime")
         end = e.get("end",{}).get("dateTime")
-        if start and end:
+        if start and end and e.get("transparency") != "transparent" and not plan_block_id(e):
             out.append({"id": e.get("id"), "start": start, "end": end, "summary": e.get("summary")})
-    return out 
\ No newline at end of file
+    return out
@@ -1,8 +1,9 @@
 import httpx
-from ..services.repo import get_doc
+from typing import Optional
+from ..services.repo import a_get_doc, DocLoader
 
-async def send_expo_push(user_id: str, title: str, body: str) -> bool:
-    doc = get_doc("users", user_id)
+async def send_expo_push(user_id: str, title: str, body: str, loader: Optional[DocLoader] = None) -> bool:
+    doc = await loader.a_get("users", user_id) if loader is not None else await a_get_doc("users", user_id)
     if not doc.exists:
         return False
     token = doc.to_dict().get("expo_push_token")
@@ -18,9 +19,9 @@ async def send_expo_push(user_id: str, title: str, body: str) -> bool:
         print("[notify] expo push failed:", e)
         return False
 
-async def plan_generated(user_id: str, blocks_count: int):
+async def plan_generated(user_id: str, blocks_count: int, loader: Optional[DocLoader] = None):
     title = "Your plan is ready"
     body = f"Raigen scheduled {blocks_count} block(s) for today. Open the app to review."
-    ok = await send_expo_push(user_id, title, body)
+    ok = await send_expo_push(user_id, title, body, loader)
     if not ok:
         print(f"[notify] no push token for {user_id} or send failed") 
\ No newline at end of file
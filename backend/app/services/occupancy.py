@@ -0,0 +1,252 @@
+from datetime import datetime, date, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .constraints import ConstraintProfile
+from .free_windows import MIN_GAP_MIN  # free gaps shorter than this are dropped
+
+DAY_MIN = 24 * 60
+STEP_MIN = 15
+
+def _span(a: int, b: int) -> int:
+    # bitmask with bits [a, b) set
+    return ((1 << (b - a)) - 1) << a if b > a else 0
+
+def _repeat(pattern: int, width: int, n: int) -> int:
+    # `pattern` (width bits) copied n times back to back
+    if n <= 0:
+        return 0
+    return pattern * (((1 << (width * n)) - 1) // ((1 << width) - 1))
+
+def _tod(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+def _on_minute(t) -> bool:
+    return t.second == 0 and t.microsecond == 0
+
+class OccupancyGrid:
+    """
+    Minute-resolution availability of free windows under quiet hours and hard blocks.
+    Bit i of every mask is wall-clock minute i counted from midnight of `base`, so a
+    task's first feasible top-anchored start is one bit-scan per window instead of a
+    15-minute walk that re-checks every constraint.
+    """
+
+    def __init__(self, free_windows: List[Tuple[datetime, datetime]], profile: ConstraintProfile):
+        self.free_windows = free_windows
+        self.profile = profile
+        # Bitmaps are exact for minute-aligned inputs; anything finer goes through the slot walk.
+        self.exact = profile.exact and all(_on_minute(ws) for ws, _ in free_windows)
+        dates = [d for w in free_windows for d in (w[0].date(), w[1].date())]
+        # one day of margin before, two after (windows may mix UTC offsets)
+        self.base: date = (min(dates) if dates else date(1970, 1, 1)) - timedelta(days=1)
+        self.days = ((max(dates) - self.base).days + 3) if dates else 0
+        self.starts = [self._minute(ws) for ws, _ in free_windows]
+        self._quiet_day = self._quiet_pattern()
+        self._hard_day: Dict[Tuple[int, int], int] = {}
+        self._bad: Dict[int, int] = {}
+
+    def _minute(self, dt: datetime) -> int:
+        return (dt.date() - self.base).days * DAY_MIN + dt.hour * 60 + dt.minute
+
+    def _quiet_pattern(self) -> int:
+        mask = 0
+        for qs, qe in self.profile.quiet_ranges:
+            mask |= _span(qs, qe)
+        return mask
+
+    def _hard_pattern(self, weekday: int, need: int) -> int:
+        """Start minutes of one day that hit a hard block for a `need`-minute slot (same rules as hard_block_conflict)."""
+        key = (weekday, need)
+        if key not in self._hard_day:
+            r = need % DAY_MIN
+            mask = 0
+            for hs, he in self.profile.hard_ranges[weekday]:
+                # end time-of-day (s + need) wraps past midnight for starts >= DAY_MIN - r
+                ends_after = _span(max(0, hs - r + 1), DAY_MIN - r) | _span(max(DAY_MIN - r, hs + DAY_MIN - r + 1), DAY_MIN)
+                mask |= ends_after & _span(0, he)
+            self._hard_day[key] = mask
+        return self._hard_day[key]
+
+    def blocked(self, need: int) -> int:
+        """Bitmap of start minutes where a `need`-minute slot violates quiet hours or a hard block."""
+        if need not in self._bad:
+            quiet = _repeat(self._quiet_day, DAY_MIN, self.days)
+            bad = quiet | (quiet >> (need - 1))  # slot start or its last minute in quiet hours
+            for d in range(self.days):
+                wd = (self.base + timedelta(days=d)).isoweekday()
+                bad |= self._hard_pattern(wd, need) << (d * DAY_MIN)
+            self._bad[need] = bad
+        return self._bad[need]
+
+    def forbidden(self) -> int:
+        """Bitmap of minutes inside quiet hours or a hard block (on the block's weekdays)."""
+        mask = _repeat(self._quiet_day, DAY_MIN, self.days)
+        for d in range(self.days):
+            wd = (self.base + timedelta(days=d)).isoweekday()
+            for hs, he in self.profile.hard_ranges[wd]:
+                mask |= _span(hs, he) << (d * DAY_MIN)
+        return mask
+
+    def segments(self) -> List[Tuple[int, int, datetime]]:
+        """
+        Free windows minus quiet hours and hard blocks, in window order.
+        returns [(start minute, end minute, start datetime)]
+        """
+        forbidden = self.forbidden()
+        out = []
+        for (ws, we), a in zip(self.free_windows, self.starts):
+            length = int((we - ws).total_seconds() // 60)
+            free = _span(a, a + length) & ~forbidden
+            while free:
+                lo = (free & -free).bit_length() - 1
+                run = free >> lo
+                n = (~run & (run + 1)).bit_length() - 1  # trailing ones
+                out.append((lo, lo + n, ws + timedelta(minutes=lo - a)))
+                free &= ~_span(lo, lo + n)
+        return out
+
+    def day_mask(self, days: Iterable[date]) -> int:
+        mask = 0
+        for d in days:
+            i = (d - self.base).days
+            if 0 <= i < self.days:
+                mask |= _span(i * DAY_MIN, (i + 1) * DAY_MIN)
+        return mask
+
+    def first_fit(self, need: int, closed_days: Iterable[date] = ()) -> Optional[datetime]:
+        """
+        Earliest top-anchored start (15-minute steps from each window start) that fits `need` minutes.
+        closed_days: dates (of the slot start) that can't take the slot, e.g. days already at max load
+        """
+        closed_days = set(closed_days)
+        if not self.exact or need < 1:
+            return self._scan(need, closed_days)
+        bad = self.blocked(need)
+        if closed_days:
+            bad |= self.day_mask(closed_days)
+        step = timedelta(minutes=STEP_MIN)
+        for (ws, we), a in zip(self.free_windows, self.starts):
+            slack = we - ws - timedelta(minutes=need)
+            if slack < timedelta(0):
+                continue
+            count = slack // step + 1
+            cands = (_repeat(1, STEP_MIN, count) << a) & ~bad
+            if cands:
+                pos = (cands & -cands).bit_length() - 1
+                return ws + timedelta(minutes=pos - a)
+        return None
+
+    def _scan(self, need: int, closed_days: Iterable[date] = ()) -> Optional[datetime]:
+        # slot-by-slot walk; only used for inputs the bitmaps can't represent exactly
+        for (ws, we) in self.free_windows:
+            cand_s = ws
+            while cand_s + timedelta(minutes=need) <= we:
+                cand_e = cand_s + timedelta(minutes=need)
+                if cand_s.date() not in closed_days and not self.profile.conflicts(cand_s, cand_e):
+                    return cand_s
+                cand_s = cand_s + timedelta(minutes=STEP_MIN)
+        return None
+
+
+class CalendarMatrix:
+    """
+    Days × minutes occupancy for a multi-day horizon starting at `day0` (UTC midnight).
+    Busy events and placed blocks are cleared from a NumPy bool matrix, so every day's
+    feasible starts for a task come out of one vectorized pass over the whole horizon.
+    Slots follow pack_tasks: top-anchored in 15-minute steps from the start of each free gap.
+    """
+
+    def __init__(self, day0: datetime, days: int, busy_events: List[Dict], profile: ConstraintProfile):
+        self.day0 = day0
+        self.days = days
+        self.busy = np.zeros((days, DAY_MIN), dtype=bool)
+        for e in busy_events:
+            s = datetime.fromisoformat(e["start"].replace("Z", "+00:00"))
+            e_ = datetime.fromisoformat(e["end"].replace("Z", "+00:00"))
+            self._mark(s, e_)
+        minutes = np.arange(DAY_MIN)
+        self.quiet = np.zeros(DAY_MIN, dtype=bool)
+        for qs, qe in profile.quiet_ranges:
+            self.quiet |= (minutes >= qs) & (minutes < qe)
+        weekdays = np.array([(day0 + timedelta(days=d)).isoweekday() for d in range(days)])
+        self.hard = [(_tod(s), _tod(e), np.isin(weekdays, list(hb_days))) for s, e, hb_days in profile.hard]
+        self.free = np.zeros_like(self.busy)
+        self.run_start = np.zeros((days, DAY_MIN), dtype=np.int64)
+        self._refresh()
+        # per-need feasibility cache; reserve() marks the day rows it touched as dirty
+        self._ok: Dict[int, np.ndarray] = {}
+        self._dirty: Dict[int, set] = {}
+
+    def date(self, d: int) -> date:
+        return (self.day0 + timedelta(days=d)).date()
+
+    def day_index(self, day: date) -> int:
+        return (day - self.day0.date()).days
+
+    def _mark(self, s: datetime, e: datetime) -> range:
+        # busy minutes are rounded outwards; returns the day rows touched
+        a = int((s - self.day0).total_seconds() // 60)
+        b = -int(-(e - self.day0).total_seconds() // 60)
+        a, b = max(a, 0), min(b, self.days * DAY_MIN)
+        if b <= a:
+            return range(0)
+        self.busy.reshape(-1)[a:b] = True
+        return range(a // DAY_MIN, (b - 1) // DAY_MIN + 1)
+
+    def reserve(self, s: datetime, e: datetime):
+        rows = self._mark(s, e)
+        if rows:
+            self._refresh(slice(rows.start, rows.stop))
+            for dirty in self._dirty.values():
+                dirty.update(rows)
+
+    def _refresh(self, rows: slice = slice(None)):
+        free = ~self.busy[rows]
+        idx = np.arange(DAY_MIN)
+        prev = np.zeros_like(free); prev[:, 1:] = free[:, :-1]
+        nxt = np.zeros_like(free); nxt[:, :-1] = free[:, 1:]
+        run_start = np.maximum.accumulate(np.where(free & ~prev, idx, 0), axis=1)
+        run_end = np.minimum.accumulate(np.where(free & ~nxt, idx + 1, DAY_MIN)[:, ::-1], axis=1)[:, ::-1]
+        self.free[rows] = free & ((run_end - run_start) >= MIN_GAP_MIN)
+        self.run_start[rows] = run_start
+
+    def feasible(self, need: int) -> np.ndarray:
+        """(days, DAY_MIN - need + 1) mask of start minutes that fit `need` minutes on each day."""
+        if need not in self._ok:
+            self._ok[need] = self._feasible_rows(need, slice(None))
+            self._dirty[need] = set()
+        elif self._dirty[need]:
+            rows = sorted(self._dirty[need])
+            self._ok[need][rows] = self._feasible_rows(need, rows)
+            self._dirty[need].clear()
+        return self._ok[need]
+
+    def _feasible_rows(self, need: int, rows) -> np.ndarray:
+        m = np.arange(DAY_MIN - need + 1)
+        free = self.free[rows]
+        cs = np.zeros((free.shape[0], DAY_MIN + 1), dtype=np.int32)
+        np.cumsum(free, axis=1, out=cs[:, 1:])
+        ok = (cs[:, m + need] - cs[:, m]) == need
+        ok &= ((m - self.run_start[rows][:, m]) % STEP_MIN) == 0
+        ok &= ~(self.quiet[m] | self.quiet[m + need - 1])
+        # same rules as hard_block_conflict: end time-of-day wraps to 00:00 at midnight
+        e_tod = (m + need) % DAY_MIN
+        for hs, he, on_day in self.hard:
+            ok &= ~(on_day[rows][:, None] & ((e_tod > hs) & (m < he))[None, :])
+        return ok
+
+    def first_fit(self, need: int, closed_days: Iterable[date] = ()) -> Optional[datetime]:
+        """Earliest feasible start across the horizon, skipping `closed_days`."""
+        if need < 1 or need > DAY_MIN or self.days == 0:
+            return None
+        ok = self.feasible(need)
+        closed = [d for d in map(self.day_index, closed_days) if 0 <= d < self.days]
+        if closed:
+            ok = ok.copy()
+            ok[closed] = False
+        flat = ok.reshape(-1)
+        i = int(flat.argmax())
+        if not flat[i]:
+            return None
+        d, m = divmod(i, ok.shape[1])
+        return self.day0 + timedelta(days=d, minutes=m)
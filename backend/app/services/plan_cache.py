@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+def _canon(obj: Any) -> str:
+    # stable JSON for hashing; datetimes and other objects fall back to str()
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str)
+
+def busy_fingerprint(busy_events: List[Dict]) -> str:
+    """Order-independent hash of busy intervals."""
+    spans = sorted((e.get("start") or "", e.get("end") or "") for e in busy_events)
+    return hashlib.sha256(_canon(spans).encode()).hexdigest()[:16]
+
+def plan_fingerprint(blocks: List[Dict]) -> str:
+    """Hash of a stored plan's blocks: changes whenever a replan, completion or range plan rewrites the day."""
+    return hashlib.sha256(_canon(blocks).encode()).hexdigest()[:16]
+
+def plan_key(user_id: str, date_iso: str, tasks: List[Dict], windows: List, user_prefs: Dict,
+             busy_fp: str, options: Optional[Dict] = None, plan_fp: str = "") -> str:
+    """
+    Content address of a /plan/generate request: same key, same plan (the packers are deterministic).
+    plan_fp is the plan_fingerprint() of the day's stored blocks, so an entry only matches while the
+    plan it produced is still the one in Firestore.
+    """
+    payload = {
+        "user_id": user_id,
+        "date": date_iso,
+        "tasks": tasks,
+        "windows": windows,
+        "prefs": user_prefs,
+        "busy": busy_fp,
+        "options": options or {},
+        "plan": plan_fp,
+    }
+    return hashlib.sha256(_canon(payload).encode()).hexdigest()
+
+class PlanCache:
+    """
+    TTL + LRU cache of generated plans keyed by plan_key().
+    Entries live in-process; with a Redis URL they are also written to / read from
+    a shared Redis-compatible tier so every worker sees them.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 600, redis_url: Optional[str] = None,
+                 prefix: str = "plancache:"):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._redis = _redis_client(redis_url) if redis_url else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return json.loads(item[1])
+            if item:
+                del self._items[key]
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(self.prefix + key)
+            except Exception as e:
+                print("[plan_cache] redis get failed:", e)
+                raw = None
+            if raw is not None:
+                self._put(key, raw if isinstance(raw, str) else raw.decode())
+                with self._lock:
+                    self.hits += 1
+                return json.loads(raw)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Dict):
+        raw = _canon(value)
+        self._put(key, raw)
+        if self._redis is not None:
+            try:
+                self._redis.setex(self.prefix + key, max(1, int(self.ttl_s)), raw)
+            except Exception as e:
+                print("[plan_cache] redis set failed:", e)
+
+    def _put(self, key: str, raw: str):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_s, raw)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses,
+                    "shared": self._redis is not None}
+
+def _redis_client(url: str):
+    try:
+        import redis  # optional: only needed for the shared tier
+    except ImportError:
+        print("[plan_cache] PLAN_CACHE_REDIS_URL set but redis package missing; using in-process cache only")
+        return None
+    return redis.Redis.from_url(url)
+
+plan_cache = PlanCache(
+    max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1024")),
+    ttl_s=float(os.getenv("PLAN_CACHE_TTL_S", "600")),
+    redis_url=os.getenv("PLAN_CACHE_REDIS_URL") or None,
+)
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from .conflict_engine import DailyLoad
+from .constraints import compile_profile
+from .occupancy import CalendarMatrix
+from .scheduler import _iso
+
+def _dt(iso: str) -> datetime:
+    return datetime.fromisoformat(iso.replace("Z", "+00:00"))
+
+def _overlaps(s: datetime, e: datetime, spans: List[Tuple[datetime, datetime]]) -> bool:
+    return any(s < be and bs < e for bs, be in spans)
+
+def repair_plan(blocks: List[Dict],
+                now: datetime,
+                delta_minutes: int,
+                user_prefs: Dict,
+                busy_events: List[Dict]) -> Tuple[List[Dict], List[str], List[str]]:
+    """
+    Incremental replan of one day's saved plan.
+    Completed and locked blocks, and blocks that already started, stay as they are. Every other
+    block keeps its slot if that slot still starts at or after now + delta_minutes and is clear of
+    busy_events and the blocks kept so far; only the rest are re-packed (original order, first fit
+    after the cutoff, same slot and max_day_min rules as pack_tasks_range). Blocks that no longer fit are dropped.
+    busy_events: [{"start": iso, "end": iso}] other calendar events (not this plan's own events)
+    returns (blocks in start order, ids of moved blocks, ids of dropped blocks)
+    """
+    cutoff = now + timedelta(minutes=delta_minutes)
+    profile = compile_profile(user_prefs)
+
+    kept: List[Dict] = []
+    movable: List[Dict] = []
+    for b in blocks:
+        if b.get("completed") or b.get("locked") or _dt(b["start"]) < now:
+            kept.append(b)
+        else:
+            movable.append(b)
+    movable.sort(key=lambda b: b["start"])
+
+    taken = [(_dt(e["start"]), _dt(e["end"])) for e in busy_events + kept]
+    repack: List[Dict] = []
+    for b in movable:
+        s, e = _dt(b["start"]), _dt(b["end"])
+        if s >= cutoff and not _overlaps(s, e, taken) and not profile.conflicts(s, e):
+            kept.append(b)
+            taken.append((s, e))
+        else:
+            repack.append(b)
+
+    moved: List[str] = []
+    dropped: List[str] = []
+    if repack:
+        day0 = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        busy = busy_events + kept + [{"start": _iso(day0), "end": _iso(cutoff)}]
+        cal = CalendarMatrix(day0, 1, busy, profile)
+        load = DailyLoad(profile.max_day_min, kept)
+        day = day0.date().isoformat()
+        for b in repack:
+            need = int((_dt(b["end"]) - _dt(b["start"])).total_seconds() // 60)
+            cand_s = None if load.exceeds(day, need) else cal.first_fit(need)
+            if cand_s is None:
+                dropped.append(b.get("id") or b["title"])
+                continue
+            cand_e = cand_s + timedelta(minutes=need)
+            cal.reserve(cand_s, cand_e)
+            load.add(day, need)
+            # same block (same id / calendar event), new time
+            kept.append({**b, "start": _iso(cand_s), "end": _iso(cand_e)})
+            moved.append(b.get("id") or b["title"])
+    kept.sort(key=lambda b: b["start"])
+    return kept, moved, dropped
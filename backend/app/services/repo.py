@@ -1,5 +1,7 @@
-from .firebase_client import get_db
-from typing import Any, Dict, Optional
+from .storage import get_db, get_async_db
+from firebase_admin import firestore
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from fastapi import Request
 
 def users_ref():
     return get_db().collection("users")
@@ -22,14 +24,240 @@ def set_doc(collection: str, doc_id: str, data: Dict[str, Any]):
 def get_doc(collection: str, doc_id: str):
     return get_db().collection(collection).document(doc_id).get()
 
-from datetime import datetime
+# Async counterparts on Firestore's AsyncClient: async routes await these instead of blocking the event loop
+
+async def a_set_doc(collection: str, doc_id: str, data: Dict[str, Any]):
+    return await get_async_db().collection(collection).document(doc_id).set(data, merge=True)
+
+async def a_get_doc(collection: str, doc_id: str):
+    return await get_async_db().collection(collection).document(doc_id).get()
+
+async def a_stream_goals(user_id: str, status: str = "active") -> AsyncIterator[Dict[str, Any]]:
+    """Goals of a user with the given status, as {"id", **fields} dicts while they stream in."""
+    query = get_async_db().collection("goals").where("user_id", "==", user_id).where("status", "==", status)
+    async for doc in query.stream():
+        yield {"id": doc.id, **doc.to_dict()}
+
+class DocLoader:
+    """
+    Request-scoped read-through cache of Firestore documents.
+    load() fetches every requested document not seen yet in one get_all round trip; later get()s of
+    the same document are free. `reads` counts documents fetched, `round_trips` calls to Firestore.
+    """
+
+    def __init__(self, db=None):
+        self._db = db
+        self._snaps: Dict[str, Any] = {}
+        self.reads = 0
+        self.round_trips = 0
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    def _missing(self, keys) -> List[Tuple[str, str]]:
+        missing = {}
+        for collection, doc_id in keys:
+            path = f"{collection}/{doc_id}"
+            if path not in self._snaps:
+                missing[path] = (collection, doc_id)
+        return list(missing.values())
+
+    def load(self, *keys: Tuple[str, str]):
+        """Prefetch (collection, doc_id) pairs together."""
+        missing = self._missing(keys)
+        if not missing:
+            return
+        self.round_trips += 1
+        for snap in self.db.get_all([self.db.collection(c).document(d) for c, d in missing]):
+            self._snaps[snap.reference.path] = snap
+            self.reads += 1
+
+    async def a_load(self, *keys: Tuple[str, str]):
+        """load() on the async client; use this from async routes."""
+        missing = self._missing(keys)
+        if not missing:
+            return
+        self.round_trips += 1
+        db = get_async_db()
+        async for snap in db.get_all([db.collection(c).document(d) for c, d in missing]):
+            self._snaps[snap.reference.path] = snap
+            self.reads += 1
+
+    def get(self, collection: str, doc_id: str):
+        path = f"{collection}/{doc_id}"
+        if path not in self._snaps:
+            self.load((collection, doc_id))
+        return self._snaps[path]
+
+    async def a_get(self, collection: str, doc_id: str):
+        path = f"{collection}/{doc_id}"
+        if path not in self._snaps:
+            await self.a_load((collection, doc_id))
+        return self._snaps[path]
+
+    def tally(self, reads: int = 1):
+        """Count reads made outside the loader (e.g. inside a transaction) so the request total stays right."""
+        self.reads += reads
+        self.round_trips += 1
+
+    def forget(self, collection: str, doc_id: str):
+        """Drop a cached document after writing it."""
+        self._snaps.pop(f"{collection}/{doc_id}", None)
+
+def doc_loader(request: Request) -> DocLoader:
+    """FastAPI dependency: one loader per request; main.py reports its counts as X-Firestore-* headers."""
+    loader = getattr(request.state, "doc_loader", None)
+    if loader is None:
+        loader = request.state.doc_loader = DocLoader()
+    return loader
+
+from datetime import date, timedelta
+from itertools import islice
 
 def plan_doc_id(user_id: str, date_iso: str) -> str:
     return f"{user_id}@{date_iso}"
 
+BATCH_LIMIT = 500  # Firestore max writes per batch
+
+PLANS_PER_BATCH = BATCH_LIMIT // 3  # each plan can also touch its week and month rollup
+
+def write_plans(entries: Iterable[Tuple[str, str, list, Optional[str]]]) -> int:
+    """
+    Save many plans with batched writes, keeping the adherence rollups in step: the plans being replaced
+    are read with one get_all per batch so their blocks come off the rollups in the same commit.
+    entries: (user_id, date_iso, blocks, rationale); returns number of commits
+    """
+    from .rollups import stage_rollups
+    db = get_db()
+    commits = 0
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, PLANS_PER_BATCH))
+        if not chunk:
+            return commits
+        loader = DocLoader(db)
+        loader.load(*(("plans", plan_doc_id(user_id, date_iso)) for user_id, date_iso, _, _ in chunk))
+        uow = UnitOfWork(db, loader)
+        current: Dict[str, list] = {}
+        changes: Dict[str, list] = {}
+        for user_id, date_iso, blocks, rationale in chunk:
+            doc_id = plan_doc_id(user_id, date_iso)
+            if doc_id not in current:
+                snap = loader.get("plans", doc_id)
+                current[doc_id] = snap.to_dict().get("blocks", []) if snap.exists else []
+            changes.setdefault(user_id, []).append((date_iso, current[doc_id], blocks))
+            current[doc_id] = blocks
+            uow.set("plans", doc_id, {"user_id": user_id, "date": date_iso, "blocks": blocks, "rationale": rationale})
+        for user_id, days in changes.items():
+            stage_rollups(uow, user_id, days)
+        uow.commit()
+        commits += 1
+
+class UnitOfWork:
+    """
+    Writes of one request, committed together in a single Firestore batch: all land or none, one round trip.
+    Writes to the same document are merged; increment() uses server-side transforms, so nothing is read first.
+    """
+
+    def __init__(self, db=None, loader: Optional[DocLoader] = None):
+        self._db = db
+        self.loader = loader
+        self._writes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._replaced: set = set()
+        self.commits = 0
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = get_db()
+        return self._db
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Merge fields into the document (set with merge=True at commit)."""
+        self._writes.setdefault((collection, doc_id), {}).update(data)
+
+    def replace(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Overwrite the document with data (set without merge at commit)."""
+        self._writes[(collection, doc_id)] = dict(data)
+        self._replaced.add((collection, doc_id))
+
+    def increment(self, collection: str, doc_id: str, updates: Dict[str, int]):
+        self.set(collection, doc_id, {k: firestore.Increment(int(v)) for k, v in updates.items()})
+
+    def __len__(self):
+        return len(self._writes)
+
+    def _batch(self, db):
+        if len(self._writes) > BATCH_LIMIT:
+            raise ValueError(f"unit of work touches {len(self._writes)} documents, batch limit is {BATCH_LIMIT}")
+        batch = db.batch()
+        for (collection, doc_id), data in self._writes.items():
+            batch.set(db.collection(collection).document(doc_id), data, merge=(collection, doc_id) not in self._replaced)
+        return batch
+
+    def _done(self) -> int:
+        self.commits += 1
+        written, self._writes, self._replaced = list(self._writes), {}, set()
+        if self.loader is not None:
+            for collection, doc_id in written:
+                self.loader.forget(collection, doc_id)
+        return len(written)
+
+    def commit(self) -> int:
+        """Commit everything gathered so far; returns the number of documents written."""
+        if not self._writes:
+            return 0
+        self._batch(self.db).commit()
+        return self._done()
+
+    async def a_commit(self) -> int:
+        """commit() on the async client."""
+        if not self._writes:
+            return 0
+        await self._batch(get_async_db()).commit()
+        return self._done()
+
 def save_plan(user_id: str, date_iso: str, blocks: list, rationale: Optional[str] = None):
-    data = {"user_id": user_id, "date": date_iso, "blocks": blocks, "rationale": rationale}
-    return set_doc("plans", plan_doc_id(user_id, date_iso), data)
+    """Save one day's plan; goes through write_plans so the rollups follow."""
+    return write_plans([(user_id, date_iso, blocks, rationale)])
+
+def save_plans(user_id: str, plans: Dict[str, list], rationale: Optional[str] = None):
+    """Save several days of plans ({date_iso: blocks}) in one batched write."""
+    return write_plans((user_id, date_iso, blocks, rationale) for date_iso, blocks in plans.items())
+
+def get_plan(user_id: str, date_iso: str, loader: Optional[DocLoader] = None):
+    if loader is not None:
+        return loader.get("plans", plan_doc_id(user_id, date_iso))
+    return get_doc("plans", plan_doc_id(user_id, date_iso))
+
+def plan_keys(user_id: str, start: date, end: date) -> List[Tuple[str, str]]:
+    """(collection, doc_id) of the plans for start <= day < end, for DocLoader.load/a_load."""
+    return [("plans", plan_doc_id(user_id, (start + timedelta(days=i)).isoformat())) for i in range((end - start).days)]
+
+async def a_get_plan(user_id: str, date_iso: str, loader: Optional[DocLoader] = None):
+    if loader is not None:
+        return await loader.a_get("plans", plan_doc_id(user_id, date_iso))
+    return await a_get_doc("plans", plan_doc_id(user_id, date_iso))
 
-def get_plan(user_id: str, date_iso: str):
-    return get_doc("plans", plan_doc_id(user_id, date_iso)) 
\ No newline at end of file
+def get_plans_range(user_id: str, start: date, end: date, loader: Optional[DocLoader] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Plans for start <= day < end, fetched with one get_all (plan doc ids are deterministic, so no query/index).
+    Yields (date_iso, data) for days that have a plan, decoded as the snapshots stream in (not in date order).
+    Async routes await loader.a_load(*plan_keys(...)) first so this reads from the loader without blocking.
+    """
+    ids = [doc_id for _, doc_id in plan_keys(user_id, start, end)]
+    if not ids:
+        return
+    if loader is not None:
+        loader.load(*(("plans", doc_id) for doc_id in ids))
+        snaps = (loader.get("plans", doc_id) for doc_id in ids)
+    else:
+        db = get_db()
+        snaps = db.get_all([db.collection("plans").document(doc_id) for doc_id in ids])
+    for snap in snaps:
+        if snap.exists:
+            data = snap.to_dict()
+            yield data.get("date") or snap.reference.path.rsplit("@", 1)[-1], data
@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+from firebase_admin import firestore
+from .repo import DocLoader, UnitOfWork
+
+# rollups/{uid@YYYY-Www} (ISO week) and rollups/{uid@YYYY-MM}
+# {
+#   "user_id": "u1", "period": "week", "key": "2025-W33",
+#   "planned": 12, "completed": 9,
+#   "by_day":    {"2025-08-11": {"planned": 4, "completed": 3}, ...},
+#   "by_goal":   {"<goal_id>": {"planned": 5, "completed": 4}, ...},
+#   "by_energy": {"high": {"planned": 3, "completed": 3}, ...}
+# }
+# Every plan write stages Increments of the blocks it changes into the same batch (stage_rollups), so a week
+# or month of adherence is one document read however long the history is.
+
+PERIODS = ("week", "month")
+
+def period_key(period: str, d: date) -> str:
+    if period == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return d.strftime("%Y-%m")
+    raise ValueError(f"period must be one of {PERIODS}, got {period!r}")
+
+def rollup_key(user_id: str, period: str, d: date) -> Tuple[str, str]:
+    """(collection, doc_id) of the rollup covering day d, for DocLoader.load."""
+    return "rollups", f"{user_id}@{period_key(period, d)}"
+
+def rollup_keys(user_id: str, start: date, end: date, period: str) -> List[Tuple[str, str]]:
+    """Rollups covering start <= day < end, in order."""
+    keys = [rollup_key(user_id, period, start + timedelta(days=i)) for i in range((end - start).days)]
+    return list(dict.fromkeys(keys))
+
+def _counts(date_iso: str, blocks: list) -> Dict[Tuple[str, ...], int]:
+    """Counters of one day's blocks by field path, e.g. ("by_goal", "g1", "completed") -> 2."""
+    out: Dict[Tuple[str, ...], int] = {}
+    for b in blocks:
+        scopes = [(), ("by_day", date_iso)]
+        if b.get("goal_id"):
+            scopes.append(("by_goal", str(b["goal_id"])))
+        if b.get("energy"):
+            scopes.append(("by_energy", str(b["energy"])))
+        for scope in scopes:
+            out[scope + ("planned",)] = out.get(scope + ("planned",), 0) + 1
+            if b.get("completed"):
+                out[scope + ("completed",)] = out.get(scope + ("completed",), 0) + 1
+    return out
+
+def _nest(flat: Dict[Tuple[str, ...], Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for path, value in flat.items():
+        node = out
+        for part in path[:-1]:
+            node = node.setdefault(part, {})
+        node[path[-1]] = value
+    return out
+
+def _header(user_id: str, period: str, d: date) -> Dict[str, Any]:
+    return {"user_id": user_id, "period": period, "key": period_key(period, d)}
+
+def stage_rollups(uow: UnitOfWork, user_id: str, changes: Iterable[Tuple[str, list, list]]) -> int:
+    """
+    Stage the rollup Increments for plan days being rewritten in uow.
+    changes: (date_iso, blocks before, blocks after); returns the number of rollup documents staged.
+    """
+    deltas: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for date_iso, old_blocks, new_blocks in changes:
+        d = date.fromisoformat(date_iso)
+        before = _counts(date_iso, old_blocks)
+        delta = _counts(date_iso, new_blocks)
+        for path, n in before.items():
+            delta[path] = delta.get(path, 0) - n
+        delta = {path: n for path, n in delta.items() if n}
+        if not delta:
+            continue
+        for period in PERIODS:
+            entry = deltas.setdefault(rollup_key(user_id, period, d), {"header": _header(user_id, period, d), "counts": {}})
+            for path, n in delta.items():
+                entry["counts"][path] = entry["counts"].get(path, 0) + n
+    for (collection, doc_id), entry in deltas.items():
+        increments = {path: firestore.Increment(n) for path, n in entry["counts"].items() if n}
+        uow.set(collection, doc_id, {**entry["header"], **_nest(increments)})
+    return len(deltas)
+
+def period_bounds(period: str, d: date) -> Tuple[date, date]:
+    """first day and the day after the last of the week/month containing d."""
+    if period == "week":
+        first = d - timedelta(days=d.weekday())
+        return first, first + timedelta(days=7)
+    first = d.replace(day=1)
+    return first, (first + timedelta(days=32)).replace(day=1)
+
+def rebuild_span(start: date, end: date) -> Tuple[date, date]:
+    """Days whose plans stage_rebuild needs: every week and month touched by start <= day < end, in full."""
+    last = end - timedelta(days=1)
+    return min(period_bounds(p, start)[0] for p in PERIODS), max(period_bounds(p, last)[1] for p in PERIODS)
+
+def stage_rebuild(uow: UnitOfWork, user_id: str, plans: Dict[str, list], start: date, end: date) -> int:
+    """
+    Stage every week and month rollup touched by start <= day < end, recomputed from plans ({date_iso: blocks},
+    covering rebuild_span(start, end)) and replacing what is stored: backfill, or repair after plan edits made
+    outside the API. Returns the number of rollup documents staged.
+    """
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for i in range((end - start).days):
+        d = start + timedelta(days=i)
+        for period in PERIODS:
+            docs.setdefault(rollup_key(user_id, period, d), {"header": _header(user_id, period, d), "counts": {}})
+    for date_iso, blocks in plans.items():
+        d = date.fromisoformat(date_iso)
+        for period in PERIODS:
+            entry = docs.get(rollup_key(user_id, period, d))
+            if entry is not None:
+                for path, n in _counts(date_iso, blocks).items():
+                    entry["counts"][path] = entry["counts"].get(path, 0) + n
+    for (collection, doc_id), entry in docs.items():
+        uow.replace(collection, doc_id, {**entry["header"], "planned": 0, "completed": 0, **_nest(entry["counts"])})
+    return len(docs)
+
+def _rate(counts: Dict[str, Any]) -> Dict[str, Any]:
+    planned, completed = int(counts.get("planned", 0)), int(counts.get("completed", 0))
+    return {"planned": planned, "completed": completed, "rate": (completed / planned * 100) if planned > 0 else 0}
+
+def summarize(user_id: str, period: str, d: date, snap) -> Dict[str, Any]:
+    """A rollup snapshot as counts and rates; a missing rollup is an empty period."""
+    data = (snap.to_dict() or {}) if snap.exists else {}
+    return {
+        **_header(user_id, period, d),
+        **_rate(data),
+        "by_day": {k: _rate(v) for k, v in sorted(data.get("by_day", {}).items()) if v.get("planned", 0) > 0},
+        "by_goal": {k: _rate(v) for k, v in data.get("by_goal", {}).items() if v.get("planned", 0) > 0},
+        "by_energy": {k: _rate(v) for k, v in data.get("by_energy", {}).items() if v.get("planned", 0) > 0},
+    }
+
+def days_in(loader: DocLoader, user_id: str, start: date, end: date, period: str = "month") -> Dict[str, Dict[str, int]]:
+    """
+    {date_iso: {"planned", "completed"}} for start <= day < end from the covering rollups, which must already be
+    loaded (async routes await loader.a_load(*rollup_keys(...)) first). Days without planned blocks are left out.
+    """
+    days: Dict[str, Dict[str, int]] = {}
+    lo, hi = start.isoformat(), end.isoformat()
+    for collection, doc_id in rollup_keys(user_id, start, end, period):
+        snap = loader.get(collection, doc_id)
+        by_day = (snap.to_dict() or {}).get("by_day", {}) if snap.exists else {}
+        for date_iso, counts in by_day.items():
+            if lo <= date_iso < hi and counts.get("planned", 0) > 0:
+                days[date_iso] = {"planned": int(counts["planned"]), "completed": int(counts.get("completed", 0))}
+    return dict(sorted(days.items()))
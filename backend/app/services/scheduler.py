@@ -1,8 +1,10 @@
-from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Tuple
+from datetime import datetime, date, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import hashlib
 import json
-from .conflict_engine import within_quiet_hours, hard_block_conflict, exceeds_daily_load
+from .conflict_engine import DailyLoad
+from .occupancy import OccupancyGrid, CalendarMatrix
+from .constraints import compile_profile
 
 def _block_id(b: Dict) -> str:
     """Generate stable block ID based on content"""
@@ -25,46 +27,75 @@ def pack_tasks(free_windows: List[Tuple[datetime, datetime]],
     user_prefs: {"quiet_hours":{"start":"22:00","end":"07:00"},"hard_blocks":[...],"max_day_min": 300}
     returns plan blocks [{"title","start","end","goal_id","energy","locked":False}]
     """
-    q = user_prefs.get("quiet_hours", {"start":"22:00","end":"07:00"})
-    quiet_s = _parse_time(q["start"]); quiet_e = _parse_time(q["end"])
-    hard_blocks = user_prefs.get("hard_blocks", [])
-    max_day = int(user_prefs.get("max_day_min", 300))
+    profile = compile_profile(user_prefs)
+    max_day = profile.max_day_min
 
+    grid = OccupancyGrid(free_windows, profile)
+    load = DailyLoad(max_day, existing_blocks_today)
     out: List[Dict] = []
     for t in sorted(tasks, key=score, reverse=True):
-        placed = False
         need = int(t.get("effort_min", 30))
-        for (ws, we) in free_windows:
-            # attempt top-anchored placement, single block MVP
-            cand_s = ws
-            while cand_s + timedelta(minutes=need) <= we:
-                cand_e = cand_s + timedelta(minutes=need)
-                # checks
-                if within_quiet_hours(cand_s, cand_e, quiet_s, quiet_e):
-                    cand_s = cand_s + timedelta(minutes=15); continue
-                # MVP: hard block conflict check by local time -> assume user TZ later; use UTC now
-                if hard_block_conflict(cand_s, cand_e, hard_blocks):
-                    cand_s = cand_s + timedelta(minutes=15); continue
-                if exceeds_daily_load(existing_blocks_today + _as_blocks(out), need, max_minutes_per_day=max_day):
-                    # cannot place more today
-                    break
-                blk = {
-                    "title": t["title"],
-                    "start": _iso(cand_s),
-                    "end": _iso(cand_e),
-                    "goal_id": t.get("goal_id"),
-                    "energy": t.get("energy", None),
-                    "locked": False
-                }
-                blk["id"] = _block_id(blk)
-                out.append(blk)
-                placed = True
-                break
-            if placed: break
+        if need > max_day:
+            # cannot fit on any day
+            continue
+        # top-anchored placement, single block MVP
+        # MVP: hard block conflict check by local time -> assume user TZ later; use UTC now
+        full = [date.fromisoformat(d) for d in load.full_days(need)]
+        cand_s = grid.first_fit(need, closed_days=full)
+        if cand_s is None:
+            continue
+        blk = _make_block(t, cand_s, cand_s + timedelta(minutes=need))
+        out.append(blk)
+        load.add(blk["start"][:10], need)
     return out
 
-def _as_blocks(plan_blocks: List[Dict]) -> List[Dict]:
-    return [{"start": b["start"], "end": b["end"]} for b in plan_blocks]
+def pack_tasks_range(day0: datetime,
+                     days: int,
+                     busy_events: List[Dict],
+                     tasks: List[Dict],
+                     user_prefs: Dict,
+                     existing_blocks: Optional[List[Dict]] = None) -> Dict[str, List[Dict]]:
+    """
+    Multi-day packing over [day0, day0 + days) UTC in one pass.
+    busy_events: [{"start": iso, "end": iso}] for the whole horizon
+    existing_blocks: already planned blocks; they occupy time and count toward each day's max_day_min
+    returns {date_iso: plan blocks}; placed blocks reserve their slot, so blocks never overlap
+    """
+    profile = compile_profile(user_prefs)
+    max_day = profile.max_day_min
+
+    existing_blocks = existing_blocks or []
+    cal = CalendarMatrix(day0, days, busy_events + existing_blocks, profile)
+    load = DailyLoad(max_day, existing_blocks)
+    plans: Dict[str, List[Dict]] = {cal.date(d).isoformat(): [] for d in range(days)}
+    for t in sorted(tasks, key=score, reverse=True):
+        need = int(t.get("effort_min", 30))
+        if need > max_day:
+            continue
+        full = [date.fromisoformat(d) for d in load.full_days(need)]
+        cand_s = cal.first_fit(need, closed_days=full)
+        if cand_s is None:
+            continue
+        cand_e = cand_s + timedelta(minutes=need)
+        blk = _make_block(t, cand_s, cand_e)
+        plans[blk["start"][:10]].append(blk)
+        cal.reserve(cand_s, cand_e)
+        load.add(blk["start"][:10], need)
+    for blocks in plans.values():
+        blocks.sort(key=lambda b: b["start"])
+    return plans
+
+def _make_block(t: Dict, start: datetime, end: datetime) -> Dict:
+    blk = {
+        "title": t["title"],
+        "start": _iso(start),
+        "end": _iso(end),
+        "goal_id": t.get("goal_id"),
+        "energy": t.get("energy", None),
+        "locked": False
+    }
+    blk["id"] = _block_id(blk)
+    return blk
 
 def _iso(dt: datetime) -> str:
     return dt.replace(microsecond=0, tzinfo=timezone.utc).isoformat().replace("+00:00","Z")
@@ -0,0 +1,201 @@
+import bisect
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from .conflict_engine import DailyLoad
+from .occupancy import OccupancyGrid, STEP_MIN
+from .constraints import compile_profile
+from .scheduler import pack_tasks, score, _make_block
+from .fragments import pack_tasks_fragmented
+
+MAX_SEARCH_POINTS = 800  # keeps the search recursion well inside Python's stack
+
+class _Timeout(Exception):
+    pass
+
+def solve_plan(free_windows: List[Tuple[datetime, datetime]],
+               tasks: List[Dict],
+               user_prefs: Dict,
+               existing_blocks_today: List[Dict],
+               mode: str = "greedy",
+               budget_ms: float = 20,
+               min_chunk_min: int = 25) -> Tuple[List[Dict], Dict]:
+    """
+    Pack tasks with the requested solver.
+    returns (blocks, {"mode": requested, "solver": solver that produced the blocks, "ms": wall time})
+    """
+    started = time.perf_counter()
+    if mode == "greedy":
+        blocks, used = pack_tasks(free_windows, tasks, user_prefs, existing_blocks_today), "greedy"
+    elif mode == "optimal":
+        blocks, used = pack_tasks_optimal(free_windows, tasks, user_prefs, existing_blocks_today, budget_ms)
+    elif mode == "fragment":
+        blocks, used = pack_tasks_fragmented(free_windows, tasks, user_prefs, existing_blocks_today, min_chunk_min), "fragment"
+    else:
+        raise ValueError(f"unknown packing mode: {mode}")
+    return blocks, {"mode": mode, "solver": used, "ms": round((time.perf_counter() - started) * 1000, 2)}
+
+def pack_tasks_optimal(free_windows: List[Tuple[datetime, datetime]],
+                       tasks: List[Dict],
+                       user_prefs: Dict,
+                       existing_blocks_today: List[Dict],
+                       budget_ms: float = 20) -> Tuple[List[Dict], str]:
+    """
+    Branch-and-bound packing that maximizes the total score() of placed tasks.
+    Slots are the same top-anchored 15-minute starts pack_tasks uses, with the same quiet-hour,
+    hard-block and per-day max_day_min rules; blocks never overlap each other.
+    The search sweeps start points in time order and, at each point, either starts an unplaced
+    task there or leaves it idle. It is pruned with a fractional-knapsack bound over the remaining
+    free and load minutes, and seeded with greedy first-fit (score order, no overlaps).
+    If the search can't finish within budget_ms that greedy placement is returned, and if the budget
+    runs out before the seed is ready (thousands of tasks) pack_tasks is; inputs the occupancy
+    bitmaps can't model exactly (sub-minute times, mixed UTC offsets) use pack_tasks too.
+    returns (blocks in score order, "optimal" | "greedy")
+    """
+    deadline = time.perf_counter() + budget_ms / 1000
+    profile = compile_profile(user_prefs)
+    grid = OccupancyGrid(free_windows, profile)
+    max_day = profile.max_day_min
+    load = DailyLoad(max_day, existing_blocks_today)
+    ranked = sorted(tasks, key=score, reverse=True)
+    needs = [int(t.get("effort_min", 30)) for t in ranked]
+    values = [score(t) for t in ranked]
+
+    # Start points across all windows, in time order: (minute, window end minute, start dt)
+    offsets = {ws.utcoffset() for pair in free_windows for ws in pair}
+    if not grid.exact or len(offsets) > 1 or any(n < 1 for n in needs):
+        # inputs the bitmaps can't model exactly
+        return pack_tasks(free_windows, tasks, user_prefs, existing_blocks_today), "greedy"
+    points = []
+    for (ws, we), a in zip(free_windows, grid.starts):
+        length = int((we - ws).total_seconds() // 60)
+        for k in range(0, length, STEP_MIN):
+            points.append((a + k, a + length, ws + timedelta(minutes=k)))
+    points.sort(key=lambda p: p[0])
+    minutes = [p[0] for p in points]
+    days = [_day(p[2]) for p in points]
+
+    # fits[i]: bitmask of task indices that may start at point i (window, quiet hours, hard blocks);
+    # this and the greedy seed are points x tasks, so they run under the budget as well
+    try:
+        bad = {n: grid.blocked(n) for n in set(needs)}
+        fits = [0] * len(points)
+        for i, (m, end, _) in enumerate(points):
+            if time.perf_counter() > deadline:
+                raise _Timeout()
+            for j, n in enumerate(needs):
+                if m + n <= end and n <= max_day and not (bad[n] >> m) & 1:
+                    fits[i] |= 1 << j
+
+        greedy = _greedy(points, minutes, days, fits, needs, load, deadline)
+    except _Timeout:
+        return pack_tasks(free_windows, tasks, user_prefs, existing_blocks_today), "greedy"
+    if len(points) > MAX_SEARCH_POINTS:
+        return _blocks(ranked, points, greedy), "greedy"
+
+    # free minutes from point i onward (upper bound on time any placement can use)
+    free_after = [0] * (len(points) + 1)
+    for i in range(len(points) - 1, -1, -1):
+        nxt = minutes[i + 1] if i + 1 < len(points) else points[i][1]
+        free_after[i] = free_after[i + 1] + max(0, min(nxt, points[i][1]) - minutes[i])
+    day_list = sorted(set(days))
+    by_density = sorted(range(len(ranked)), key=lambda j: values[j] / max(needs[j], 1), reverse=True)
+    # identical tasks are interchangeable; only branch on the first unplaced one of each kind
+    kind = [(needs[j], values[j]) for j in range(len(ranked))]
+
+    # tasks that can still start at point i or later
+    fits_after = [0] * (len(points) + 1)
+    for i in range(len(points) - 1, -1, -1):
+        fits_after[i] = fits_after[i + 1] | fits[i]
+
+    best_value = sum(values[j] for j in greedy)
+    best = dict(greedy)
+    placed: Dict[int, int] = {}
+    seen = set()
+
+    def bound(i: int, value: float, used: int) -> float:
+        cap = min(free_after[i], sum(max(0, load.remaining(d)) for d in day_list if d >= days[i]))
+        open_tasks = fits_after[i] & ~used
+        for j in by_density:
+            if cap <= 0:
+                break
+            if not (open_tasks >> j) & 1:
+                continue
+            take = min(cap, needs[j])
+            value += values[j] * take / needs[j]
+            cap -= take
+        return value
+
+    def search(i: int, value: float, used: int, banned: int):
+        # used: bitmask of placed task indices
+        # banned: tasks that could have started at a point we just left idle; starting them later
+        # (before anything else is placed) only shifts the same plan right, so skip those branches
+        nonlocal best_value, best
+        if time.perf_counter() > deadline:
+            raise _Timeout()
+        if value > best_value + 1e-12:
+            best_value, best = value, dict(placed)
+        while i < len(points) and not fits[i] & ~(used | banned):
+            i += 1
+        if i >= len(points) or bound(i, value, used) <= best_value + 1e-12:
+            return
+        # the same tasks placed in a different order can reach the same point with the same loads
+        state = (i, used, banned, tuple(load.used(d) for d in day_list))
+        if state in seen:
+            return
+        seen.add(state)
+        tried = set()
+        startable = 0
+        for j in range(len(ranked)):
+            if (used >> j) & 1 or not (fits[i] >> j) & 1 or load.exceeds(days[i], needs[j]):
+                continue
+            startable |= 1 << j
+            if (banned >> j) & 1 or kind[j] in tried:
+                continue
+            tried.add(kind[j])
+            placed[j] = i
+            load.add(days[i], needs[j])
+            search(bisect.bisect_left(minutes, minutes[i] + needs[j], i + 1), value + values[j], used | (1 << j), 0)
+            load.add(days[i], -needs[j])
+            del placed[j]
+        search(i + 1, value, used, banned | startable)
+
+    try:
+        search(0, 0.0, 0, 0)
+    except _Timeout:
+        return _blocks(ranked, points, greedy), "greedy"
+    return _blocks(ranked, points, best), "optimal"
+
+def _day(dt: datetime) -> str:
+    # same day key DailyLoad uses for plan blocks
+    return dt.strftime("%Y-%m-%d")
+
+def _greedy(points, minutes, days, fits, needs, load: DailyLoad, deadline: float = float("inf")) -> Dict[int, int]:
+    """First fit in score order without overlaps; returns {task index: point index}. Raises _Timeout after deadline."""
+    taken: List[Tuple[int, int]] = []
+    out: Dict[int, int] = {}
+    for j, n in enumerate(needs):
+        if time.perf_counter() > deadline:
+            for k, i in out.items():
+                load.add(days[i], -needs[k])
+            raise _Timeout()
+        for i in range(len(points)):
+            if not (fits[i] >> j) & 1 or load.exceeds(days[i], n):
+                continue
+            s, e = minutes[i], minutes[i] + n
+            if any(s < te and ts < e for ts, te in taken):
+                continue
+            taken.append((s, e))
+            load.add(days[i], n)
+            out[j] = i
+            break
+    for j, i in out.items():
+        load.add(days[i], -needs[j])
+    return out
+
+def _blocks(ranked: List[Dict], points, chosen: Dict[int, int]) -> List[Dict]:
+    out = []
+    for j in sorted(chosen):
+        start = points[chosen[j]][2]
+        out.append(_make_block(ranked[j], start, start + timedelta(minutes=int(ranked[j].get("effort_min", 30)))))
+    return out
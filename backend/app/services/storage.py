@@ -0,0 +1,375 @@
+"""
+Storage backends behind repo.get_db(), picked with STORAGE_BACKEND:
+    firestore  (default) Firestore with the service account in FIREBASE_SERVICE_ACCOUNT_JSON_BASE64
+    emulator   the Firestore emulator at FIRESTORE_EMULATOR_HOST; no credentials needed
+    memory     thread-safe in-process engine for tests, local runs and load tests (gone on exit)
+Each exposes the part of the Firestore client API the services use: collection/document get/set/update/delete,
+where("==")/order_by/start_after/limit/stream, get_all, batch, run_transaction and Increment transforms.
+get_async_db() is the same backend for async routes: Firestore's AsyncClient, or an async facade over the memory engine.
+"""
+import asyncio
+import copy
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+from firebase_admin import firestore
+
+BACKENDS = ("firestore", "emulator", "memory")
+
+@lru_cache()
+def get_db():
+    backend = os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "memory":
+        return MemoryDB()
+    if backend == "emulator":
+        return emulator_db()
+    if backend == "firestore":
+        from .firebase_client import get_db as firestore_client
+        return FirestoreDB(firestore_client())
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+@lru_cache()
+def get_async_db():
+    backend = os.getenv("STORAGE_BACKEND", "firestore")
+    if backend == "memory":
+        return AsyncMemoryDB(get_db())
+    if backend == "emulator":
+        return emulator_db(async_client=True)
+    if backend == "firestore":
+        from .firebase_client import get_async_db as firestore_async_client
+        return firestore_async_client()
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {BACKENDS}, got {backend!r}")
+
+class FirestoreDB:
+    """The Firestore client plus run_transaction(fn), which the Python client itself doesn't have."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def run_transaction(self, fn: Callable):
+        return firestore.transactional(fn)(self._client.transaction())
+
+def emulator_db(async_client: bool = False):
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        raise RuntimeError("FIRESTORE_EMULATOR_HOST missing (e.g. localhost:8081)")
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore as gcloud_firestore
+    project = os.getenv("FIREBASE_PROJECT_ID") or "demo-raigen"
+    if async_client:
+        return gcloud_firestore.AsyncClient(project=project, credentials=AnonymousCredentials())
+    return FirestoreDB(gcloud_firestore.Client(project=project, credentials=AnonymousCredentials()))
+
+# ---- in-memory engine ----
+
+def _field(data: Dict, path: str):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+def _merge(old: Dict, new: Dict) -> Dict:
+    """set(merge=True): nested maps merge, Increment adds to the stored number."""
+    out = dict(old)
+    for k, v in new.items():
+        if isinstance(v, firestore.Increment):
+            cur = out.get(k)
+            out[k] = (cur if isinstance(cur, (int, float)) else 0) + v.value
+        elif isinstance(v, dict):
+            out[k] = _merge(out[k] if isinstance(out.get(k), dict) else {}, v)
+        else:
+            out[k] = copy.deepcopy(v)
+    return out
+
+class MemorySnapshot:
+    def __init__(self, reference: "MemoryDocument", data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return _field(self._data or {}, field)
+
+class MemoryDocument:
+    def __init__(self, db: "MemoryDB", collection: str, doc_id: str):
+        self._db = db
+        self.collection_id = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def get(self) -> MemorySnapshot:
+        return self._db._read(self)
+
+    def set(self, data: Dict, merge: bool = False):
+        self._db._write(self, data, merge)
+
+    def update(self, data: Dict):
+        with self._db._lock:
+            if self._db._read(self, count=False)._data is None:
+                raise KeyError(f"No document to update: {self.path}")
+            self._db._write(self, data, merge=True)
+
+    def delete(self):
+        self._db._delete(self)
+
+class MemoryQuery:
+    def __init__(self, db: "MemoryDB", collection: str, filters=(), order=None, after=None, limit=None):
+        self._db = db
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._after = after
+        self._limit = limit
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        args = {"filters": self._filters, "order": self._order, "after": self._after, "limit": self._limit, **changes}
+        return MemoryQuery(self._db, self._collection, **args)
+
+    def where(self, field: str, op: str, value) -> "MemoryQuery":
+        if op != "==":
+            raise NotImplementedError(f"memory backend supports '==' filters only, got {op!r}")
+        return self._copy(filters=self._filters + [(field, value)])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        return self._copy(order=(field, direction == "DESCENDING"))
+
+    def start_after(self, snapshot: MemorySnapshot) -> "MemoryQuery":
+        return self._copy(after=snapshot)
+
+    def limit(self, n: int) -> "MemoryQuery":
+        return self._copy(limit=n)
+
+    def _key(self, snap: MemorySnapshot):
+        field = self._order[0]
+        return snap.id if field == "__name__" else _field(snap._data, field)
+
+    def stream(self) -> Iterator[MemorySnapshot]:
+        snaps = self._db._scan(self._collection)
+        snaps = [s for s in snaps if all(_field(s._data, f) == v for f, v in self._filters)]
+        if self._order:
+            desc = self._order[1]
+            snaps.sort(key=self._key, reverse=desc)
+            if self._after is not None:
+                cut = self._key(self._after)
+                snaps = [s for s in snaps if (self._key(s) < cut if desc else self._key(s) > cut)]
+        if self._limit is not None:
+            snaps = snaps[:self._limit]
+        return iter(snaps)
+
+    def get(self) -> List[MemorySnapshot]:
+        return list(self.stream())
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, db: "MemoryDB", name: str):
+        super().__init__(db, name)
+        self.id = name
+
+    def document(self, doc_id: Optional[str] = None) -> MemoryDocument:
+        return MemoryDocument(self._db, self._collection, doc_id or uuid.uuid4().hex)
+
+class MemoryBatch:
+    """Writes buffered and applied together under the engine lock on commit()."""
+
+    def __init__(self, db: "MemoryDB"):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref: MemoryDocument, data: Dict, merge: bool = False):
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref: MemoryDocument, data: Dict):
+        self._ops.append(("update", ref, data, True))
+
+    def delete(self, ref: MemoryDocument):
+        self._ops.append(("delete", ref, None, False))
+
+    def commit(self):
+        with self._db._lock:
+            for op, ref, data, merge in self._ops:
+                if op == "delete":
+                    ref.delete()
+                elif op == "update":
+                    ref.update(data)
+                else:
+                    ref.set(data, merge)
+            self._db.stats["commits"] += 1
+        self._ops = []
+
+class MemoryTransaction(MemoryBatch):
+    """Reads see live data; run_transaction holds the engine lock, so transactions are serialized."""
+
+    def get(self, ref: MemoryDocument) -> MemorySnapshot:
+        return ref.get()
+
+class MemoryDB:
+    """Dict-backed engine, one RLock around every read and write."""
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.RLock()
+        self.stats = {"reads": 0, "writes": 0, "commits": 0}
+
+    def collection(self, name: str) -> MemoryCollection:
+        return MemoryCollection(self, name)
+
+    def get_all(self, refs) -> Iterator[MemorySnapshot]:
+        with self._lock:
+            return iter([ref.get() for ref in refs])
+
+    def batch(self) -> MemoryBatch:
+        return MemoryBatch(self)
+
+    def run_transaction(self, fn: Callable):
+        with self._lock:
+            tr = MemoryTransaction(self)
+            result = fn(tr)
+            tr.commit()
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self.stats = {"reads": 0, "writes": 0, "commits": 0}
+
+    def _read(self, ref: MemoryDocument, count: bool = True) -> MemorySnapshot:
+        with self._lock:
+            if count:
+                self.stats["reads"] += 1
+            data = self._docs.get(ref.collection_id, {}).get(ref.id)
+            return MemorySnapshot(ref, copy.deepcopy(data))
+
+    def _write(self, ref: MemoryDocument, data: Dict, merge: bool):
+        with self._lock:
+            docs = self._docs.setdefault(ref.collection_id, {})
+            docs[ref.id] = _merge(docs.get(ref.id, {}) if merge else {}, data)
+            self.stats["writes"] += 1
+
+    def _delete(self, ref: MemoryDocument):
+        with self._lock:
+            self._docs.get(ref.collection_id, {}).pop(ref.id, None)
+            self.stats["writes"] += 1
+
+    def _scan(self, collection: str) -> List[MemorySnapshot]:
+        with self._lock:
+            docs = self._docs.get(collection, {})
+            self.stats["reads"] += len(docs)
+            return [MemorySnapshot(MemoryDocument(self, collection, doc_id), copy.deepcopy(data))
+                    for doc_id, data in docs.items()]
+
+# ---- async facade ----
+
+class AsyncMemoryDB:
+    """
+    The AsyncClient surface over an in-process engine (MemoryDB, or a test fake with the sync API).
+    Engine calls run inline: they never wait on I/O. latency_s simulates a storage round trip per call;
+    blocking=True sleeps without yielding, the way the sync client stalls the event loop (for benchmarks).
+    """
+
+    def __init__(self, db, latency_s: float = 0.0, blocking: bool = False):
+        self.sync = db
+        self.latency_s = latency_s
+        self.blocking = blocking
+
+    async def _round_trip(self):
+        if not self.latency_s:
+            return
+        if self.blocking:
+            time.sleep(self.latency_s)
+        else:
+            await asyncio.sleep(self.latency_s)
+
+    def collection(self, name: str) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self, self.sync.collection(name))
+
+    async def get_all(self, refs) -> AsyncIterator:
+        await self._round_trip()
+        for snap in self.sync.get_all([r._ref for r in refs]):
+            yield snap
+
+    def batch(self) -> "AsyncMemoryBatch":
+        return AsyncMemoryBatch(self)
+
+class AsyncMemoryDocument:
+    def __init__(self, db: AsyncMemoryDB, ref):
+        self._db = db
+        self._ref = ref
+
+    @property
+    def id(self):
+        return self._ref.id
+
+    @property
+    def path(self):
+        return self._ref.path
+
+    async def get(self):
+        await self._db._round_trip()
+        return self._ref.get()
+
+    async def set(self, data: Dict, merge: bool = False):
+        await self._db._round_trip()
+        self._ref.set(data, merge=merge)
+
+    async def update(self, data: Dict):
+        await self._db._round_trip()
+        self._ref.update(data)
+
+    async def delete(self):
+        await self._db._round_trip()
+        self._ref.delete()
+
+class AsyncMemoryQuery:
+    def __init__(self, db: AsyncMemoryDB, query):
+        self._db = db
+        self._query = query
+
+    def document(self, doc_id: Optional[str] = None) -> AsyncMemoryDocument:
+        return AsyncMemoryDocument(self._db, self._query.document(doc_id))
+
+    def where(self, field: str, op: str, value) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._db, self._query.where(field, op, value))
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._db, self._query.order_by(field, direction))
+
+    def start_after(self, snapshot) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._db, self._query.start_after(snapshot))
+
+    def limit(self, n: int) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._db, self._query.limit(n))
+
+    async def stream(self) -> AsyncIterator:
+        await self._db._round_trip()
+        for snap in self._query.stream():
+            yield snap
+
+    async def get(self) -> List:
+        return [snap async for snap in self.stream()]
+
+class AsyncMemoryBatch:
+    def __init__(self, db: AsyncMemoryDB):
+        self._db = db
+        self._batch = db.sync.batch()
+
+    def set(self, ref: AsyncMemoryDocument, data: Dict, merge: bool = False):
+        self._batch.set(ref._ref, data, merge=merge)
+
+    def update(self, ref: AsyncMemoryDocument, data: Dict):
+        self._batch.update(ref._ref, data)
+
+    def delete(self, ref: AsyncMemoryDocument):
+        self._batch.delete(ref._ref)
+
+    async def commit(self):
+        await self._db._round_trip()
+        self._batch.commit()
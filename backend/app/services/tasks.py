@@ -1,5 +1,5 @@
 from typing import List, Dict
-from .repo import goals_ref
+from .repo import goals_ref, a_stream_goals
 
 def propose_tasks_from_goals(user_id: str) -> List[Dict]:
     """
@@ -11,7 +11,13 @@ def propose_tasks_from_goals(user_id: str) -> List[Dict]:
     docs = goals_ref().where("user_id", "==", user_id).where("status", "==", "active").stream()
     for doc in docs:
         goals.append({"id": doc.id, **doc.to_dict()})
-    
+    return tasks_from_goals(goals)
+
+async def a_propose_tasks_from_goals(user_id: str) -> List[Dict]:
+    """propose_tasks_from_goals on the async client."""
+    return tasks_from_goals([goal async for goal in a_stream_goals(user_id)])
+
+def tasks_from_goals(goals: List[Dict]) -> List[Dict]:
     if not goals:
         # Return default tasks if no goals
         return [
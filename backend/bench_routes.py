@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the API routes on the in-memory storage backend (no Firebase, Google or memos needed).
+Seeds synthetic users with goals and plans, then drives each route with concurrent in-process clients.
+
+    python bench_routes.py                          # 2000 requests per route, 32 concurrent
+    python bench_routes.py --requests 500 --concurrency 8
+    python bench_routes.py --routes plan_today,plan_generate
+    python bench_routes.py --latency-ms 5           # add a simulated storage round trip to every read/write
+    python bench_routes.py --latency-ms 5 --blocking  # ...that blocks the event loop, like the sync client did
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import random
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import httpx
+from datetime import datetime, timedelta, timezone
+from app.services.repo import get_db, get_async_db, plan_doc_id, UnitOfWork
+from app.services.rollups import stage_rebuild
+
+N_USERS = 200
+
+def seed(db, n_users: int = N_USERS, seed: int = 7):
+    """Users with two goals each, a plan for each of the last 30 days (today included) and their rollups."""
+    rng = random.Random(seed)
+    today = datetime.now(timezone.utc).date()
+    for u in range(n_users):
+        uid = f"u{u}"
+        db.collection("users").document(uid).set({"active": True})
+        for g in range(2):
+            db.collection("goals").document(f"{uid}_g{g}").set({
+                "user_id": uid, "title": f"Goal {g}", "priority": rng.randrange(1, 4),
+                "effort_estimate_min": rng.choice([30, 60, 90]), "domain": ["work"], "why": "", "status": "active"})
+        plans = {}
+        for d in range(30):
+            day = (today - timedelta(days=d)).isoformat()
+            blocks = plans[day] = [{"id": f"b{i}", "title": f"T{i}", "start": f"{day}T{9 + i:02d}:00:00+00:00",
+                                    "end": f"{day}T{9 + i:02d}:45:00+00:00", "completed": rng.random() < 0.6,
+                                    "goal_id": f"{uid}_g{i % 2}", "energy": "high" if i < 2 else "low"} for i in range(4)]
+            db.collection("plans").document(plan_doc_id(uid, day)).set(
+                {"user_id": uid, "date": day, "blocks": blocks, "rationale": "", "replan_count": 0})
+        uow = UnitOfWork(db)
+        stage_rebuild(uow, uid, plans, today - timedelta(days=29), today + timedelta(days=1))
+        uow.commit()
+
+def add_latency(latency_ms: float, blocking: bool = False):
+    """
+    Every round trip the routes make (they all go through the async client) waits latency_ms first.
+    blocking=True sleeps without yielding to the event loop, which is what the sync Firestore client did.
+    """
+    adb = get_async_db()
+    adb.latency_s, adb.blocking = latency_ms / 1000, blocking
+
+def routes(n_users: int):
+    """name -> fn(i) returning (method, url, params, json) for the i-th request."""
+    today = datetime.now(timezone.utc).date()
+    u = lambda i: f"u{i % n_users}"
+    windows = [{"start_iso": f"{today}T14:00:00Z", "end_iso": f"{today}T17:00:00Z"}]
+    return {
+        "health": lambda i: ("GET", "/health", None, None),
+        "plan_today": lambda i: ("GET", "/plan/today", {"user_id": u(i)}, None),
+        "plan_complete": lambda i: ("POST", "/plan/complete", None, {"user_id": u(i), "block_id": "b0", "completed": i % 2 == 0}),
+        # runs after plan_complete (it replaces the seeded blocks); distinct efforts keep the plan cache out of it
+        "plan_generate": lambda i: ("POST", "/plan/generate", None, {
+            "user_id": u(i), "free_windows": windows, "user_prefs": {"max_day_min": 300},
+            "tasks": [{"title": "Deep work", "effort_min": 30 + i % 90, "urgency": 3, "impact": 3}]}),
+        "reviews_rollup": lambda i: ("GET", "/reviews/rollup", {"user_id": u(i), "period": "month"}, None),
+        "reviews_range": lambda i: ("GET", "/reviews/range", {"user_id": u(i), "start": (today - timedelta(days=29)).isoformat()}, None),
+        "goals_list": lambda i: ("GET", "/goals/", {"user_id": u(i)}, None),
+        "budgets_current": lambda i: ("GET", "/budgets/current", {"user_id": u(i)}, None),
+    }
+
+async def drive(client: httpx.AsyncClient, make, n_requests: int, concurrency: int):
+    latencies, errors = [], 0
+    next_i = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_i:
+            method, url, params, body = make(i)
+            t0 = time.perf_counter()
+            r = await client.request(method, url, params=params, json=body)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if r.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": round(n_requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        "errors": errors,
+    }
+
+async def run(names, n_requests: int, concurrency: int):
+    from app.main import app
+    from app.routes import plan
+    plan.memory_store = lambda **k: None  # memos is a separate service, not part of this benchmark
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        table = routes(N_USERS)
+        for name in names:
+            results[name] = await drive(client, table[name], n_requests, concurrency)
+    return results
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="API route throughput on the in-memory storage backend")
+    ap.add_argument("--requests", type=int, default=2000, help="requests per route")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--routes", default=None, help="comma-separated subset of: " + ",".join(routes(1)))
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated storage round trip")
+    ap.add_argument("--blocking", action="store_true", help="round trips block the event loop (sync client)")
+    args = ap.parse_args(argv)
+
+    db = get_db()
+    seed(db)
+    add_latency(args.latency_ms, args.blocking)
+    names = args.routes.split(",") if args.routes else list(routes(1))
+
+    print(f"⏱️  Route throughput: {args.requests} requests/route, concurrency {args.concurrency}, "
+          f"storage latency {args.latency_ms} ms{' (blocking)' if args.blocking else ''}")
+    print("=" * 72)
+    results = asyncio.run(run(names, args.requests, args.concurrency))
+    print(f"{'route':20} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:20} {r['rps']:>10.1f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['errors']:>8}")
+    print(f"\nstorage: {db.stats}")
+    return 1 if any(r["errors"] for r in results.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
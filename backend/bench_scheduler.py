@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for build_free_windows, pack_tasks and the conflict checks on seeded synthetic calendars.
+Reports p50/p99 latency and peak traced memory per call.
+
+    python bench_scheduler.py                      # run, compare against bench_baseline.json if present
+    python bench_scheduler.py --save               # run and write the baseline
+    python bench_scheduler.py --threshold 0.10     # fail if any p50 is >10% slower than the baseline (default 25%)
+    python bench_scheduler.py --quick              # task lists up to 500 only
+
+Exit code 1 when a case regresses past the threshold, or when fragment mode is slower than pack_tasks
+on the fragmented calendar by more than the threshold (checked with or without a baseline).
+"""
+
+import sys
+import os
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta, timezone
+from app.services.free_windows import build_free_windows
+from app.services.busy import FakeBusyProvider
+from app.services.scheduler import pack_tasks, _parse_time
+from app.services.solver import solve_plan
+from app.services.conflict_engine import within_quiet_hours, hard_block_conflict, check_slots
+from app.services.constraints import compile_profile
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+CALENDARS = ["sparse", "dense", "fragmented", "overlapping", "midnight"]
+TASK_COUNTS = [5, 50, 500, 5000]
+DAY0 = datetime(2025, 8, 11, tzinfo=timezone.utc)  # a Monday
+NOISE_FLOOR_MS = 0.05  # p50 differences below this are never regressions
+FRAGMENT_CASE = "solve_plan_fragment/"  # + "fragmented/{n}", budgeted against "pack_tasks/fragmented/{n}"
+
+def synthetic_calendar(kind: str, seed: int = 7):
+    """
+    Seeded (busy_events, day_start, day_end, user_prefs) for one calendar shape.
+    sparse: a few meetings; dense: back-to-back meetings all day; fragmented: many short
+    meetings with 15-30 min gaps; overlapping: meetings that overlap each other;
+    midnight: a two-day horizon with quiet hours crossing midnight.
+    """
+    rng = random.Random(f"{seed}:{kind}")
+    prefs = {"quiet_hours": {"start": "22:00", "end": "07:00"},
+             "hard_blocks": [{"label": "gym", "start": "18:00", "end": "19:00", "days": [1, 3, 5]}],
+             "max_day_min": 600}
+    day_start, day_end = DAY0, DAY0 + timedelta(days=1)
+    busy = []
+    if kind == "sparse":
+        for _ in range(rng.randrange(2, 5)):
+            s = DAY0 + timedelta(minutes=rng.randrange(8 * 60, 18 * 60, 15))
+            busy.append((s, s + timedelta(minutes=rng.choice([30, 60]))))
+    elif kind == "dense":
+        cur = DAY0 + timedelta(hours=7)
+        while cur < DAY0 + timedelta(hours=21):
+            e = cur + timedelta(minutes=rng.choice([30, 45, 60, 90]))
+            busy.append((cur, e))
+            cur = e + timedelta(minutes=rng.choice([0, 0, 15, 30, 60]))
+    elif kind == "fragmented":
+        cur = DAY0 + timedelta(hours=7)
+        while cur < DAY0 + timedelta(hours=22):
+            e = cur + timedelta(minutes=rng.choice([15, 30]))
+            busy.append((cur, e))
+            cur = e + timedelta(minutes=rng.choice([15, 20, 30]))
+    elif kind == "overlapping":
+        for _ in range(40):
+            s = DAY0 + timedelta(minutes=rng.randrange(7 * 60, 21 * 60, 5))
+            busy.append((s, s + timedelta(minutes=rng.randrange(15, 120, 5))))
+    elif kind == "midnight":
+        prefs["quiet_hours"] = {"start": "23:30", "end": "05:30"}
+        day_start, day_end = DAY0 + timedelta(hours=12), DAY0 + timedelta(days=1, hours=12)
+        for _ in range(12):
+            s = day_start + timedelta(minutes=rng.randrange(0, 24 * 60, 15))
+            busy.append((s, s + timedelta(minutes=rng.choice([30, 60, 90]))))
+    else:
+        raise ValueError(f"unknown calendar kind: {kind}")
+    events = [{"start": s.isoformat().replace("+00:00", "Z"), "end": e.isoformat().replace("+00:00", "Z")}
+              for s, e in busy]
+    rng.shuffle(events)
+    return events, day_start, day_end, prefs
+
+def synthetic_tasks(n: int, seed: int = 7):
+    rng = random.Random(f"{seed}:tasks:{n}")
+    return [{
+        "title": f"Task {i}",
+        "goal_id": f"g{i % 7}",
+        "effort_min": rng.choice([15, 30, 45, 60, 90, 120]),
+        "energy": rng.choice(["low", "medium", "high"]),
+        "urgency": rng.randrange(1, 4),
+        "impact": rng.randrange(1, 4),
+    } for i in range(n)]
+
+def _measure(fn, min_runs: int = 7, max_runs: int = 200, budget_s: float = 0.5):
+    """Latency samples (ms) for fn() with GC paused, then one traced call for peak allocated memory."""
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < budget_s):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        gc.enable()
+    samples.sort()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "runs": len(samples),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def run_suite(task_counts=TASK_COUNTS, seed: int = 7):
+    results = {}
+    for kind in CALENDARS:
+        events, day_start, day_end, prefs = synthetic_calendar(kind, seed)
+        results[f"free_windows/{kind}"] = _measure(lambda: build_free_windows(day_start, day_end, events))
+        provider = FakeBusyProvider({"primary": events})
+        results[f"free_windows_provider/{kind}"] = _measure(lambda: build_free_windows(day_start, day_end, provider))
+        windows = build_free_windows(day_start, day_end, events)
+
+        q = prefs["quiet_hours"]
+        quiet_s, quiet_e = _parse_time(q["start"]), _parse_time(q["end"])
+        slots = [(ws + timedelta(minutes=k), ws + timedelta(minutes=k + 45))
+                 for ws, we in windows for k in range(0, int((we - ws).total_seconds() // 60), 15)]
+
+        def conflicts():
+            for s, e in slots:
+                within_quiet_hours(s, e, quiet_s, quiet_e) or hard_block_conflict(s, e, prefs["hard_blocks"])
+        results[f"conflicts/{kind}"] = _measure(conflicts)
+        starts = np.array([int((s - DAY0).total_seconds() // 60) for s, _ in slots])
+        ends = starts + 45
+        results[f"conflicts_batch/{kind}"] = _measure(
+            lambda: check_slots(starts, ends, DAY0, prefs, [0, 0]))
+        profile = compile_profile(prefs)
+        results[f"conflicts_profile/{kind}"] = _measure(lambda: [profile.conflicts(s, e) for s, e in slots])
+
+        for n in task_counts:
+            tasks = synthetic_tasks(n, seed)
+            results[f"pack_tasks/{kind}/{n}"] = _measure(lambda: pack_tasks(windows, tasks, prefs, []))
+            if kind == "fragmented":
+                results[f"{FRAGMENT_CASE}{kind}/{n}"] = _measure(lambda: solve_plan(windows, tasks, prefs, [], mode="fragment"))
+    results.update(_bulk_conflicts(seed))
+    return results
+
+def _bulk_conflicts(seed: int, n: int = 20000):
+    """Scalar loop vs one batch call over a week of random candidate slots."""
+    rng = random.Random(f"{seed}:bulk")
+    _, _, _, prefs = synthetic_calendar("sparse", seed)
+    quiet_s, quiet_e = _parse_time(prefs["quiet_hours"]["start"]), _parse_time(prefs["quiet_hours"]["end"])
+    starts = np.array([rng.randrange(0, 7 * 24 * 60, 5) for _ in range(n)])
+    ends = starts + np.array([rng.choice([15, 30, 45, 60, 90]) for _ in range(n)])
+    pairs = [(DAY0 + timedelta(minutes=int(m)), DAY0 + timedelta(minutes=int(k))) for m, k in zip(starts, ends)]
+
+    def scalar():
+        for s, e in pairs:
+            within_quiet_hours(s, e, quiet_s, quiet_e) or hard_block_conflict(s, e, prefs["hard_blocks"])
+    return {
+        f"conflicts_bulk/scalar/{n}": _measure(scalar, min_runs=3),
+        f"conflicts_bulk/batch/{n}": _measure(lambda: check_slots(starts, ends, DAY0, prefs)),
+    }
+
+def compare(results, baseline, threshold: float):
+    """Cases whose p50 is more than `threshold` (fraction) slower than the baseline."""
+    regressions = []
+    for case, cur in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        limit = base["p50_ms"] * (1 + threshold)
+        if cur["p50_ms"] > limit and cur["p50_ms"] - base["p50_ms"] > NOISE_FLOOR_MS:
+            regressions.append((case, base["p50_ms"], cur["p50_ms"]))
+    return regressions
+
+def budget_regressions(results, threshold: float):
+    """Fragment-mode cases more than `threshold` slower than pack_tasks on the same calendar and task count."""
+    cases = {case: r for case, r in results.items() if case.startswith(FRAGMENT_CASE)}
+    budget = {case: results["pack_tasks/" + case[len(FRAGMENT_CASE):]] for case in cases}
+    return compare(cases, budget, threshold)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Scheduler / conflict-engine benchmarks")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON path")
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    ap.add_argument("--quick", action="store_true", help="skip the 5000-task lists")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    print("⏱️  Scheduler benchmarks")
+    print("=" * 72)
+    counts = [n for n in TASK_COUNTS if not args.quick or n <= 500]
+    results = run_suite(counts, args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+    print(f"{'case':36} {'p50 ms':>10} {'p99 ms':>10} {'peak KB':>9} {'base p50':>10}")
+    for case, r in results.items():
+        base = baseline.get(case, {}).get("p50_ms")
+        print(f"{case:36} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['peak_kb']:>9.1f} {base if base is not None else '-':>10}")
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "seed": args.seed, "results": results}, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return 0
+    regressions = budget_regressions(results, args.threshold)
+    if baseline:
+        regressions += compare(results, baseline, args.threshold)
+    else:
+        print("\nℹ️  No baseline yet; run with --save to create one")
+    if regressions:
+        print(f"\n❌ {len(regressions)} case(s) regressed more than {args.threshold:.0%}:")
+        for case, base, cur in regressions:
+            print(f"   {case}: {base:.3f} ms → {cur:.3f} ms")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
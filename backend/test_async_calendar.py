@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the async Calendar client (token reuse, pagination, batch, 410) never blocks the event loop
+"""
+
+import sys
+import os
+import json
+import asyncio
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from app.services.async_calendar import AsyncCalendarClient, CalendarAPIError, _encode_batch, _decode_batch
+from app.services.google_calendar import SyncTokenExpired
+
+LATENCY_S = 0.2  # simulated Google round trip
+
+class FakeGoogle:
+    """Token endpoint, paged events.list, freeBusy and the batch endpoint; every reply takes LATENCY_S."""
+
+    def __init__(self, n_events=5):
+        self.events = [{"id": f"e{i}", "summary": f"E{i}"} for i in range(n_events)]
+        self.token_calls = 0
+        self.calls = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(LATENCY_S)
+        url = request.url
+        if url.host == "oauth2.googleapis.com":
+            self.token_calls += 1
+            return httpx.Response(200, json={"access_token": f"at{self.token_calls}", "expires_in": 3600})
+        assert request.headers["authorization"].startswith("Bearer at")
+        self.calls.append((request.method, url.path))
+        if url.path.startswith("/batch/"):
+            return self.batch(request)
+        if url.path.endswith("/freeBusy"):
+            body = json.loads(request.content)
+            return httpx.Response(200, json={"calendars": {i["id"]: {"busy": []} for i in body["items"]}})
+        if url.params.get("syncToken") == "stale":
+            return httpx.Response(410, json={"error": {"code": 410, "message": "Sync token is no longer valid"}})
+        lo = int(url.params.get("pageToken") or 0)
+        page = {"items": self.events[lo:lo + 2]}
+        if lo + 2 < len(self.events):
+            page["nextPageToken"] = str(lo + 2)
+        else:
+            page["nextSyncToken"] = "sync-1"
+        return httpx.Response(200, json=page)
+
+    def batch(self, request: httpx.Request) -> httpx.Response:
+        boundary = request.headers["content-type"].split("boundary=")[1]
+        parts = [p for p in request.content.decode().split(f"--{boundary}") if "Content-ID" in p]
+        out = []
+        for i, part in enumerate(parts):
+            method, path = part.split("\r\n\r\n", 1)[1].split(" ")[:2]
+            if "fail" in part:
+                status, body = "400 Bad Request", {"error": {"code": 400}}
+            elif method == "DELETE":
+                status, body = "204 No Content", None
+            else:
+                status, body = "200 OK", {"id": path.rsplit("/", 1)[-1] if method == "PATCH" else f"new{i}"}
+            out.append(f"--resp\r\nContent-Type: application/http\r\nContent-ID: <response-item{i}>\r\n\r\n"
+                       f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{json.dumps(body) if body else ''}\r\n")
+        return httpx.Response(200, content="".join(out) + "--resp--\r\n",
+                              headers={"content-type": "multipart/mixed; boundary=resp"})
+
+async def run_checks():
+    google = FakeGoogle()
+    client = AsyncCalendarClient(transport=httpx.MockTransport(google))
+
+    print("1. Listing follows every page; one token refresh is shared by concurrent callers...")
+    listings = await asyncio.gather(*(client.list_events("rt", "2025-08-11T00:00:00Z", "2025-08-12T00:00:00Z") for _ in range(4)))
+    assert all(len(items) == 5 for items in listings)
+    assert google.token_calls == 1, google.token_calls
+    items, token, pages = await client.list_event_changes("rt", "primary", time_min="2025-08-11T00:00:00Z")
+    assert len(items) == 5 and token == "sync-1" and pages == 3
+    try:
+        await client.list_event_changes("rt", "primary", sync_token="stale")
+        assert False, "expected SyncTokenExpired"
+    except SyncTokenExpired:
+        pass
+    fb = await client.freebusy_query("rt", "2025-08-11T00:00:00Z", "2025-08-12T00:00:00Z", ["primary", "work@x.com"])
+    assert set(fb["calendars"]) == {"primary", "work@x.com"}
+    print(f"   {client.stats()}")
+    small = AsyncCalendarClient(transport=httpx.MockTransport(google), max_tokens=2)
+    for rt in ("rt1", "rt2", "rt3", "rt1"):
+        await small.list_events(rt, "2025-08-11T00:00:00Z", "2025-08-12T00:00:00Z")
+    assert list(small._tokens) == ["rt3", "rt1"] and len(small._locks) == 2 and small.refreshes == 4  # rt1 was evicted
+    await small.aclose()
+
+    print("\n2. publish_blocks batches 50 operations per request and writes ids back...")
+    blocks = [{"id": f"b{i}", "title": f"T{i}", "start": "2025-08-11T09:00:00Z", "end": "2025-08-11T09:30:00Z"} for i in range(58)]
+    blocks[3]["event_id"] = "keep3"
+    blocks[7]["title"] = "fail me"
+    n = len(google.calls)
+    summary = await client.publish_blocks("rt", blocks, ["gone1"])
+    print(f"   {summary}")
+    assert len(google.calls) - n == 2 and summary["batches"] == 2
+    assert summary["published"] == 57 and summary["deleted"] == 1 and list(summary["failures"]) == ["b7"]
+    assert blocks[3]["event_id"] == "keep3" and blocks[0]["event_id"] == "new0" and blocks[55]["event_id"] == "new5"
+
+    print("\n3. Errors surface as CalendarAPIError...")
+    failing = AsyncCalendarClient(transport=httpx.MockTransport(lambda r: httpx.Response(403, json={"error": "denied"})))
+    try:
+        await failing.list_events("rt", "a", "b")
+        assert False, "expected CalendarAPIError"
+    except CalendarAPIError as e:
+        assert e.status == 403
+
+    print("\n4. The event loop keeps serving while Google calls are in flight...")
+    gaps = []
+
+    async def ticker():
+        last = time.perf_counter()
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    started = time.perf_counter()
+    await asyncio.gather(client.publish_blocks("rt", blocks[:10]), client.list_events("rt", "a", "b"), ticker())
+    elapsed = time.perf_counter() - started
+    print(f"   max loop gap {max(gaps) * 1000:.1f} ms over {elapsed * 1000:.0f} ms of Google calls")
+    assert max(gaps) < LATENCY_S / 2  # a blocking client would stall for a whole round trip
+    await client.aclose()
+
+def test_async_calendar():
+    print("🧪 Testing Async Calendar Client...")
+    print("=" * 50)
+
+    batch = _encode_batch([("POST", "/calendars/primary/events", {"summary": "x"}), ("DELETE", "/calendars/primary/events/e1", None)], "b")
+    assert b"Content-ID: <item1>" in batch and batch.endswith(b"--b--\r\n")
+    decoded = _decode_batch("--z\r\nContent-ID: <response-item0>\r\n\r\nHTTP/1.1 204 No Content\r\n\r\n\r\n--z--", "multipart/mixed; boundary=z")
+    assert decoded == {0: (204, {})}
+    broken = ('--z\r\nContent-ID: <response-item0>\r\n\r\nHTTP/1.1 200 OK\r\n\r\n{"id": "e0"}\r\n'
+              "--z\r\nContent-Type: application/http\r\n\r\nHTTP/1.1 200 OK\r\n\r\n{}\r\n"  # no Content-ID
+              "--z\r\nContent-ID: <response-item2>\r\n\r\n\r\n"  # no status line
+              "--z\r\nContent-ID: <response-item3>\r\n\r\nHTTP/1.1 200 OK\r\n\r\n{truncated\r\n--z--")
+    assert _decode_batch(broken, "multipart/mixed; boundary=z") == {0: (200, {"id": "e0"})}
+
+    # everything must go through the injected transport, even if another test module patched AsyncClient.post
+    saved_post = httpx.AsyncClient.post
+
+    def no_global_post(self, *args, **kwargs):
+        raise AssertionError("AsyncCalendarClient bypassed its transport")
+
+    httpx.AsyncClient.post = no_global_post
+    try:
+        asyncio.run(run_checks())
+    finally:
+        httpx.AsyncClient.post = saved_post
+    print("\n✅ Async calendar client test completed!")
+
+if __name__ == "__main__":
+    test_async_calendar()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the nightly batch planner against the in-memory source
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date
+from app.services.batch_planner import InMemorySource, run
+
+class FlakySource(InMemorySource):
+    """In-memory users whose loads fail for the ids in `failing`."""
+
+    def __init__(self, n_users, failing):
+        super().__init__(n_users)
+        self.failing = set(failing)
+
+    def load_user(self, user_id, day):
+        if user_id in self.failing:
+            raise RuntimeError("calendar timeout")
+        return super().load_user(user_id, day)
+
+def test_batch_planner():
+    print("🧪 Testing Batch Planner...")
+    print("=" * 50)
+    day = date(2025, 8, 12)
+    checkpoint = os.path.join(tempfile.mkdtemp(), "batch.json")
+
+    print("1. Planning the first 300 users...")
+    first = InMemorySource(300)
+    stats = asyncio.run(run(first, day, workers=2, chunk_size=100, checkpoint=checkpoint, verbose=False))
+    print(f"   {stats['users']} users, {stats['blocks']} blocks, {stats['users_per_sec']} users/sec")
+    assert stats["users"] == 300 and len(first.plans) == 300 and first.commits == 3
+
+    print("\n2. Resuming with 450 users only plans the remaining 150...")
+    second = InMemorySource(450)
+    stats = asyncio.run(run(second, day, workers=2, chunk_size=100, checkpoint=checkpoint, verbose=False))
+    print(f"   {stats['users']} users planned on resume")
+    assert stats["users"] == 150
+    assert min(second.plans) == "user0000300@2025-08-12"
+
+    print("\n3. Plans match a fresh single run...")
+    fresh = InMemorySource(450)
+    asyncio.run(run(fresh, day, workers=1, chunk_size=1000, verbose=False))
+    for key, plan in second.plans.items():
+        assert fresh.plans[key]["blocks"] == plan["blocks"]
+    print("   ✅ identical")
+
+    print("\n4. Users whose load failed are retried on resume, not skipped...")
+    checkpoint = os.path.join(tempfile.mkdtemp(), "batch.json")
+    flaky = FlakySource(250, ["user0000010", "user0000120", "user0000121"])
+    stats = asyncio.run(run(flaky, day, workers=1, chunk_size=100, checkpoint=checkpoint, verbose=False))
+    assert stats["users"] == 247 and stats["failed"] == 3
+    flaky.failing = {"user0000121"}  # still failing on the next run
+    stats = asyncio.run(run(flaky, day, workers=1, chunk_size=100, checkpoint=checkpoint, verbose=False))
+    print(f"   resume: {stats['users']} retried users planned, {stats['failed']} still failing")
+    assert stats["users"] == 2 and stats["failed"] == 1 and "user0000010@2025-08-12" in flaky.plans
+    flaky.failing = set()
+    stats = asyncio.run(run(flaky, day, workers=1, chunk_size=100, checkpoint=checkpoint, verbose=False))
+    assert (stats["users"], stats["failed"]) == (1, 0) and len(flaky.plans) == 250
+    assert asyncio.run(run(flaky, day, workers=1, chunk_size=100, checkpoint=checkpoint, verbose=False))["users"] == 0
+
+    print("\n✅ Batch planner test completed!")
+
+if __name__ == "__main__":
+    test_batch_planner()
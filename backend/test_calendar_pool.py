@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the Calendar client pool reuses clients and access tokens
+"""
+
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta
+from app.services.calendar_pool import CalendarClientPool
+from app.services.google_calendar import GOOGLE_SCOPES
+
+class FakeCreds:
+    def __init__(self):
+        self.token = None
+        self.expiry = None
+
+class FakePool(CalendarClientPool):
+    """No network: opening a client and refreshing a token are simulated."""
+
+    def __init__(self, *args, token_ttl_s=3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_ttl_s = token_ttl_s
+        self.opened = 0
+
+    def _open(self, refresh_token, scopes):
+        self.opened += 1
+        return FakeCreds(), {"token": refresh_token, "scopes": scopes}, None
+
+    def _refresh(self, c):
+        c.creds.token = f"access-{self.refreshes}"
+        c.creds.expiry = datetime.utcnow() + timedelta(seconds=self.token_ttl_s)
+
+def test_calendar_pool():
+    print("🧪 Testing Calendar Client Pool...")
+    print("=" * 50)
+
+    print("1. Repeated calls reuse one client and one access token...")
+    pool = FakePool(max_clients=2)
+    for _ in range(5):
+        with pool.client("rt-a", GOOGLE_SCOPES) as service:
+            assert service["token"] == "rt-a"
+    stats = pool.stats()
+    print(f"   {stats}")
+    assert pool.opened == 1 and stats["refreshes"] == 1 and stats["hits"] == 4 and stats["hit_rate"] == 0.8
+
+    print("\n2. Tokens close to expiry are refreshed before use...")
+    short = FakePool(refresh_margin_s=300, token_ttl_s=60)
+    for _ in range(3):
+        with short.client("rt-a", GOOGLE_SCOPES):
+            pass
+    assert short.stats()["refreshes"] == 3
+
+    print("\n3. LRU eviction keeps the pool bounded...")
+    for rt in ("rt-b", "rt-c"):
+        with pool.client(rt, GOOGLE_SCOPES):
+            pass
+    stats = pool.stats()
+    assert stats["clients"] == 2 and stats["evictions"] == 1
+    with pool.client("rt-a", GOOGLE_SCOPES):
+        pass
+    assert pool.opened == 4  # rt-a was the least recently used one
+
+    print("\n4. Concurrent callers share a client safely...")
+    busy = FakePool()
+    with busy.client("rt-a", GOOGLE_SCOPES):
+        pass
+    inside = []
+    overlap = []
+
+    def call():
+        for _ in range(50):
+            with busy.client("rt-a", GOOGLE_SCOPES):
+                inside.append(1)
+                if len(inside) > 1:
+                    overlap.append(1)
+                inside.pop()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = busy.stats()
+    print(f"   {stats}")
+    assert not overlap and busy.opened == 1 and stats["refreshes"] == 1
+
+    print("\n5. A real client builds offline (no token yet)...")
+    real = CalendarClientPool()
+    creds, service, http = real._open("rt-real", GOOGLE_SCOPES)
+    assert creds.token is None and hasattr(service, "events") and real._needs_refresh(creds)
+
+    print("\n✅ Calendar client pool test completed!")
+
+if __name__ == "__main__":
+    test_calendar_pool()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify Calendar push notifications mark cached busy time dirty, channel renewal and debounced replans
+"""
+
+import sys
+import os
+import asyncio
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("CALENDAR_WEBHOOK_URL", "https://example.test/calendar/webhook")
+
+from app.services import repo, calendar_watch
+from app.services.calendar_watch import (channel_token, parse_channel_token, needs_renewal, handle_notification,
+                                         simulated_headers, ensure_watch, Debouncer)
+from app.services.event_cache import event_cache, EventCache, MemoryEventStore
+from app.services.async_calendar import async_calendar
+from app.services.storage import MemoryDB, AsyncMemoryDB
+
+class Google:
+    """Counts syncs; every sync returns no changes."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, refresh_token, calendar_id, sync_token=None, time_min=None):
+        self.calls += 1
+        return [], "tok", 1
+
+# the module may have been imported (by app.main) before the environment above was set
+calendar_watch.WEBHOOK_URL = calendar_watch.WEBHOOK_URL or os.environ["CALENDAR_WEBHOOK_URL"]
+calendar_watch.WEBHOOK_SECRET = calendar_watch.WEBHOOK_SECRET or "test-secret"
+
+def calendar_watch_cache_swap(cache):
+    """handle_notification uses the event_cache singleton; swap in a local one."""
+    from app.services import event_cache as module
+    old = module.event_cache
+    module.event_cache = cache
+    return old
+
+def test_calendar_watch():
+    print("🧪 Testing Calendar Push Notifications...")
+    print("=" * 50)
+
+    print("1. Channel tokens identify the user and calendar and can't be forged...")
+    token = channel_token("u1", "work@example.com")
+    assert parse_channel_token(token) == ("u1", "work@example.com")
+    assert parse_channel_token(token.replace("u1", "u2")) is None
+    assert parse_channel_token("garbage") is None
+
+    print("   Without CALENDAR_WEBHOOK_SECRET no channel is opened and no ping is accepted...")
+    from fastapi.testclient import TestClient
+    from app.main import app
+    import hashlib, hmac
+    saved_secret = calendar_watch.WEBHOOK_SECRET
+    calendar_watch.WEBHOOK_SECRET = ""
+    try:
+        forged = "u1|primary|" + hmac.new(b"", b"u1|primary", hashlib.sha256).hexdigest()[:32]  # signed with ""
+        assert parse_channel_token(token) is None and parse_channel_token(forged) is None
+        try:
+            asyncio.run(ensure_watch("u1", {"refresh_token": "rt"}))
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert "CALENDAR_WEBHOOK_SECRET" in str(e)
+        r = TestClient(app).post("/calendar/webhook", headers={"X-Goog-Channel-Token": forged, "X-Goog-Resource-State": "exists"})
+        assert r.status_code == 403
+    finally:
+        calendar_watch.WEBHOOK_SECRET = saved_secret
+
+    print("\n2. A watched calendar isn't synced again until a ping marks it dirty...")
+    google = Google()
+    cache = EventCache(store=MemoryEventStore(), fetch=google.fetch, min_interval_s=0, watch_trust_s=600)
+    real_cache = calendar_watch_cache_swap(cache)
+    try:
+        cache.sync("u1", "rt")
+        cache.set_watch("u1", "primary", time.time() + 3600)
+        for _ in range(3):
+            cache.sync("u1", "rt")
+        assert google.calls == 1, google.calls
+        note = handle_notification({k.lower(): v for k, v in simulated_headers("u1", "primary", "sync").items()})
+        assert note["state"] == "sync" and cache.sync("u1", "rt")["requests"] == 0  # handshake only
+        handle_notification({k.lower(): v for k, v in simulated_headers("u1").items()})
+        assert cache.sync("u1", "rt")["requests"] == 1 and google.calls == 2
+        assert cache.sync("u1", "rt")["requests"] == 0  # clean again
+        assert handle_notification({"x-goog-channel-token": "u1|primary|bad", "x-goog-resource-state": "exists"}) is None
+    finally:
+        calendar_watch_cache_swap(real_cache)
+
+    print("\n3. A ping during a sync leaves the calendar dirty...")
+    slow = EventCache(store=MemoryEventStore(), min_interval_s=0,
+                      fetch=lambda *a, **k: (slow.mark_dirty("u1", "primary"), ([], "tok", 1))[1])
+    slow.sync("u1", "rt")
+    assert slow._state(("u1", "primary"))["dirty"]
+
+    print("\n4. Channels are opened, recorded in integrations and renewed near expiry...")
+    opened, stopped = [], []
+
+    async def watch(rt, cal, channel_id, address, token, ttl_s):
+        opened.append(cal)
+        return {"id": channel_id, "resourceId": "r-" + cal, "expiration": str(int((time.time() + ttl_s) * 1000))}
+
+    async def stop(rt, channel_id, resource_id):
+        stopped.append(resource_id)
+
+    db = MemoryDB()
+    saved = (async_calendar.watch_events, async_calendar.stop_channel, repo.get_async_db, event_cache.store)
+    async_calendar.watch_events, async_calendar.stop_channel = watch, stop
+    repo.get_async_db = lambda: AsyncMemoryDB(db)
+    event_cache.store = MemoryEventStore()
+    try:
+        google_doc = {"refresh_token": "rt", "calendar_ids": ["primary", "work"]}
+        channels = asyncio.run(ensure_watch("u1", google_doc))
+        assert opened == ["primary", "work"] and not needs_renewal(channels["primary"])
+        assert db.collection("integrations").document("u1").get().to_dict()["google"]["channels"] == channels
+        assert asyncio.run(ensure_watch("u1", {**google_doc, "channels": channels})) == channels and len(opened) == 2
+        expiring = {**channels, "work": {**channels["work"], "expiration": int((time.time() + 3600) * 1000)}}
+        renewed = asyncio.run(ensure_watch("u1", {**google_doc, "channels": expiring}))
+        assert opened == ["primary", "work", "work"] and stopped == ["r-work"] and renewed["primary"] == channels["primary"]
+    finally:
+        async_calendar.watch_events, async_calendar.stop_channel, repo.get_async_db, event_cache.store = saved
+
+    print("\n5. A burst of pings triggers one debounced replan...")
+    runs = []
+
+    async def burst():
+        async def replan(user_id):
+            runs.append(user_id)
+        d = Debouncer(0.05, replan)
+        for _ in range(10):
+            d.poke("u1")
+            await asyncio.sleep(0.005)
+        d.poke("u2")
+        await asyncio.sleep(0.15)
+        return d
+
+    d = asyncio.run(burst())
+    print(f"   runs: {runs}")
+    assert sorted(runs) == ["u1", "u2"] and d.runs == 2 and not d.pending()
+
+    print("\n6. The debounced auto-replan repairs today's plan...")
+    from datetime import datetime, timedelta, timezone
+    from app.routes.calendar import _auto_replan
+    from app.services.repo import plan_doc_id
+    from test_doc_loader import use_db, stub_plan_routes
+
+    db = MemoryDB()
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    soon = {"id": "b0", "title": "Soon", "start": (now + timedelta(minutes=10)).isoformat(),
+            "end": (now + timedelta(minutes=40)).isoformat()}  # starts before the 30 min replan cutoff
+    db.collection("plans").document(plan_doc_id("u1", today)).set({"user_id": "u1", "date": today, "blocks": [soon]})
+    restore, unstub = use_db(db), stub_plan_routes()
+    try:
+        asyncio.run(_auto_replan("u1"))
+        blocks = db.collection("plans").document(plan_doc_id("u1", today)).get().to_dict()["blocks"]
+        print(f"   blocks after replan: {[(b['id'], b['start']) for b in blocks]}")
+        assert [b["start"] for b in blocks] != [soon["start"]]  # moved past the cutoff, or dropped
+        asyncio.run(_auto_replan("u2"))  # no plan today: nothing to do
+
+        print("   ...under the prefs the plan was generated with, else the user's stored prefs...")
+        from app.routes import plan
+        seen = []
+        repair = plan.repair_plan
+        plan.repair_plan = lambda blocks, now, delta, prefs, busy: (seen.append(prefs), repair(blocks, now, delta, prefs, busy))[1]
+        try:
+            kept = {"quiet_hours": {"start": "20:00", "end": "08:00"}, "max_day_min": 120}
+            db.collection("users").document("u1").set({"prefs": {"max_day_min": 60}})
+            db.collection("users").document("u3").set({"prefs": {"max_day_min": 60}})
+            db.collection("plans").document(plan_doc_id("u1", today)).set({"user_prefs": kept}, merge=True)
+            db.collection("plans").document(plan_doc_id("u3", today)).set({"user_id": "u3", "date": today, "blocks": [soon]})
+            asyncio.run(_auto_replan("u1"))
+            asyncio.run(_auto_replan("u3"))
+            asyncio.run(plan.replan(plan.ReplanIn(user_id="u1", user_prefs={"max_day_min": 30}), loader=plan.DocLoader()))
+            assert seen == [kept, {"max_day_min": 60}, {"max_day_min": 30}], seen
+        finally:
+            plan.repair_plan = repair
+    finally:
+        restore()
+        unstub()
+
+    print("\n✅ Calendar push notification test completed!")
+
+if __name__ == "__main__":
+    test_calendar_watch()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the request-scoped Firestore loader deduplicates reads and batches them with get_all
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services import repo, budgets
+from app.services.repo import DocLoader, plan_doc_id
+from app.services.storage import AsyncMemoryDB
+from google.cloud.firestore import Increment
+
+class Snap:
+    def __init__(self, path, data):
+        self.reference = Ref(None, path)
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class Ref:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def get(self):
+        self.db.gets += 1
+        return Snap(self.path, self.db.docs.get(self.path))
+
+    def set(self, data, merge=False):
+        self.db.docs[self.path] = {**(self.db.docs.get(self.path) or {}), **data} if merge else dict(data)
+
+class Collection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return Ref(self.db, f"{self.name}/{doc_id}")
+
+class Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, ref):
+        return ref.get()
+
+    def set(self, ref, data, merge=False):
+        ref.set(data, merge)
+
+class Batch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref, data, merge))
+
+    def commit(self):
+        self.db.commits.append(len(self.writes))
+        for ref, data, merge in self.writes:
+            old = self.db.docs.get(ref.path) or {}
+            # Increment transforms add to the stored value
+            ref.set({k: int(old.get(k, 0)) + v.value if isinstance(v, Increment) else v for k, v in data.items()}, merge)
+
+class FakeFirestore:
+    """Documents by path; counts single gets, get_all round trips and batch commits."""
+
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+        self.gets = 0
+        self.get_alls = []
+        self.commits = []
+
+    def batch(self):
+        return Batch(self)
+
+    def collection(self, name):
+        return Collection(self, name)
+
+    def get_all(self, refs):
+        self.get_alls.append([r.path for r in refs])
+        return [Snap(r.path, self.docs.get(r.path)) for r in refs]
+
+    def run_transaction(self, fn):
+        return fn(Transaction(self))
+
+def use_db(db):
+    """Point the sync and async storage at db; returns a function that restores the previous backends."""
+    saved = repo.get_db, budgets.get_db, repo.get_async_db, budgets.get_async_db
+    async_db = AsyncMemoryDB(db)
+    repo.get_db = budgets.get_db = lambda: db
+    repo.get_async_db = budgets.get_async_db = lambda: async_db
+
+    def restore():
+        repo.get_db, budgets.get_db, repo.get_async_db, budgets.get_async_db = saved
+    return restore
+
+def stub_plan_routes():
+    """
+    Stub what the plan and review routes call outside Firestore (memos, push notifications) and empty the
+    process-wide plan cache; returns a function that restores all of it.
+    """
+    from app.routes import plan, reviews
+    saved = plan.memory_store, reviews.memory_store, plan.plan_generated
+
+    async def no_push(*args, **kwargs):
+        return None
+
+    plan.memory_store = reviews.memory_store = lambda **k: "m"
+    plan.plan_generated = no_push
+    plan.plan_cache.clear()
+
+    def restore():
+        plan.memory_store, reviews.memory_store, plan.plan_generated = saved
+        plan.plan_cache.clear()
+    return restore
+
+def test_doc_loader():
+    print("🧪 Testing Request-scoped Firestore Loader...")
+    print("=" * 50)
+
+    print("1. Independent reads share one get_all; repeats are free...")
+    db = FakeFirestore({"users/u1": {"expo_push_token": None}, "integrations/u1": {"google": {}}})
+    loader = DocLoader(db)
+    loader.load(("users", "u1"), ("integrations", "u1"), ("plans", "u1@2025-08-11"), ("users", "u1"))
+    assert db.get_alls == [["users/u1", "integrations/u1", "plans/u1@2025-08-11"]]
+    assert loader.get("users", "u1").exists and not loader.get("plans", "u1@2025-08-11").exists
+    loader.load(("users", "u1"))
+    assert len(db.get_alls) == 1 and db.gets == 0 and (loader.reads, loader.round_trips) == (3, 1)
+    loader.get("goals", "g1")  # not preloaded: one more round trip
+    assert (loader.reads, loader.round_trips) == (4, 2)
+
+    print("\n2. Repo and budget helpers read through the loader...")
+    restore = use_db(db)
+    try:
+        db.docs[f"budgets/{budgets._doc_id('u1')}"] = {"llm_cents": 1490, "llm_limit_cents": 1500}
+        loader = DocLoader(db)
+        loader.load(("plans", plan_doc_id("u1", "2025-08-11")), budgets.budget_key("u1"))
+        assert not repo.get_plan("u1", "2025-08-11", loader).exists
+        assert budgets.within_limit("u1", "llm_cents", 5, "llm_limit_cents", loader)
+        assert not budgets.within_limit("u1", "llm_cents", 20, "llm_limit_cents", loader)
+        assert db.gets == 0 and loader.round_trips == 1
+        budgets.atomic_inc("u1", {"llm_cents": 5}, loader)
+        assert budgets.get_current("u1", loader)["llm_cents"] == 1495  # re-read after the write
+        assert (loader.reads, loader.round_trips) == (4, 3)
+    finally:
+        restore()
+
+    print("\n3. /plan/generate reports its reads in the response headers...")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    db = FakeFirestore({"users/u1": {}})
+    restore, unstub = use_db(db), stub_plan_routes()
+    try:
+        client = TestClient(app)
+        body = {"user_id": "u1", "tasks": [{"title": "Write", "effort_min": 60, "urgency": 3, "impact": 3}],
+                "free_windows": [{"start_iso": "2025-08-11T14:00:00Z", "end_iso": "2025-08-11T16:00:00Z"}],
+                "user_prefs": {"max_day_min": 300}}
+        r = client.post("/plan/generate", json=body)
+        assert r.status_code == 200, r.text
+        print(f"   reads {r.headers['x-firestore-reads']}, round trips {r.headers['x-firestore-round-trips']}, get_all {db.get_alls}")
+        # integrations + plans, then budgets + users together
+        assert r.headers["x-firestore-reads"] == "4" and r.headers["x-firestore-round-trips"] == "2"
+        assert len(db.get_alls) == 2 and db.gets == 0
+        cached = client.post("/plan/generate", json=body)
+        assert cached.json()["cached"] and cached.headers["x-firestore-reads"] == "2"  # integrations + plan
+        assert cached.headers["x-firestore-round-trips"] == "1"
+        # once the stored plan changes, the cached one is stale
+        client.post("/plan/complete", json={"user_id": "u1", "block_id": r.json()["blocks"][0]["id"]})
+        fresh = client.post("/plan/generate", json=body)
+        assert fresh.status_code == 200 and not fresh.json()["cached"] and fresh.json()["plan_type"] == "replan"
+        assert "x-firestore-reads" not in client.get("/health").headers
+    finally:
+        restore()
+        unstub()
+
+    print("\n✅ Firestore loader test completed!")
+
+if __name__ == "__main__":
+    test_doc_loader()
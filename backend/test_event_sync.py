@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify incremental calendar sync (syncToken, pagination, 410 resync) and the event cache
+"""
+
+import sys
+import os
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta, timezone
+from app.services import google_calendar
+from app.services.google_calendar import SyncTokenExpired, block_event_body, busy_from_items, list_event_changes
+from app.services.event_cache import EventCache, MemoryEventStore
+from app.services.busy import CachedEventsBusyProvider
+
+DAY0 = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+def event(eid, start_h, dur_min=60, **extra):
+    s = DAY0 + timedelta(hours=start_h)
+    return {"id": eid, "summary": eid, "status": "confirmed",
+            "start": {"dateTime": s.isoformat()}, "end": {"dateTime": (s + timedelta(minutes=dur_min)).isoformat()}, **extra}
+
+class FakeGoogle:
+    """A calendar with a change log; sync tokens are log positions, like Google's opaque ones."""
+
+    def __init__(self, events):
+        self.log = [dict(e) for e in events]
+        self.expired = False
+        self.calls = []
+
+    def change(self, item):
+        self.log.append(item)
+
+    def fetch(self, refresh_token, calendar_id, sync_token=None, time_min=None):
+        self.calls.append("delta" if sync_token else "full")
+        if sync_token and self.expired:
+            self.expired = False
+            raise SyncTokenExpired(calendar_id)
+        if sync_token:
+            items = self.log[int(sync_token):]
+        else:
+            latest = {}
+            for e in self.log:
+                latest[e["id"]] = e
+            items = [e for e in latest.values() if e.get("status") != "cancelled"]
+        return items, str(len(self.log)), max(1, -(-len(items) // 2))  # pages of 2
+
+class FakeRequest:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+class FakeService:
+    """events().list() over pages of 2; answers 410 for token "stale"."""
+
+    def __init__(self, items):
+        self.items = items
+        self.params = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.params.append(params)
+
+        def run():
+            if params.get("syncToken") == "stale":
+                from googleapiclient.errors import HttpError
+                raise HttpError(type("Resp", (), {"status": 410, "reason": "Gone"})(), b"{}")
+            lo = int(params.get("pageToken") or 0)
+            page = {"items": self.items[lo:lo + 2]}
+            if lo + 2 < len(self.items):
+                page["nextPageToken"] = str(lo + 2)
+            else:
+                page["nextSyncToken"] = "next"
+            return page
+        return FakeRequest(run)
+
+class FakePool:
+    def __init__(self, service):
+        self.service = service
+
+    @contextmanager
+    def client(self, refresh_token, scopes):
+        yield self.service
+
+def test_event_sync():
+    print("🧪 Testing Incremental Calendar Sync...")
+    print("=" * 50)
+
+    print("1. list_event_changes reads every page and maps 410 to SyncTokenExpired...")
+    service = FakeService([event(f"e{i}", 8 + i) for i in range(5)])
+    real_pool = google_calendar.calendar_pool
+    google_calendar.calendar_pool = FakePool(service)
+    try:
+        items, token, pages = list_event_changes("rt", "primary", time_min=DAY0.isoformat())
+        assert len(items) == 5 and token == "next" and pages == 3
+        assert "timeMin" in service.params[0] and "syncToken" not in service.params[0]
+        list_event_changes("rt", "primary", sync_token="abc")
+        assert service.params[-1]["syncToken"] == "abc" and "timeMin" not in service.params[-1]
+        try:
+            list_event_changes("rt", "primary", sync_token="stale")
+            assert False, "expected SyncTokenExpired"
+        except SyncTokenExpired:
+            pass
+        items = google_calendar.list_events("rt", DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())
+        assert len(items) == 5  # no longer truncated to the first page
+    finally:
+        google_calendar.calendar_pool = real_pool
+
+    print("\n2. First sync is full, later ones apply only the changes...")
+    google = FakeGoogle([event("a", 9), event("b", 11), event("c", 14)])
+    store = MemoryEventStore()
+    cache = EventCache(store=store, fetch=google.fetch, min_interval_s=0)
+    first = cache.sync("u1", "rt")
+    print(f"   first: {first}")
+    assert first["full"] and first["events"] == 3 and store.writes == 1
+
+    google.change(event("b", 12))                          # moved
+    google.change({"id": "c", "status": "cancelled"})      # deleted
+    google.change(event("d", 16))                          # new
+    delta = cache.sync("u1", "rt")
+    print(f"   delta: {delta}")
+    assert not delta["full"] and delta["changes"] == 3 and delta["requests"] == 2
+    ids = [e["id"] for e in cache.events("u1", "primary", DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())]
+    assert ids == ["a", "b", "d"], ids
+    assert cache.events("u1", "primary", DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())[1]["start"].startswith(
+        (DAY0 + timedelta(hours=12)).isoformat()[:16])
+
+    print("\n3. An empty delta doesn't rewrite the stored copy...")
+    writes = store.writes
+    assert cache.sync("u1", "rt")["changes"] == 0 and store.writes == writes
+
+    print("\n4. 410 Gone drops the copy and resyncs in full...")
+    google.expired = True
+    google.change({"id": "a", "status": "cancelled"})
+    resync = cache.sync("u1", "rt")
+    print(f"   resync: {resync}, calls: {google.calls}")
+    assert resync["full"] and cache.stats()["resyncs"] == 1 and google.calls[-2:] == ["delta", "full"]
+    assert [e["id"] for e in cache.events("u1", "primary", DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())] == ["b", "d"]
+
+    print("\n5. A new worker starts from the stored copy (no full sync)...")
+    other = EventCache(store=store, fetch=google.fetch, min_interval_s=0)
+    assert not other.sync("u1", "rt")["full"]
+
+    print("\n6. Syncs within min_interval_s don't call Google...")
+    throttled = EventCache(store=MemoryEventStore(), fetch=google.fetch, min_interval_s=60)
+    throttled.sync("u2", "rt")
+    n = len(google.calls)
+    assert throttled.sync("u2", "rt")["requests"] == 0 and len(google.calls) == n
+    assert throttled.sync("u2", "rt", force=True)["requests"] == 1
+
+    print("\n7. Busy time skips all-day, transparent and our own published events...")
+    published = {**block_event_body({"id": "b1", "title": "Write", "start": (DAY0 + timedelta(hours=11)).isoformat(),
+                                     "end": (DAY0 + timedelta(hours=12)).isoformat()}), "id": "ev-b1", "status": "confirmed"}
+    google = FakeGoogle([
+        published,
+        event("meeting", 9),
+        event("focus", 10, transparency="transparent"),
+        {"id": "holiday", "status": "confirmed", "start": {"date": DAY0.date().isoformat()},
+         "end": {"date": (DAY0 + timedelta(days=1)).date().isoformat()}},
+    ])
+    cache = EventCache(store=MemoryEventStore(), fetch=google.fetch, min_interval_s=0)
+    provider = CachedEventsBusyProvider("u3", "rt", ["primary"], cache=cache)
+    busy = provider.busy(DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())
+    print(f"   busy: {busy}")
+    assert len(busy) == 1 and busy[0]["start"] == (DAY0 + timedelta(hours=9)).isoformat()
+    cached = cache.events("u3", "primary", DAY0.isoformat(), (DAY0 + timedelta(days=1)).isoformat())
+    assert len(cached) == 4 and [e["plan_block"] for e in cached if e["plan_block"]] == ["b1"]
+    assert busy_from_items(google.log) == [{"id": "meeting", "start": busy[0]["start"], "end": busy[0]["end"], "summary": "meeting"}]
+
+    print("\n✅ Incremental calendar sync test completed!")
+
+if __name__ == "__main__":
+    test_event_sync()
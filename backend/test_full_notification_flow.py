@@ -60,7 +60,9 @@ class MockDoc:
 
 # Mock the Firebase client
 import app.services.repo
+from app.services.storage import AsyncMemoryDB
 app.services.repo.get_db = lambda: MockFirestore()
+app.services.repo.get_async_db = lambda: AsyncMemoryDB(MockFirestore())
 
 # Mock httpx for testing
 import httpx
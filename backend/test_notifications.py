@@ -34,7 +34,9 @@ class MockDocSnapshot:
 
 # Mock the Firebase client
 import app.services.repo
+from app.services.storage import AsyncMemoryDB
 app.services.repo.get_db = lambda: MockFirestore()
+app.services.repo.get_async_db = lambda: AsyncMemoryDB(MockFirestore())
 
 # Test the notification service
 import asyncio
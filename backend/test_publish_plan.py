@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify diff-based plan publishing: republishing the same plan makes no Google writes
+"""
+
+import sys
+import os
+import json
+import asyncio
+import itertools
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from datetime import datetime, timezone
+from app.services import async_calendar as async_calendar_module
+from app.services.async_calendar import AsyncCalendarClient
+from app.services.busy import GoogleFreeBusyProvider
+from app.services.google_calendar import diff_blocks, block_event_body, BLOCK_ID_PROP
+from app.services.scheduler import _make_block
+
+DAY = datetime(2025, 8, 11, tzinfo=timezone.utc)
+START, END = "2025-08-11T00:00:00+00:00", "2025-08-12T00:00:00+00:00"
+
+def block(title, h, m=0, dur=30):
+    s = DAY.replace(hour=h, minute=m)
+    return _make_block({"title": title}, s, s.replace(minute=m + dur) if m + dur < 60 else s.replace(hour=h + 1, minute=m + dur - 60))
+
+class StatefulGoogle:
+    """Events kept in memory; supports the tagged listing and batched insert/patch/delete."""
+
+    def __init__(self):
+        self.events = {}
+        self.ids = itertools.count(1)
+        self.writes = 0
+        self.reads = 0
+
+    def add(self, body):
+        eid = f"ev{next(self.ids)}"
+        self.events[eid] = {**body, "id": eid}
+        return self.events[eid]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "oauth2.googleapis.com":
+            return httpx.Response(200, json={"access_token": "at", "expires_in": 3600})
+        if request.url.path.startswith("/batch/"):
+            return self.batch(request)
+        self.reads += 1
+        if request.url.path.endswith("/freeBusy"):
+            return self.freebusy()
+        name, value = request.url.params["privateExtendedProperty"].split("=")
+        items = [e for e in self.events.values()
+                 if e.get("extendedProperties", {}).get("private", {}).get(name) == value
+                 and START <= e["start"]["dateTime"].replace("Z", "+00:00") < END]
+        return httpx.Response(200, json={"items": items})
+
+    def freebusy(self) -> httpx.Response:
+        """Every event's time, overlapping and touching ones merged, as Google reports it."""
+        spans = sorted((e["start"]["dateTime"].replace("+00:00", "Z"), e["end"]["dateTime"].replace("+00:00", "Z"))
+                       for e in self.events.values())
+        busy = []
+        for s, e in spans:
+            if busy and s <= busy[-1]["end"]:
+                busy[-1]["end"] = max(busy[-1]["end"], e)
+            else:
+                busy.append({"start": s, "end": e})
+        return httpx.Response(200, json={"calendars": {"primary": {"busy": busy}}})
+
+    def batch(self, request: httpx.Request) -> httpx.Response:
+        boundary = request.headers["content-type"].split("boundary=")[1]
+        out = []
+        for i, part in enumerate(p for p in request.content.decode().split(f"--{boundary}") if "Content-ID" in p):
+            http = part.split("\r\n\r\n", 1)[1]
+            method, path = http.split(" ")[:2]
+            body = json.loads(http.split("\r\n\r\n", 1)[1]) if method != "DELETE" else None
+            eid = path.rsplit("/", 1)[-1]
+            self.writes += 1
+            if method == "POST":
+                status, resp = "200 OK", self.add(body)
+            elif eid not in self.events:
+                status, resp = "404 Not Found", {"error": {"code": 404}}
+            elif method == "PATCH":
+                self.events[eid].update(body)
+                status, resp = "200 OK", self.events[eid]
+            else:
+                del self.events[eid]
+                status, resp = "204 No Content", None
+            out.append(f"--r\r\nContent-ID: <response-item{i}>\r\n\r\nHTTP/1.1 {status}\r\n\r\n{json.dumps(resp) if resp else ''}\r\n")
+        return httpx.Response(200, content="".join(out) + "--r--", headers={"content-type": "multipart/mixed; boundary=r"})
+
+async def run_checks():
+    google = StatefulGoogle()
+    client = AsyncCalendarClient(transport=httpx.MockTransport(google))
+
+    print("1. First publish inserts every block in one batch...")
+    plan = [block("Write", 9), block("Gym", 12), block("Email", 16)]
+    s = await client.publish_plan("rt", plan, START, END)
+    print(f"   {s}")
+    assert (s["inserted"], s["patched"], s["deleted"], s["batches"]) == (3, 0, 0, 1) and len(google.events) == 3
+    assert all(b["event_id"] in google.events for b in plan)
+
+    print("\n2. Republishing the same plan writes nothing...")
+    writes = google.writes
+    again = [block("Write", 9), block("Gym", 12), block("Email", 16)]  # freshly generated, no event ids
+    s = await client.publish_plan("rt", again, START, END)
+    print(f"   {s}")
+    assert s["unchanged"] == 3 and s["batches"] == 0 and google.writes == writes
+    assert [b["event_id"] for b in again] == [b["event_id"] for b in plan]
+
+    print("\n3. Moved, removed and new blocks: one patch, one delete, one insert...")
+    changed = [block("Write", 9), block("Gym", 13), block("Read", 18)]
+    s = await client.publish_plan("rt", changed, START, END)
+    print(f"   {s}")
+    assert (s["inserted"], s["patched"], s["deleted"], s["unchanged"], s["batches"]) == (1, 1, 1, 1, 1)
+    assert changed[1]["event_id"] == plan[1]["event_id"]  # same event, moved
+    assert google.events[changed[1]["event_id"]]["extendedProperties"]["private"][BLOCK_ID_PROP] == changed[1]["id"]
+    assert sorted(e["summary"] for e in google.events.values()) == ["Gym", "Read", "Write"]
+
+    print("\n4. Duplicates left by older publishes are cleaned up...")
+    google.add(block_event_body(changed[0]))
+    s = await client.publish_plan("rt", changed, START, END)
+    assert s["deleted"] == 1 and s["unchanged"] == 3 and len(google.events) == 3
+
+    print("\n5. Untagged events from before tagging are adopted, deleted ones re-created...")
+    legacy = google.add({"summary": "Walk", "start": {"dateTime": "2025-08-11T19:00:00Z"}, "end": {"dateTime": "2025-08-11T19:30:00Z"}})
+    walk, lost = block("Walk", 19), block("Call", 20)
+    walk["event_id"], lost["event_id"] = legacy["id"], "deleted-in-google"
+    s = await client.publish_plan("rt", changed + [walk, lost], START, END)
+    print(f"   {s}")
+    assert s["patched"] == 1 and s["inserted"] == 1 and not s["failures"]
+    assert walk["event_id"] == legacy["id"] and lost["event_id"] in google.events and len(google.events) == 5
+    writes = google.writes
+    s = await client.publish_plan("rt", changed + [walk, lost], START, END)
+    assert s["unchanged"] == 5 and google.writes == writes
+
+    print("\n6. Freebusy busy time leaves out our own published blocks...")
+    google.add({"summary": "Meeting", "start": {"dateTime": "2025-08-11T13:30:00Z"}, "end": {"dateTime": "2025-08-11T14:30:00Z"}})
+    saved, async_calendar_module.async_calendar = async_calendar_module.async_calendar, client
+    try:
+        busy = await GoogleFreeBusyProvider("rt").a_busy(START, END)
+    finally:
+        async_calendar_module.async_calendar = saved
+    print(f"   busy: {busy}")
+    assert busy == [{"start": "2025-08-11T13:30:00Z", "end": "2025-08-11T14:30:00Z"}]  # split off Gym 13:00-13:30
+    await client.aclose()
+
+def test_publish_plan():
+    print("🧪 Testing Diff-based Plan Publishing...")
+    print("=" * 50)
+
+    a, b = block("A", 9), block("B", 10)
+    events = [{"id": "e1", **block_event_body(a)}, {"id": "e2", **block_event_body(block("B", 11))}, {"id": "e3", **block_event_body(block("C", 12))}]
+    inserts, patches, deletes, unchanged = diff_blocks([a, b, block("D", 14)], events)
+    assert unchanged == [(a, "e1")] and patches == [(b, "e2")] and deletes == ["e3"] and [x["title"] for x in inserts] == ["D"]
+
+    asyncio.run(run_checks())
+    print("\n✅ Diff-based plan publishing test completed!")
+
+if __name__ == "__main__":
+    test_publish_plan()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify multi-day plan reads: reviews over a range cost one Firestore round trip
+"""
+
+import sys
+import os
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.repo import get_plans_range, DocLoader
+from test_doc_loader import FakeFirestore, use_db
+
+def seed(days, start=date(2025, 8, 1)):
+    """Plans on every other day; day i has i % 4 of 4 blocks completed."""
+    docs = {}
+    for i in range(0, days, 2):
+        d = (start + timedelta(days=i)).isoformat()
+        docs[f"plans/u1@{d}"] = {"user_id": "u1", "date": d,
+                                 "blocks": [{"title": f"T{j}", "completed": j < i % 4} for j in range(4)]}
+    return docs
+
+def test_reviews_range():
+    print("🧪 Testing Batched Plan Range Reads...")
+    print("=" * 50)
+
+    print("1. get_plans_range reads a whole range with one get_all...")
+    db = FakeFirestore(seed(30))
+    restore = use_db(db)
+    try:
+        plans = dict(get_plans_range("u1", date(2025, 8, 1), date(2025, 8, 31)))
+        assert len(plans) == 15 and "2025-08-03" in plans and "2025-08-02" not in plans
+        assert len(db.get_alls) == 1 and len(db.get_alls[0]) == 30 and db.gets == 0
+        assert list(get_plans_range("u1", date(2025, 8, 5), date(2025, 8, 5))) == []
+
+        loader = DocLoader(db)
+        assert len(dict(get_plans_range("u1", date(2025, 8, 1), date(2025, 8, 8), loader))) == 4
+        assert len(dict(get_plans_range("u1", date(2025, 8, 3), date(2025, 8, 6), loader))) == 2
+        assert loader.round_trips == 1  # second range was already loaded
+    finally:
+        restore()
+
+    print("\n2. /reviews/range covers up to 90 days from three month rollups in one round trip...")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    db = FakeFirestore(seed(90))
+    restore = use_db(db)
+    try:
+        client = TestClient(app)
+        # plans written before rollups existed are backfilled from the plans themselves
+        rebuilt = client.post("/reviews/rollups/rebuild", params={"user_id": "u1", "start": "2025-08-01", "end": "2025-10-29"})
+        assert rebuilt.status_code == 200, rebuilt.text
+        assert rebuilt.json()["from"] == "2025-07-28" and rebuilt.json()["plans"] == 45  # whole ISO week of Aug 1
+        r = client.get("/reviews/range", params={"user_id": "u1", "start": "2025-08-01", "end": "2025-10-29"})
+        assert r.status_code == 200, r.text
+        data = r.json()
+        print(f"   {data['days']} days, {data['completed_blocks']}/{data['total_blocks']} blocks, "
+              f"reads {r.headers['x-firestore-reads']}, round trips {r.headers['x-firestore-round-trips']}")
+        assert data["days"] == 90 and data["total_blocks"] == 45 * 4 and len(data["by_day"]) == 45
+        assert list(data["by_day"]) == sorted(data["by_day"])
+        assert data["by_day"]["2025-08-03"] == {"total": 4, "completed": 2, "rate": 50.0}
+        assert r.headers["x-firestore-round-trips"] == "1" and r.headers["x-firestore-reads"] == "3"
+
+        too_long = client.get("/reviews/range", params={"user_id": "u1", "start": "2025-08-01", "end": "2025-10-30"})
+        backwards = client.get("/reviews/range", params={"user_id": "u1", "start": "2025-08-02", "end": "2025-08-01"})
+        assert too_long.status_code == 400 and backwards.status_code == 400
+    finally:
+        restore()
+
+    print("\n✅ Batched plan range test completed!")
+
+if __name__ == "__main__":
+    test_reviews_range()
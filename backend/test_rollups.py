@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify adherence rollups: kept by Increment in the same batch as plan writes, read in O(1)
+"""
+
+import sys
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.repo import UnitOfWork, DocLoader, write_plans, save_plan, save_plans, plan_doc_id
+from app.services.rollups import stage_rollups, stage_rebuild, rebuild_span, rollup_keys, summarize, period_key
+from app.services.storage import MemoryDB
+from test_doc_loader import use_db, stub_plan_routes
+
+def rollup(db, doc_id):
+    return db.collection("rollups").document(doc_id).get().to_dict()
+
+def test_rollups():
+    print("🧪 Testing Adherence Rollups...")
+    print("=" * 50)
+
+    print("1. Week and month keys...")
+    assert period_key("week", date(2025, 8, 11)) == "2025-W33" and period_key("month", date(2025, 8, 11)) == "2025-08"
+    assert period_key("week", date(2024, 12, 30)) == "2025-W01"  # ISO year
+    assert rollup_keys("u1", date(2025, 8, 1), date(2025, 8, 11), "week") == [
+        ("rollups", "u1@2025-W31"), ("rollups", "u1@2025-W32")]
+    assert rebuild_span(date(2025, 8, 1), date(2025, 8, 2)) == (date(2025, 7, 28), date(2025, 9, 1))
+
+    print("\n2. Plan changes stage only the counters that moved...")
+    db = MemoryDB()
+    blocks = [{"id": "b0", "goal_id": "g1", "energy": "high"}, {"id": "b1", "goal_id": "g2", "energy": "low"}]
+    uow = UnitOfWork(db)
+    assert stage_rollups(uow, "u1", [("2025-08-11", [], blocks)]) == 2
+    uow.commit()
+    done = [{**blocks[0], "completed": True}, blocks[1]]
+    uow = UnitOfWork(db)
+    stage_rollups(uow, "u1", [("2025-08-11", blocks, done), ("2025-08-31", [], blocks)])  # a Sunday: week 35
+    assert sorted(k[1] for k in uow._writes) == ["u1@2025-08", "u1@2025-W33", "u1@2025-W35"]
+    uow.commit()
+    assert stage_rollups(UnitOfWork(db), "u1", [("2025-08-11", done, [dict(b) for b in done])]) == 0
+    week, month = rollup(db, "u1@2025-W33"), rollup(db, "u1@2025-08")
+    print(f"   week: {week['planned']} planned, {week['completed']} completed, by_goal {week['by_goal']}")
+    assert (week["planned"], week["completed"], month["planned"], month["completed"]) == (2, 1, 4, 1)
+    assert week["by_goal"] == {"g1": {"planned": 1, "completed": 1}, "g2": {"planned": 1}}
+    assert month["by_energy"]["high"] == {"planned": 2, "completed": 1}
+    assert month["by_day"]["2025-08-11"] == {"planned": 2, "completed": 1} and month["key"] == "2025-08"
+
+    print("\n3. /plan/complete marks the block and bumps the rollups in one commit...")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    db = MemoryDB()
+    restore, unstub = use_db(db), stub_plan_routes()
+    today = datetime.now(timezone.utc).date()
+    try:
+        client = TestClient(app)
+        tasks = [{"title": "Write", "goal_id": "g1", "energy": "high", "effort_min": 60, "urgency": 3, "impact": 3},
+                 {"title": "Email", "goal_id": "g2", "energy": "low", "effort_min": 30, "urgency": 2, "impact": 1}]
+        gen = client.post("/plan/generate", json={"user_id": "u1", "tasks": tasks, "user_prefs": {"max_day_min": 300},
+                          "free_windows": [{"start_iso": "2025-08-11T14:00:00Z", "end_iso": "2025-08-11T17:00:00Z"}]})
+        assert gen.status_code == 200, gen.text
+        first = gen.json()["blocks"][0]
+
+        def complete(completed):
+            before = db.stats["commits"]
+            r = client.post("/plan/complete", json={"user_id": "u1", "block_id": first["id"], "completed": completed})
+            assert r.status_code == 200, r.text
+            return r.json()["adherence"], db.stats["commits"] - before
+
+        assert complete(True) == ({"completed": 1, "planned": 2}, 1)
+        assert complete(True) == ({"completed": 1, "planned": 2}, 0)  # already done: nothing written
+        week = client.get("/reviews/rollup", params={"user_id": "u1"})
+        data = week.json()
+        print(f"   {data['key']}: {data['completed']}/{data['planned']} ({data['rate']:.0f}%), by_energy {data['by_energy']}")
+        assert week.headers["x-firestore-reads"] == "1" and (data["planned"], data["completed"]) == (2, 1)
+        assert data["by_goal"][first["goal_id"]] == {"planned": 1, "completed": 1, "rate": 100.0}
+        assert data["by_day"] == {today.isoformat(): {"planned": 2, "completed": 1, "rate": 50.0}}
+        assert complete(False) == ({"completed": 0, "planned": 2}, 1)
+        month = client.get("/reviews/rollup", params={"user_id": "u1", "period": "month"}).json()
+        assert (month["planned"], month["completed"]) == (2, 0)
+        assert client.get("/reviews/rollup", params={"user_id": "u1", "period": "year"}).status_code == 400
+
+        complete(True)
+        review = client.post("/reviews/weekly/generate", params={"user_id": "u1"})
+        assert review.status_code == 200 and review.json()["total_blocks"] == 0  # today isn't in the last 7 days
+        assert int(review.headers["x-firestore-reads"]) <= 2
+        ranged = client.get("/reviews/range", params={"user_id": "u1", "start": today.isoformat()}).json()
+        assert (ranged["total_blocks"], ranged["completed_blocks"]) == (2, 1)
+    finally:
+        restore()
+        unstub()
+
+    print("\n4. Incremental rollups match a rebuild from the plans...")
+    rng = random.Random(3)
+    db = MemoryDB()
+    plans = {}
+    for _ in range(300):
+        day = date(2025, 8, 1 + rng.randrange(31)).isoformat()
+        old = plans.get(day, [])
+        if old and rng.random() < 0.7:
+            new = [dict(b) for b in old]
+            b = rng.choice(new)
+            b["completed"] = not b.get("completed")
+        else:
+            new = [{"id": f"b{i}", "goal_id": rng.choice(["g1", "g2", None]), "energy": rng.choice(["high", "low"]),
+                    "completed": rng.random() < 0.3} for i in range(rng.randrange(5))]
+        uow = UnitOfWork(db)
+        stage_rollups(uow, "u1", [(day, old, new)])
+        uow.commit()
+        plans[day] = new
+    start, end = date(2025, 8, 1), date(2025, 9, 1)
+    keys = rollup_keys("u1", start, end, "week") + rollup_keys("u1", start, end, "month")
+    loader = DocLoader(db)
+    incremental = [summarize("u1", "month", start, loader.get(*k)) for k in keys]
+    uow = UnitOfWork(db)
+    assert stage_rebuild(uow, "u1", plans, start, end) == 5 + 1  # weeks 31-35 and August
+    uow.commit()
+    rebuilt = [summarize("u1", "month", start, DocLoader(db).get(*k)) for k in keys]
+    assert incremental == rebuilt
+    print(f"   {len(keys)} rollups agree after 300 plan changes")
+
+    print("\n5. Batch plan writes and replans keep the rollups in step...")
+    db = MemoryDB()
+    restore, unstub = use_db(db), stub_plan_routes()
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    soon = {"id": "b0", "goal_id": "g1", "energy": "high", "start": (now + timedelta(minutes=10)).isoformat(),
+            "end": (now + timedelta(minutes=40)).isoformat()}  # before the replan cutoff: moved or dropped
+    done = {"id": "b1", "goal_id": "g2", "completed": True, "start": (now - timedelta(hours=2)).isoformat(),
+            "end": (now - timedelta(hours=1)).isoformat()}
+    try:
+        assert write_plans([("u1", today.isoformat(), [soon], None), ("u2", today.isoformat(), [soon], None)]) == 1
+        assert write_plans([("u1", today.isoformat(), [soon, done], "nightly")]) == 1  # replaces, doesn't add
+        month = rollup(db, f"u1@{today:%Y-%m}")
+        assert (month["planned"], month["completed"]) == (2, 1) and rollup(db, f"u2@{today:%Y-%m}")["planned"] == 1
+        save_plan("u3", today.isoformat(), [soon, done])
+        save_plans("u3", {today.isoformat(): [done]})
+        assert (rollup(db, f"u3@{today:%Y-%m}")["planned"], rollup(db, f"u3@{today:%Y-%m}")["completed"]) == (1, 1)
+        r = TestClient(app).post("/plan/replan", json={"user_id": "u1"})
+        assert r.status_code == 200 and (r.json()["moved"] or r.json()["dropped"]), r.text
+        stored = db.collection("plans").document(plan_doc_id("u1", today.isoformat())).get().to_dict()
+        blocks = stored["blocks"]
+        assert stored["adherence"] == {"completed": 1, "planned": len(blocks)}  # dropped blocks leave the count too
+        incremental = summarize("u1", "month", today, DocLoader(db).get("rollups", f"u1@{today:%Y-%m}"))
+        assert incremental["planned"] == len(blocks) and incremental["completed"] == 1
+        uow = UnitOfWork(db)
+        stage_rebuild(uow, "u1", {today.isoformat(): blocks}, today, today + timedelta(days=1))
+        uow.commit()
+        assert summarize("u1", "month", today, DocLoader(db).get("rollups", f"u1@{today:%Y-%m}")) == incremental
+    finally:
+        restore()
+        unstub()
+
+    print("\n✅ Rollups test completed!")
+
+if __name__ == "__main__":
+    test_rollups()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the occupancy-grid packer matches the slot-by-slot walk
+"""
+
+import sys
+import os
+import random
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta, timezone
+from app.services.occupancy import OccupancyGrid
+from app.services.scheduler import pack_tasks, pack_tasks_range, _parse_time
+from app.services.constraints import compile_profile
+from app.services.conflict_engine import DailyLoad, within_quiet_hours, hard_block_conflict, check_slots
+from app.services.solver import solve_plan
+from app.services.free_windows import build_free_windows, common_free_windows
+from app.services.busy import BusyProvider, FakeBusyProvider
+from app.services.plan_cache import PlanCache, plan_key, plan_fingerprint, busy_fingerprint
+from app.services.replan import repair_plan
+
+def random_case(rng):
+    hhmm = lambda: f"{rng.randrange(24):02d}:{rng.choice([0, 15, 30, 45, 7]):02d}"
+    tz = rng.choice([timezone.utc, timezone(timedelta(hours=5, minutes=30)), timezone(timedelta(hours=-8))])
+    cur = datetime(2025, 8, rng.randrange(1, 28), tzinfo=tz) + timedelta(minutes=rng.randrange(0, 600))
+    windows = []
+    for _ in range(rng.randrange(0, 8)):
+        s = cur + timedelta(minutes=rng.randrange(0, 300))
+        e = s + timedelta(minutes=rng.randrange(0, 600))
+        windows.append((s, e))
+        cur = e
+    prefs = {
+        "quiet_hours": {"start": hhmm(), "end": hhmm()},
+        "hard_blocks": [
+            {"label": "hb", "start": hhmm(), "end": hhmm(), "days": rng.sample(range(1, 8), rng.randrange(0, 8))}
+            for _ in range(rng.randrange(0, 4))
+        ],
+        "max_day_min": rng.choice([60, 300, 2000]),
+    }
+    return windows, prefs
+
+def test_first_fit_matches_walk():
+    print("1. Grid first-fit vs slot walk on random calendars...")
+    rng = random.Random(42)
+    checked = 0
+    for _ in range(500):
+        windows, prefs = random_case(rng)
+        grid = OccupancyGrid(windows, compile_profile(prefs))
+        for need in (15, 30, 45, 60, 90, 120, 17, 240, 1500):
+            assert grid.first_fit(need) == grid._scan(need), (windows, prefs, need)
+            checked += 1
+    print(f"   {checked} placements identical")
+
+def test_constraint_profile():
+    print("\n1b. Compiled profile vs conflict_engine checks...")
+    rng = random.Random(7)
+    checked = 0
+    for _ in range(300):
+        windows, prefs = random_case(rng)
+        profile = compile_profile(prefs)
+        assert compile_profile(dict(prefs)) is profile
+        q = prefs["quiet_hours"]
+        qs, qe = _parse_time(q["start"]), _parse_time(q["end"])
+        for ws, _ in windows:
+            for k in range(0, 24 * 60, 35):
+                s = ws + timedelta(minutes=k)
+                e = s + timedelta(minutes=rng.choice([15, 45, 90]))
+                assert profile.quiet(s, e) == within_quiet_hours(s, e, qs, qe)
+                assert profile.hard_conflict(s, e) == hard_block_conflict(s, e, prefs["hard_blocks"])
+                checked += 1
+    print(f"   {checked} slots agree")
+
+def test_check_slots():
+    print("\n1c. Batch slot checks vs scalar checks...")
+    rng = random.Random(11)
+    day0 = datetime(2025, 8, 10, tzinfo=timezone.utc)  # Sunday
+    for case in range(50):
+        _, prefs = random_case(rng)
+        q = prefs["quiet_hours"]
+        qs, qe = _parse_time(q["start"]), _parse_time(q["end"])
+        starts = [rng.randrange(-2 * 24 * 60, 7 * 24 * 60) for _ in range(400)]  # some before day0
+        ends = [m + rng.choice([0, 15, 45, 90, 600]) for m in starts]
+        used = [rng.randrange(0, 300) for _ in range(5)]
+        if case % 2:  # NumPy input, as the batch callers pass it
+            starts, ends, used = np.array(starts), np.array(ends), np.array(used)
+        masks = check_slots(starts, ends, day0, prefs, used)
+        for k, (m, n) in enumerate(zip(map(int, starts), map(int, ends))):
+            s, e = day0 + timedelta(minutes=m), day0 + timedelta(minutes=n)
+            day = m // (24 * 60)
+            assert masks["quiet"][k] == within_quiet_hours(s, e, qs, qe)
+            assert masks["hard"][k] == hard_block_conflict(s, e, prefs["hard_blocks"])
+            assert masks["load"][k] == ((used[day] if 0 <= day < len(used) else 0) + n - m > prefs["max_day_min"])
+    print("   20000 slots agree")
+
+def test_common_free():
+    print("\n1d. Heap-merged busy streams vs one sorted list...")
+    rng = random.Random(5)
+    day0 = datetime(2025, 8, 11, tzinfo=timezone.utc)
+    iso = lambda dt: dt.isoformat().replace("+00:00", "Z")
+    for _ in range(300):
+        streams = []
+        for _ in range(rng.randrange(1, 6)):
+            starts = sorted(rng.randrange(-120, 25 * 60, 5) for _ in range(rng.randrange(0, 12)))
+            streams.append([{"start": iso(day0 + timedelta(minutes=m)), "end": iso(day0 + timedelta(minutes=m + rng.randrange(5, 180)))}
+                            for m in starts])
+        flat = [e for s in streams for e in s]
+        for gap in (1, 15, 45):
+            assert common_free_windows(day0, day0 + timedelta(days=1), streams, gap) == \
+                build_free_windows(day0, day0 + timedelta(days=1), flat, gap)
+    provider = FakeBusyProvider.synthetic(day0, n_calendars=3)
+    busy = provider.busy(day0.isoformat(), (day0 + timedelta(days=1)).isoformat())
+    assert [e["start"] for e in busy] == sorted(e["start"] for e in busy)
+    assert build_free_windows(day0, day0 + timedelta(days=1), provider) == build_free_windows(day0, day0 + timedelta(days=1), busy)
+    assert provider.calls == 2
+
+    class NoStreams(BusyProvider):
+        pass
+
+    try:
+        NoStreams()
+        assert False, "a provider without busy_streams must not be created"
+    except TypeError:
+        pass
+    print("   identical")
+
+def test_pack_tasks():
+    print("\n2. pack_tasks on a workday...")
+    day = datetime(2025, 8, 11, tzinfo=timezone.utc)  # Monday
+    windows = [(day + timedelta(hours=6), day + timedelta(hours=12)),
+               (day + timedelta(hours=16), day + timedelta(hours=23))]
+    tasks = [
+        {"title": "Deep Work: Pitch", "effort_min": 120, "urgency": 3, "impact": 3},
+        {"title": "Admin Inbox Zero", "effort_min": 45, "urgency": 2, "impact": 1},
+    ]
+    prefs = {
+        "quiet_hours": {"start": "22:00", "end": "07:00"},
+        "hard_blocks": [{"label": "work", "start": "09:00", "end": "17:00", "days": [1, 2, 3, 4, 5]}],
+        "max_day_min": 240,
+    }
+    blocks = pack_tasks(windows, tasks, prefs, [])
+    for b in blocks:
+        print(f"   {b['title']}: {b['start']} → {b['end']}")
+    assert len(blocks) == 2
+    assert (blocks[0]["start"], blocks[0]["end"]) == ("2025-08-11T07:00:00Z", "2025-08-11T09:00:00Z")
+
+def test_daily_load():
+    print("\n3. Daily load is tracked per day...")
+    load = DailyLoad(240, [{"start": "2025-08-11T07:00:00Z", "end": "2025-08-11T10:00:00Z"}])
+    assert load.used("2025-08-11") == 180 and load.exceeds("2025-08-11", 90)
+    assert not load.exceeds("2025-08-12", 90)
+    day = datetime(2025, 8, 11, tzinfo=timezone.utc)
+    windows = [(day + timedelta(hours=18), day + timedelta(hours=21)),
+               (day + timedelta(days=1, hours=18), day + timedelta(days=1, hours=21))]
+    tasks = [{"title": f"Task {i}", "effort_min": 90} for i in range(4)]
+    blocks = pack_tasks(windows, tasks, {"max_day_min": 180}, [])
+    per_day = [b["start"][:10] for b in blocks]
+    print(f"   Blocks per day: {dict((d, per_day.count(d)) for d in per_day)}")
+    assert per_day == ["2025-08-11", "2025-08-11", "2025-08-12", "2025-08-12"]
+
+def test_pack_tasks_range():
+    print("\n4. Week of plans from one busy listing...")
+    day0 = datetime(2025, 8, 11, tzinfo=timezone.utc)
+    busy = [{"start": f"2025-08-{11 + d}T08:00:00Z", "end": f"2025-08-{11 + d}T12:00:00Z"} for d in range(7)]
+    tasks = [{"title": f"Task {i}", "effort_min": 60, "urgency": 1 + i % 3} for i in range(20)]
+    plans = pack_tasks_range(day0, 7, busy, tasks, {"max_day_min": 120})
+    for day, blocks in plans.items():
+        print(f"   {day}: {[b['start'][11:16] for b in blocks]}")
+        assert len(blocks) == 2
+        assert all(b["end"] <= n["start"] for b, n in zip(blocks, blocks[1:]))
+        assert all(not ("08:00" <= b["start"][11:16] < "12:00") for b in blocks)
+
+def test_optimal_mode():
+    print("\n5. Optimal solver fits what first-fit drops...")
+    day = datetime(2025, 8, 11, tzinfo=timezone.utc)
+    windows = [(day + timedelta(hours=14), day + timedelta(hours=15, minutes=30)),
+               (day + timedelta(hours=16), day + timedelta(hours=17))]
+    tasks = [{"title": "Short", "effort_min": 60, "urgency": 3, "impact": 3},
+             {"title": "Long", "effort_min": 90, "urgency": 3, "impact": 3}]
+    blocks, info = solve_plan(windows, tasks, {"max_day_min": 300}, [], mode="optimal", budget_ms=200)
+    print(f"   {[(b['title'], b['start'][11:16]) for b in blocks]} via {info['solver']} in {info['ms']} ms")
+    assert info["solver"] == "optimal"
+    assert {b["title"]: b["start"][11:16] for b in blocks} == {"Short": "16:00", "Long": "14:00"}
+
+    print("   Budget exhausted → greedy fallback...")
+    many = [{"title": f"Task {i}", "effort_min": 15 * (1 + i % 6), "urgency": 1 + i % 3, "impact": 1 + i % 2} for i in range(40)]
+    wide = [(day + timedelta(hours=7 + 2 * i), day + timedelta(hours=8 + 2 * i, minutes=45)) for i in range(7)]
+    blocks, info = solve_plan(wide, many, {"max_day_min": 600}, [], mode="optimal", budget_ms=1)
+    print(f"   {len(blocks)} blocks via {info['solver']}")
+    assert info["solver"] == "greedy" and blocks
+
+    print("   Thousands of tasks: the setup stays under the budget too...")
+    days4 = [(day + timedelta(days=d, hours=8), day + timedelta(days=d, hours=20)) for d in range(4)]
+    huge = [{"title": f"Task {i}", "effort_min": 15 * (1 + i % 6), "urgency": 1 + i % 3, "impact": 1 + i % 2} for i in range(2000)]
+    started = time.perf_counter()
+    first_fit = pack_tasks(days4, huge, {"max_day_min": 600}, [])
+    greedy_ms = (time.perf_counter() - started) * 1000
+    blocks, info = solve_plan(days4, huge, {"max_day_min": 600}, [], mode="optimal", budget_ms=20)
+    print(f"   {len(blocks)} blocks via {info['solver']} in {info['ms']} ms (pack_tasks alone {greedy_ms:.0f} ms)")
+    assert info["solver"] == "greedy" and len(blocks) == len(first_fit)
+    assert info["ms"] < 20 + 3 * greedy_ms + 50  # budget, then the pack_tasks fallback
+
+def test_fragment_mode():
+    print("\n6. Fragment mode splits a task over short windows...")
+    day = datetime(2025, 8, 11, tzinfo=timezone.utc)
+    windows = [(day + timedelta(hours=h), day + timedelta(hours=h, minutes=50)) for h in (7, 8, 18)]
+    tasks = [{"title": "Deep Work", "effort_min": 90, "urgency": 3, "impact": 3}]
+    assert pack_tasks(windows, tasks, {"max_day_min": 300}, []) == []
+    blocks, info = solve_plan(windows, tasks, {"max_day_min": 300}, [], mode="fragment", min_chunk_min=25)
+    for b in blocks:
+        print(f"   part {b['part']}/{b['of']}: {b['start'][11:16]} → {b['end'][11:16]} ({b['id']})")
+    assert [(b["part"], b["of"]) for b in blocks] == [(1, 2), (2, 2)]
+    assert [(b["start"][11:16], b["end"][11:16]) for b in blocks] == [("07:00", "07:50"), ("08:00", "08:40")]
+    assert len({b["id"] for b in blocks}) == 2
+
+def test_plan_cache():
+    print("\n🗄️  Plan cache")
+    busy = [{"start": "2025-08-11T10:00:00Z", "end": "2025-08-11T11:00:00Z"},
+            {"start": "2025-08-11T14:00:00Z", "end": "2025-08-11T15:00:00Z"}]
+    tasks = [{"title": "Deep Work", "effort_min": 90, "urgency": 3, "impact": 3}]
+    key = plan_key("u1", "2025-08-11", tasks, [], {"max_day_min": 300}, busy_fingerprint(busy), {"mode": "greedy"})
+    assert busy_fingerprint(busy) == busy_fingerprint(busy[::-1])
+    assert key != plan_key("u1", "2025-08-11", tasks, [], {"max_day_min": 240}, busy_fingerprint(busy), {"mode": "greedy"})
+    assert key != plan_key("u1", "2025-08-11", tasks, [], {"max_day_min": 300}, busy_fingerprint(busy[:1]), {"mode": "greedy"})
+    blocks = [{"id": "b0", "title": "Write", "completed": False}]
+    assert plan_fingerprint(blocks) != plan_fingerprint([{**blocks[0], "completed": True}])
+    assert key != plan_key("u1", "2025-08-11", tasks, [], {"max_day_min": 300}, busy_fingerprint(busy), {"mode": "greedy"},
+                           plan_fingerprint(blocks))
+    cache = PlanCache(max_entries=2, ttl_s=60)
+    assert cache.get(key) is None
+    cache.set(key, {"blocks": [{"title": "Deep Work"}]})
+    assert cache.get(key) == {"blocks": [{"title": "Deep Work"}]}
+    cache.set("b", {}); cache.set("c", {})
+    assert cache.get(key) is None  # evicted (LRU)
+    expired = PlanCache(ttl_s=0)
+    expired.set(key, {})
+    assert expired.get(key) is None
+    print("   stats:", cache.stats())
+
+def test_repair_plan():
+    print("\n🔧 Incremental replan")
+    blk = lambda i, s, e, **kw: {"id": f"b{i}", "title": f"Task {i}", "start": f"2025-08-11T{s}:00Z", "end": f"2025-08-11T{e}:00Z", **kw}
+    blocks = [
+        blk(1, "08:00", "09:00", completed=True),
+        blk(2, "10:00", "11:00"),             # starts before the cutoff -> moves
+        blk(3, "13:00", "14:00"),             # untouched
+        blk(4, "15:00", "16:00"),             # new meeting on top -> moves
+        blk(5, "17:00", "18:00", locked=True),
+    ]
+    busy = [{"start": "2025-08-11T14:30:00Z", "end": "2025-08-11T16:00:00Z"}]
+    now = datetime(2025, 8, 11, 9, 50, tzinfo=timezone.utc)
+    new, moved, dropped = repair_plan(blocks, now, 30, {}, busy)
+    for b in new:
+        print(f"   {b['id']}: {b['start'][11:16]} → {b['end'][11:16]}")
+    assert moved == ["b2", "b4"] and dropped == []
+    by_id = {b["id"]: b for b in new}
+    assert by_id["b1"] == blocks[0] and by_id["b3"] == blocks[2] and by_id["b5"] == blocks[4]
+    assert by_id["b2"]["start"] == "2025-08-11T10:20:00Z"
+    assert by_id["b4"]["start"] == "2025-08-11T11:20:00Z"
+    spans = sorted((b["start"], b["end"]) for b in new)
+    assert all(a[1] <= b[0] for a, b in zip(spans, spans[1:]))
+    # nothing left today after quiet hours start -> dropped
+    late = datetime(2025, 8, 11, 21, 30, tzinfo=timezone.utc)
+    _, moved, dropped = repair_plan([blk(6, "21:40", "22:40")], late, 0, {}, [])
+    assert moved == [] and dropped == ["b6"]
+    # a lowered max_day_min: blocks that stay count toward it, repacked ones only go where it allows
+    _, moved, dropped = repair_plan(blocks, now, 30, {"max_day_min": 240}, busy)
+    assert moved == ["b2"] and dropped == ["b4"]
+
+if __name__ == "__main__":
+    print("🧪 Testing Scheduler...")
+    print("=" * 50)
+    test_first_fit_matches_walk()
+    test_constraint_profile()
+    test_check_slots()
+    test_common_free()
+    test_pack_tasks()
+    test_daily_load()
+    test_pack_tasks_range()
+    test_optimal_mode()
+    test_fragment_mode()
+    test_plan_cache()
+    test_repair_plan()
+    print("\n✅ Scheduler test completed!")
@@ -19,7 +19,7 @@ def test_imports():
         return False
     
     try:
-        from app.services.google_calendar import list_events, upsert_event
+        from app.services.google_calendar import list_events, freebusy_query
         print("✅ Google Calendar service imports successfully")
     except Exception as e:
         print(f"❌ Google Calendar service import failed: {e}")
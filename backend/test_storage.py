@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify the in-memory storage backend: Firestore semantics, thread safety and the API running on it
+"""
+
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ["STORAGE_BACKEND"] = "memory"
+
+from firebase_admin import firestore
+from app.services import storage
+from app.services.storage import MemoryDB
+from app.services.budgets import atomic_inc, get_current
+from app.services.repo import UnitOfWork, DocLoader
+from test_doc_loader import use_db, stub_plan_routes
+
+def test_storage():
+    print("🧪 Testing Storage Backends...")
+    print("=" * 50)
+
+    print("1. STORAGE_BACKEND selects the engine...")
+    # through storage, not the repo alias: other test modules rebind repo.get_db
+    storage.get_db.cache_clear()
+    assert isinstance(storage.get_db(), MemoryDB) and storage.get_db() is storage.get_db()
+    os.environ["STORAGE_BACKEND"] = "nope"
+    storage.get_db.cache_clear()
+    try:
+        storage.get_db()
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    os.environ["STORAGE_BACKEND"] = "emulator"
+    os.environ.pop("FIRESTORE_EMULATOR_HOST", None)
+    storage.get_db.cache_clear()
+    try:
+        storage.get_db()
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert "FIRESTORE_EMULATOR_HOST" in str(e)
+    os.environ["STORAGE_BACKEND"] = "memory"
+    storage.get_db.cache_clear()
+    db = storage.get_db()
+    restore = use_db(db)  # repo and budgets resolve the same engine, sync and async
+    try:
+        print("\n2. Documents, merges, increments and queries behave like Firestore...")
+        users = db.collection("users")
+        users.document("u2").set({"name": "B", "prefs": {"tz": "UTC", "max_day_min": 300}, "active": True})
+        users.document("u1").set({"name": "A", "active": False})
+        users.document("u3").set({"name": "C", "active": True})
+        users.document("u2").set({"prefs": {"max_day_min": 240}, "visits": firestore.Increment(2)}, merge=True)
+        u2 = users.document("u2").get().to_dict()
+        assert u2["prefs"] == {"tz": "UTC", "max_day_min": 240} and u2["visits"] == 2 and u2["name"] == "B"
+        users.document("u1").set({"name": "A2"})  # no merge: replaced
+        assert users.document("u1").get().to_dict() == {"name": "A2"}
+        assert [s.id for s in users.where("active", "==", True).order_by("__name__").stream()] == ["u2", "u3"]
+        first = users.order_by("__name__").limit(1).get()[0]
+        assert [s.id for s in users.order_by("__name__").start_after(first).stream()] == ["u2", "u3"]
+        assert [s.get("prefs.tz") for s in users.where("prefs.tz", "==", "UTC").stream()] == ["UTC"]
+        snaps = list(db.get_all([users.document("u3"), users.document("missing")]))
+        assert [s.exists for s in snaps] == [True, False] and snaps[1].reference.path == "users/missing"
+        copy = users.document("u3").get().to_dict()
+        copy["name"] = "mutated"
+        assert users.document("u3").get().to_dict()["name"] == "C"  # snapshots are copies
+        try:
+            users.document("missing").update({"x": 1})
+            assert False, "expected KeyError"
+        except KeyError:
+            pass
+        users.document("u3").delete()
+        assert not users.document("u3").get().exists
+        try:
+            users.where("age", ">", 3)
+            assert False, "expected NotImplementedError"
+        except NotImplementedError:
+            pass
+
+        print("\n3. A failed transaction writes nothing...")
+        def boom(tr):
+            tr.set(users.document("u2"), {"name": "X"}, merge=True)
+            raise ValueError("boom")
+        try:
+            db.run_transaction(boom)
+        except ValueError:
+            pass
+        assert users.document("u2").get().to_dict()["name"] == "B"
+
+        print("\n4. Concurrent transactions and batched increments don't lose updates...")
+        def worker():
+            for _ in range(100):
+                atomic_inc("u1", {"llm_cents": 1})
+                uow = UnitOfWork()
+                uow.increment("counters", "c", {"n": 1})
+                uow.commit()
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert get_current("u1")["llm_cents"] == 800 and get_current("u1")["llm_limit_cents"] == 1500
+        assert db.collection("counters").document("c").get().to_dict()["n"] == 800
+        print(f"   {db.stats}")
+
+        print("\n5. The API runs end to end on the memory backend...")
+        from fastapi.testclient import TestClient
+        from app.main import app
+        unstub = stub_plan_routes()
+        try:
+            client = TestClient(app)
+            goal = client.post("/goals/", json={"user_id": "u9", "title": "Ship MVP", "priority": 3, "effort_estimate_min": 60,
+                                                "domain": ["work"], "why": "launch"}).json()
+            assert [g["id"] for g in client.get("/goals/", params={"user_id": "u9"}).json()] == [goal["id"]]
+            body = {"user_id": "u9", "tasks": [], "user_prefs": {"max_day_min": 300},
+                    "free_windows": [{"start_iso": "2025-08-11T14:00:00Z", "end_iso": "2025-08-11T16:00:00Z"}]}
+            gen = client.post("/plan/generate", json=body)
+            assert gen.status_code == 200, gen.text
+            blocks = gen.json()["blocks"]
+            assert blocks and client.get("/plan/today", params={"user_id": "u9"}).json()["blocks"] == blocks
+            done = client.post("/plan/complete", json={"user_id": "u9", "block_id": blocks[0]["id"]}).json()
+            assert done["adherence"]["completed"] == 1
+            assert client.get("/budgets/current", params={"user_id": "u9"}).json()["llm_cents"] == 5
+            today = gen.json()["date"]
+            review = client.get("/reviews/range", params={"user_id": "u9", "start": today}).json()
+            assert review["completed_blocks"] == 1 and review["total_blocks"] == len(blocks)
+            loader = DocLoader()
+            assert loader.get("plans", f"u9@{today}").to_dict()["plan_type"] == "full"
+        finally:
+            unstub()
+    finally:
+        restore()
+
+    print("\n✅ Storage backend test completed!")
+
+if __name__ == "__main__":
+    test_storage()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Test script to verify plan generation commits the plan and its budget increment in one batch
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.repo import UnitOfWork, DocLoader
+from test_doc_loader import FakeFirestore, use_db, stub_plan_routes
+
+def test_unit_of_work():
+    print("🧪 Testing Unit of Work Commits...")
+    print("=" * 50)
+
+    print("1. Writes to the same document merge; increments need no read...")
+    db = FakeFirestore({"budgets/u1@2025-08": {"llm_cents": 10}})
+    loader = DocLoader(db)
+    loader.load(("budgets", "u1@2025-08"))
+    uow = UnitOfWork(db, loader)
+    uow.set("plans", "u1@2025-08-11", {"blocks": [1, 2]})
+    uow.set("plans", "u1@2025-08-11", {"adherence": {"completed": 0, "planned": 2}})
+    uow.increment("budgets", "u1@2025-08", {"llm_cents": 5})
+    uow.increment("budgets", "u1@2025-08", {"sms_used": 1})
+    assert len(uow) == 2 and uow.commit() == 2 and uow.commit() == 0
+    assert db.commits == [2] and db.gets == 0
+    assert db.docs["plans/u1@2025-08-11"] == {"blocks": [1, 2], "adherence": {"completed": 0, "planned": 2}}
+    assert db.docs["budgets/u1@2025-08"] == {"llm_cents": 15, "sms_used": 1}
+    assert loader.get("budgets", "u1@2025-08").to_dict()["llm_cents"] == 15  # cached snapshot was dropped
+
+    print("\n2. /plan/generate persists plan type, replan count, rollups and budget in one commit...")
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    db = FakeFirestore({"users/u1": {}})
+    restore, unstub = use_db(db), stub_plan_routes()
+    try:
+        client = TestClient(app)
+        body = {"user_id": "u1", "tasks": [{"title": "Write", "effort_min": 60, "urgency": 3, "impact": 3}],
+                "free_windows": [{"start_iso": "2025-08-11T14:00:00Z", "end_iso": "2025-08-11T16:00:00Z"}],
+                "user_prefs": {"max_day_min": 300}}
+        results = []
+        for effort in (60, 45, 30, 20):
+            db.commits.clear()
+            r = client.post("/plan/generate", json={**body, "tasks": [{**body["tasks"][0], "effort_min": effort}]})
+            results.append(r)
+            if r.status_code == 200:
+                # plan + budget, one batch; the first plan also adds its block to the week and month rollups,
+                # the replans swap one block for one block so the rollups don't change
+                assert db.commits == ([4] if effort == 60 else [2]), db.commits
+        assert [r.status_code for r in results] == [200, 200, 200, 429]
+        plan_doc = next(v for k, v in db.docs.items() if k.startswith("plans/"))
+        budget_doc = next(v for k, v in db.docs.items() if k.startswith("budgets/"))
+        print(f"   plan: {plan_doc['plan_type']} #{plan_doc['replan_count']} {plan_doc['adherence']}, llm_cents {budget_doc['llm_cents']}")
+        assert (plan_doc["plan_type"], plan_doc["replan_count"]) == ("replan", 2)
+        assert plan_doc["adherence"] == {"completed": 0, "planned": 1} and plan_doc["user_prefs"] == body["user_prefs"]
+        assert budget_doc["llm_cents"] == 15
+
+        print("   /plan/generate_range checks start_date and today's replan limit too...")
+        from datetime import datetime, timedelta, timezone
+        tomorrow = (datetime.now(timezone.utc).date() + timedelta(days=1)).isoformat()
+        ranged = {"user_id": "u1", "tasks": body["tasks"], "user_prefs": body["user_prefs"], "days": 2}
+        assert client.post("/plan/generate_range", json={**ranged, "start_date": "2025-13-01"}).status_code == 400
+        assert client.post("/plan/generate_range", json=ranged).status_code == 429  # today's limit is used up
+        r = client.post("/plan/generate_range", json={**ranged, "start_date": tomorrow})
+        assert r.status_code == 200, r.text
+        fresh = client.post("/plan/generate_range", json={**ranged, "user_id": "u2"})
+        assert fresh.status_code == 200, fresh.text
+        today_doc = db.docs[f"plans/u2@{datetime.now(timezone.utc).date().isoformat()}"]
+        assert (today_doc["plan_type"], today_doc["replan_count"]) == ("full", 0)
+    finally:
+        restore()
+        unstub()
+
+    print("\n✅ Unit of work test completed!")
+
+if __name__ == "__main__":
+    test_unit_of_work()